@@ -0,0 +1,107 @@
+"""
+Cost of resolving dependencies of one request.
+
+    python -m benchmarks.di_resolution --requests 100000
+
+`post_init lookups` is how services used to get their dependencies: `JWTLoginService()` was created per request
+and called `injector.get` for settings and the hasher in `__post_init__`. `constructor injection` resolves the same
+service through its compiled resolver. When a request needs the service in three places, it was created three times,
+a scoped one is created once per dependency scope.
+`protocol checks` compares the first registration of the application dependencies with repeated ones
+"""
+import argparse
+from dataclasses import dataclass, field as dc_field
+import time
+import timeit
+import typing
+
+from argon2 import PasswordHasher as ArgonPasswordHasher
+
+from server.apps.authentication.sequrity.hashers import ExecutorPasswordHasher
+from server.apps.authentication.sequrity.jwt.authentication import JWTLoginService
+from server.config.infrastructure.databases.postgres import AsyncDatabaseComponents, DatabaseComponents
+from server.config.settings import Settings
+from server.shared.dependencies.auth import AsyncPasswordHasher, PasswordHasher
+from server.shared.dependencies.database import AsyncDatabase, Database
+from server.shared.dependencies.settings import Settings as SettingsProtocol
+from server.shared.di import Lifetime, injector
+from server.shared.di.dependency_provider import functions_with_signatures, scoped_instances
+
+PROTOCOLS = [
+    (PasswordHasher, ArgonPasswordHasher),
+    (AsyncPasswordHasher, ExecutorPasswordHasher),
+    (Database, DatabaseComponents),
+    (AsyncDatabase, AsyncDatabaseComponents),
+]
+
+
+@dataclass
+class PostInitLoginService:
+    """Previous shape of `JWTLoginService`"""
+
+    password_hasher: AsyncPasswordHasher = dc_field(init=False)
+    algorithm: str = dc_field(init=False)
+    secret_key: str = dc_field(init=False)
+    token_expires_in_minutes: float = dc_field(init=False)
+
+    def __post_init__(self) -> None:
+        settings = injector.get(SettingsProtocol)
+        self.password_hasher = injector.get(AsyncPasswordHasher)
+        self.algorithm = settings.security.jwt_algorithm
+        self.secret_key = settings.security.jwt_secret_key
+        self.token_expires_in_minutes = settings.security.jwt_access_token_expire_in_minutes
+
+
+def per_request(function: typing.Callable[[], typing.Any], requests: int) -> float:
+    return min(timeit.repeat(function, number=requests, repeat=5)) / requests
+
+
+def post_init_request() -> None:
+    for _ in range(3):
+        PostInitLoginService()
+
+
+def scoped_request() -> None:
+    # the same as `DependencyScopeMiddleware` does
+    token = scoped_instances.set({})
+    for _ in range(3):
+        injector.get(JWTLoginService)
+    scoped_instances.reset(token)
+
+
+def check_protocols() -> float:
+    started_at = time.perf_counter()
+    for protocol, cls in PROTOCOLS:
+        injector.check_implements_protocol(protocol, cls)
+    return time.perf_counter() - started_at
+
+
+def main(requests: int) -> None:
+    settings = Settings()
+    injector.register(SettingsProtocol, lambda: settings)
+    injector.register(PasswordHasher, ArgonPasswordHasher)
+    injector.register(AsyncPasswordHasher, ExecutorPasswordHasher)
+
+    injector.register(JWTLoginService, JWTLoginService, as_singleton=False)
+    results = {
+        "post_init lookups": per_request(PostInitLoginService, requests),
+        "constructor injection": per_request(lambda: injector.get(JWTLoginService), requests),
+    }
+    injector.register(JWTLoginService, JWTLoginService, lifetime=Lifetime.SCOPED)
+    results["post_init, 3 services"] = per_request(post_init_request, requests)
+    results["scoped, 3 gets"] = per_request(scoped_request, requests)
+    for name, seconds in results.items():
+        print(f"{name:<24} {seconds * 1e6:>8.2f} us/request")
+
+    functions_with_signatures.cache_clear()
+    injector._checked.clear()
+    cold = check_protocols()
+    warm = check_protocols()
+    print(f"{'protocol checks':<24} {cold * 1e6:>8.0f} us cold, {warm * 1e6:.0f} us cached")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100_000, help="resolutions per measurement")
+    arguments = parser.parse_args()
+    main(arguments.requests)
@@ -0,0 +1,78 @@
+"""
+Latency of the first requests to a fresh worker, with and without the startup warm-up.
+
+    python -m benchmarks.first_request --workers 30
+
+Every worker is a new process, that runs startup handlers like uvicorn does and then sends the first requests
+of a typical client (list of users, one user, OpenAPI schema) through the ASGI interface.
+`DB_WARM_UP_CONNECTIONS=0` disables the warm-up. Needs the database from settings
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import typing
+
+REQUESTS = ("/api/v1/users?limit=50", "/api/v1/users/1", "/openapi.json")
+
+
+async def run_worker() -> None:
+    from asgi_lifespan import LifespanManager
+    from httpx import AsyncClient
+
+    from server.application.builder import build_app
+    from server.application.dev import DevelopmentApplicationBuilder
+    from server.config.settings import Settings
+
+    app = build_app(DevelopmentApplicationBuilder(settings=Settings()))
+    durations = {}
+    async with LifespanManager(app, startup_timeout=60):
+        async with AsyncClient(app=app, base_url="http://worker") as client:
+            for path in REQUESTS:
+                started_at = time.perf_counter()
+                await client.get(path)
+                durations[path] = time.perf_counter() - started_at
+    print(json.dumps(durations))
+
+
+def percentile(values: typing.List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def measure(workers: int, warm_up_connections: int) -> typing.Dict[str, typing.List[float]]:
+    env = {**os.environ, "DB_WARM_UP_CONNECTIONS": str(warm_up_connections)}
+    durations: typing.Dict[str, typing.List[float]] = {path: [] for path in REQUESTS}
+    for _ in range(workers):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.first_request", "--worker"],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        for path, seconds in json.loads(output.strip().splitlines()[-1]).items():
+            durations[path].append(seconds)
+    return durations
+
+
+def main(workers: int) -> None:
+    print(f"{'warm-up':>8} {'request':<24} {'p50, ms':>8} {'p99, ms':>8}")
+    for warm_up_connections in (0, 2):
+        for path, values in measure(workers, warm_up_connections).items():
+            print(
+                f"{'on' if warm_up_connections else 'off':>8} {path:<24} "
+                f"{statistics.median(values) * 1000:>8.1f} {percentile(values, 0.99) * 1000:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=30, help="fresh workers per mode")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if arguments.worker:
+        asyncio.run(run_worker())
+    else:
+        main(arguments.workers)
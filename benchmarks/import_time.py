@@ -0,0 +1,70 @@
+"""
+Cold start of a worker: import time of the application modules and the time to build the application.
+
+    python -m benchmarks.import_time --runs 5 --top 15
+    python -m benchmarks.import_time --max-import-ms 900  # exits with 1 above the budget
+
+Every run is a new interpreter. Imports are measured with `python -X importtime`, the slowest modules
+(cumulative time) of the median run are listed, so a new heavy top-level import is easy to spot.
+Building the application doesn't connect to the database, that happens in startup handlers
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import typing
+
+MODULE = "server.application.dev"
+BUILD = (
+    "import time; started_at = time.perf_counter();"
+    "from server.application.builder import build_app;"
+    "from server.application.dev import DevelopmentApplicationBuilder;"
+    "from server.config.settings import Settings;"
+    "build_app(DevelopmentApplicationBuilder(settings=Settings()));"
+    "print(time.perf_counter() - started_at)"
+)
+
+
+def import_times(module: str) -> typing.Dict[str, int]:
+    """Cumulative import time of every module in microseconds"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], check=True, capture_output=True, text=True,
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def build_time() -> float:
+    output = subprocess.run([sys.executable, "-W", "ignore", "-c", BUILD], check=True, capture_output=True, text=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+
+def main(runs: int, top: int, max_import_ms: typing.Optional[float]) -> int:
+    measurements = sorted((import_times(MODULE) for _ in range(runs)), key=lambda times: times[MODULE])
+    median = measurements[len(measurements) // 2]
+    import_ms = median[MODULE] / 1000
+    build_ms = statistics.median(build_time() for _ in range(runs)) * 1000
+
+    print(f"import {MODULE}: {import_ms:.0f} ms, import and build the application: {build_ms:.0f} ms")
+    print(f"\n{'cumulative, ms':>15}  module")
+    for name, microseconds in sorted(median.items(), key=lambda item: -item[1])[1:top + 1]:
+        print(f"{microseconds / 1000:>15.1f}  {name}")
+
+    if max_import_ms is not None and import_ms > max_import_ms:
+        print(f"\nimport time {import_ms:.0f} ms is over the budget of {max_import_ms:.0f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=15, help="slowest modules to list")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="fail above this import time")
+    arguments = parser.parse_args()
+    sys.exit(main(arguments.runs, arguments.top, arguments.max_import_ms))
@@ -0,0 +1,76 @@
+"""
+Serialization cost of a `GET /api/v1/users` page, before and after the trusted response path.
+
+    python -m benchmarks.serialization --rows 50 --rows 500
+
+`validated` is what FastAPI does for `response_model=UserPageSchema` with ORM objects: pydantic validation,
+`jsonable_encoder` and JSON encoding. `trusted` takes schema fields from the rows and encodes them with orjson.
+Rows are built in memory, so the database doesn't affect numbers
+"""
+import argparse
+import asyncio
+from decimal import Decimal
+import time
+import typing
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from server.api.v1.staff.schemas import UserPageSchema, UserReadSchema
+from server.apps.staff.models import User
+from server.shared.api.responses import TrustedORJSONResponse, rows_as_dicts
+
+
+def make_users(rows: int) -> typing.List[User]:
+    return [
+        User(
+            id=index,
+            first_name="First name",
+            last_name="Last name",
+            phone_number="+1234567890",
+            email=f"user-{index}@example.com",
+            password_hash="$argon2id$v=19$m=65536,t=3,p=4$c2FsdA$aGFzaA",
+            balance=Decimal("10.50"),
+            username=f"username-{index}",
+            xmin=index,
+        )
+        for index in range(rows)
+    ]
+
+
+async def render_validated(users: typing.List[User]) -> bytes:
+    field = create_response_field(name="Response_users_list", type_=UserPageSchema)
+    content = await serialize_response(field=field, response_content={"items": users, "next_cursor": None})
+    return JSONResponse(content).body
+
+
+async def render_trusted(users: typing.List[User]) -> bytes:
+    return TrustedORJSONResponse({"items": rows_as_dicts(UserReadSchema, users), "next_cursor": None}).body
+
+
+async def measure(render: typing.Callable[[typing.List[User]], typing.Awaitable[bytes]], users: typing.List[User],
+                  duration: float) -> float:
+    iterations = 0
+    started_at = time.perf_counter()
+    while (elapsed := time.perf_counter() - started_at) < duration:
+        await render(users)
+        iterations += 1
+    return iterations / elapsed
+
+
+async def main(rows: typing.List[int], duration: float) -> None:
+    print(f"{'rows':>6} {'validated, pages/s':>20} {'trusted, pages/s':>18} {'speedup':>8}")
+    for count in rows:
+        users = make_users(count)
+        validated = await measure(render_validated, users, duration)
+        trusted = await measure(render_trusted, users, duration)
+        print(f"{count:>6} {validated:>20.0f} {trusted:>18.0f} {trusted / validated:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, action="append", help="rows per page, may be repeated")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per measurement")
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.rows or [50, 500], arguments.duration))
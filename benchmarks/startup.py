@@ -0,0 +1,79 @@
+"""
+Schema work done by a worker on startup, before and after the startup schema check.
+
+    python -m benchmarks.startup --boots 20 --workers 4
+
+A boot is the schema step plus the first query of the worker (it's where the pool opens its first connection):
+`create_all` is the old behaviour, a separate engine per worker, that reflects the whole schema,
+`check` is `ensure_schema(engine, SchemaMode.CHECK)` on the pooled engine of the worker.
+`--workers` boots start concurrently, like gunicorn workers do.
+Needs the database from settings, tables are created on the first boot
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import typing
+
+from sqlalchemy import text
+
+from server.apps.staff.models import User  # noqa: F401 registers tables in the metadata
+from server.config.infrastructure.databases.postgres import create_all, create_pooled_async_engine
+from server.config.infrastructure.databases.schema import SchemaMode, alembic_head, ensure_schema
+from server.config.settings import Settings
+
+
+async def boot_with_create_all(settings: Settings) -> None:
+    engine = create_pooled_async_engine(settings.database.connection_uri, settings.database)
+    try:
+        await create_all(settings.database.connection_uri)
+        await first_query(engine)
+    finally:
+        await engine.dispose()
+
+
+async def boot_with_check(settings: Settings) -> None:
+    engine = create_pooled_async_engine(settings.database.connection_uri, settings.database)
+    try:
+        await ensure_schema(engine, SchemaMode.CHECK)
+        await first_query(engine)
+    finally:
+        await engine.dispose()
+
+
+async def first_query(engine: typing.Any) -> None:
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+
+async def measure(boot: typing.Callable[[Settings], typing.Awaitable[None]], settings: Settings,
+                  boots: int, workers: int) -> typing.List[float]:
+    async def timed_boot() -> float:
+        started_at = time.perf_counter()
+        await boot(settings)
+        return time.perf_counter() - started_at
+
+    durations = []
+    for _ in range(boots):
+        durations.extend(await asyncio.gather(*(timed_boot() for _ in range(workers))))
+    return durations
+
+
+async def main(boots: int, workers: int) -> None:
+    settings = Settings()
+    alembic_head()  # parsed once per process, on import of the application in real workers
+    await create_all(settings.database.connection_uri)
+
+    print(f"{'mode':>10} {'median, ms':>11} {'p95, ms':>8} {'max, ms':>8}")
+    for name, boot in (("create_all", boot_with_create_all), ("check", boot_with_check)):
+        durations = sorted(await measure(boot, settings, boots, workers))
+        p95 = durations[int(len(durations) * 0.95) - 1]
+        print(f"{name:>10} {statistics.median(durations) * 1000:>11.1f} {p95 * 1000:>8.1f} {durations[-1] * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boots", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=4, help="concurrent boots")
+    arguments = parser.parse_args()
+    asyncio.run(main(arguments.boots, arguments.workers))
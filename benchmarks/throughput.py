@@ -0,0 +1,96 @@
+"""
+Throughput of the server in `dev` and `production` profiles.
+
+    python -m benchmarks.throughput --seconds 10 --concurrency 64 --workers 1
+
+The server is started with `python -m server` and `SERVER_PROFILE` of every mode,
+concurrent clients repeat a request for a number of seconds. `--workers` is passed to the production profile
+(`dev` always runs one), use it to compare per-worker throughput on a small machine,
+where the load generator competes with the server for CPU. Needs the database from settings
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import typing
+
+import httpx
+
+PORT = 8099
+PATH = "/api/v1/users/1"
+
+
+async def wait_until_ready(client: httpx.AsyncClient, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/api/v1/healthcheck")).is_success:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("server didn't start")
+
+
+async def run_connection(deadline: float, durations: typing.List[float]) -> None:
+    # plain keep-alive HTTP/1.1 over a socket, an HTTP client library would take more CPU than the server
+    reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+    request = f"GET {PATH} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode()
+    try:
+        while time.monotonic() < deadline:
+            started_at = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = next(
+                int(line.split(b":", 1)[1]) for line in head.split(b"\r\n")
+                if line.lower().startswith(b"content-length:")
+            )
+            await reader.readexactly(length)
+            durations.append(time.perf_counter() - started_at)
+    finally:
+        writer.close()
+
+
+async def load(seconds: float, concurrency: int) -> typing.List[float]:
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}") as client:
+        await wait_until_ready(client)
+    durations: typing.List[float] = []
+    deadline = time.monotonic() + seconds
+    await asyncio.gather(*(run_connection(deadline, durations) for _ in range(concurrency)))
+    return durations
+
+
+def measure(profile: str, seconds: float, concurrency: int, workers: int) -> typing.List[float]:
+    env = {**os.environ, "SERVER_PROFILE": profile, "SERVER_WORKERS": str(workers), "PORT": str(PORT)}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "server"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        return asyncio.run(load(seconds, concurrency))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+
+
+def main(seconds: float, concurrency: int, workers: int) -> None:
+    print(f"{'profile':>10} {'requests/s':>11} {'p50, ms':>8} {'p99, ms':>8}")
+    for profile in ("dev", "production"):
+        durations = sorted(measure(profile, seconds, concurrency, workers))
+        p99 = durations[min(int(len(durations) * 0.99), len(durations) - 1)]
+        print(
+            f"{profile:>10} {len(durations) / seconds:>11.0f} "
+            f"{statistics.median(durations) * 1000:>8.1f} {p99 * 1000:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10, help="duration of the load per profile")
+    parser.add_argument("--concurrency", type=int, default=64, help="concurrent clients")
+    parser.add_argument("--workers", type=int, default=0, help="workers of the production profile, 0 is (2 x cpu) + 1")
+    arguments = parser.parse_args()
+    main(arguments.seconds, arguments.concurrency, arguments.workers)
@@ -32,6 +32,14 @@ bind = use_bind
 keepalive = 120
 errorlog = "-"
 
+
+# the same hooks as `python -m server`: workers share metrics through the prometheus directory,
+# it's prepared here, before the application (and `prometheus_client`) is imported
+from server.gunicorn_app import child_exit, prepare_metrics_directory  # noqa: E402
+
+prepare_metrics_directory()
+
+
 # For debugging and testing
 log_data = {
     "loglevel": loglevel,
@@ -1,22 +1,53 @@
-from .config.settings import settings
-from server.application.builder import build_app
-from server.application.dev import DevelopmentApplicationBuilder
-from server.gunicorn_app import StandaloneApplication
+from typing import Any, Dict
+
+from server.gunicorn_app import (
+    StandaloneApplication,
+    child_exit,
+    number_of_workers,
+    post_fork,
+    prepare_metrics_directory,
+)
+
+# workers share metrics through files, it has to be configured before any module imports prometheus_client
+prepare_metrics_directory()
+
+from .config.settings import Settings, settings  # noqa: E402
+from server.application.builder import build_app  # noqa: E402
+from server.application.dev import DevelopmentApplicationBuilder  # noqa: E402
 # from src.utils.logging import LoggingConfig, configure_logging
 
 
-def run_application() -> None:
-    # stdlib_logconfig_dict = configure_logging(LoggingConfig())
-    app = build_app(DevelopmentApplicationBuilder(settings=settings))
+def gunicorn_options(settings: Settings) -> Dict[str, Any]:
+    server = settings.server
     options = {
         "bind": "%s:%s" % (settings.application.host, settings.application.port),
-        "worker_class": "uvicorn.workers.UvicornWorker",
-        "reload": True,
         "disable_existing_loggers": False,
         "preload_app": True,
+        "child_exit": child_exit,
         # "logconfig_dict": stdlib_logconfig_dict
     }
-    gunicorn_app = StandaloneApplication(app, options)
+    if server.profile == "dev":
+        return options | {"worker_class": "server.gunicorn_app.DrainingUvicornWorker", "reload": True}
+    return options | {
+        "worker_class": "server.gunicorn_app.ProductionUvicornWorker",
+        "reload": False,
+        # the app is preloaded once by the master, every forked worker gets its own database pools
+        "post_fork": post_fork,
+        "workers": server.workers or number_of_workers(),
+        "keepalive": server.keepalive,
+        "backlog": server.backlog,
+        "max_requests": server.max_requests,
+        "max_requests_jitter": server.max_requests_jitter,
+        "timeout": server.timeout,
+        # in-flight requests are drained on shutdown, see `on_shutdown`
+        "graceful_timeout": int(settings.application.shutdown_timeout) + 5,
+    }
+
+
+def run_application() -> None:
+    # stdlib_logconfig_dict = configure_logging(LoggingConfig())
+    app = build_app(DevelopmentApplicationBuilder(settings=settings))
+    gunicorn_app = StandaloneApplication(app, gunicorn_options(settings))
     gunicorn_app.run()
 
 
@@ -0,0 +1,13 @@
+from fastapi import APIRouter
+from prometheus_client import CONTENT_TYPE_LATEST
+from starlette.responses import Response
+
+from server.shared.metrics import collect_metrics
+
+metrics_api_router = APIRouter(tags=["metrics"])
+
+
+@metrics_api_router.get("/metrics", include_in_schema=False)
+def metrics():
+    # sync endpoint runs in a threadpool, because in multiprocess mode metrics are read from files of all workers
+    return Response(collect_metrics(), media_type=CONTENT_TYPE_LATEST)
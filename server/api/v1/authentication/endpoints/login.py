@@ -4,18 +4,25 @@ from starlette import status
 from starlette.requests import Request
 from starlette.responses import RedirectResponse
 
+from server.apps.audit.services import record_audit_event
 from server.apps.authentication.sequrity.jwt.authentication import JWTLoginService, UserIsUnauthorized
+from server.apps.authentication.sequrity.rate_limit import login_rate_limit
+from server.shared.api.routing import TimedAPIRoute
+from server.shared.di import injector
 
-auth_api_router = APIRouter(prefix="/authentication", tags=["Oauth & Oauth2"])
+auth_api_router = APIRouter(prefix="/authentication", tags=["Oauth & Oauth2"], route_class=TimedAPIRoute)
 
 
 @auth_api_router.post("/login", name="oauth:login")
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(login_rate_limit)):
+    client_ip = request.client.host if request.client else None
     try:
-        jwt_login = JWTLoginService()
+        jwt_login: JWTLoginService = injector.get(JWTLoginService)
         access_token = await jwt_login.authenticate_user(form_data)
+        await record_audit_event("login.succeeded", username=form_data.username, client_ip=client_ip)
         return {"access_token": access_token, "token_type": "bearer"}
     except UserIsUnauthorized as ex:
+        await record_audit_event("login.failed", username=form_data.username, client_ip=client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=ex.message,
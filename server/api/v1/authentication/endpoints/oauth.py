@@ -1,13 +1,13 @@
-from authlib.integrations.base_client import OAuthError
 from fastapi import Depends, APIRouter
 from starlette.requests import Request
 from starlette.responses import RedirectResponse, HTMLResponse
 
 from .login import auth_api_router
 from server.shared.di import injector
+from server.shared.api.routing import TimedAPIRoute
 from server.shared.dependencies.auth import OAuth
 
-oauth_api_router = APIRouter(prefix="/oauth")
+oauth_api_router = APIRouter(prefix="/oauth", route_class=TimedAPIRoute)
 auth_api_router.include_router(oauth_api_router)
 
 
@@ -20,13 +20,14 @@ async def google_login(request: Request):
 
 @oauth_api_router.get('/google/auth', name="google:oauth")
 async def google_auth(request: Request):
+    from authlib.integrations.base_client import OAuthError
     oauth = injector.get(OAuth)
 
     try:
         token = await oauth.google.authorize_access_token(request)
     except OAuthError as error:
         return HTMLResponse(f'<h1>{error.error}</h1>')
-    # user = await oauth.google.parse_id_token(request, token)
-    user = await oauth.google.parse_id_token(request, token)
+    # the ID token is already verified with provider keys from the metadata cache
+    user = token["userinfo"]
     request.session['user'] = dict(user)
     return RedirectResponse(url='/')
@@ -1,11 +1,30 @@
 from fastapi import APIRouter
 
-from .schemas import TestResponse
+from .schemas import TestResponse, CacheStatsResponse, PoolStatsResponse
+from server.shared.api.routing import TimedAPIRoute
+from server.shared.di import injector
+from server.shared.dependencies.cache import CountCache, PrincipalCache, TokenCache
+from server.shared.dependencies.database import AsyncDatabase
 
 
-healthcheck_api_router = APIRouter(prefix="/healthcheck", tags=["healthcheck"])
+healthcheck_api_router = APIRouter(prefix="/healthcheck", tags=["healthcheck"], route_class=TimedAPIRoute)
 
 
 @healthcheck_api_router.get("", response_model=TestResponse)
 async def test():
     return {"success": True}
+
+
+@healthcheck_api_router.get("/caches", response_model=CacheStatsResponse)
+async def caches_stats():
+    return {
+        "principal": injector.get(PrincipalCache).stats(),
+        "token": injector.get(TokenCache).stats(),
+        "count": injector.get(CountCache).stats(),
+    }
+
+
+@healthcheck_api_router.get("/pool", response_model=PoolStatsResponse)
+async def pool_stats():
+    db = injector.get(AsyncDatabase)
+    return {**db.pool_stats(), "server_max_connections": await db.server_max_connections()}
@@ -6,3 +6,29 @@ from pydantic import BaseModel, Field
 class TestResponse(BaseModel):
     success: bool = True
     user_agent: Optional[str] = Field(None, alias="User-Agent")
+
+
+class CacheStats(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+
+
+class CacheStatsResponse(BaseModel):
+    principal: CacheStats
+    token: CacheStats
+    count: CacheStats
+
+
+class PoolStatsResponse(BaseModel):
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
+    timeout: float
+    max_connections_per_worker: int
+    server_max_connections: int
+    # read replicas of the worker, each with a pool of the same size
+    replicas: int
@@ -1,15 +1,38 @@
-from typing import List
+from typing import AsyncIterator, Optional, Tuple
 
-from fastapi import APIRouter, Body, HTTPException, Path
-from pydantic import ValidationError
+import orjson
+from fastapi import APIRouter, Body, HTTPException, Path, Query
 from sqlalchemy.exc import IntegrityError, DatabaseError
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
 
-from .schemas import UserCreateSchema, UserReadSchema
+from .schemas import UserCreateSchema, UserReadSchema, UserPageSchema
 from server.apps.staff.services import (
-    create_new_random_user, get_users, create_user, get_user_by_id, delete_user, users_count
+    create_new_random_user,
+    get_users,
+    get_users_page,
+    stream_users,
+    create_user,
+    get_user_by_id,
+    delete_user,
+    users_count,
 )
-from server.shared.utils.database import get_db_session
-from server.shared.api.responses import BadRequestJsonResponse, NotFoundJsonResponse
+from server.shared.utils.database import get_db_session, CountMode, STREAM_BATCH_SIZE
+from server.shared.api.conditional import etag_matches, not_modified, row_etag, rows_etag, validators
+from server.shared.api.fieldsets import InvalidFields, parse_fields
+from server.shared.api.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor
+from server.shared.api.responses import (
+    BadRequestJsonResponse,
+    NotFoundJsonResponse,
+    default_encoder,
+    row_as_dict,
+    rows_as_dicts,
+    schema_response,
+)
+from server.shared.api.routing import TimedAPIRoute
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+FIELDS_DESCRIPTION = "Comma-separated fields of users to return, e.g. `id,username`"
 
 
 staff_api_router = APIRouter(
@@ -18,7 +41,8 @@ staff_api_router = APIRouter(
         # Depends(verify_token),
     ],
     tags=["Users"],
-    prefix="/users"
+    prefix="/users",
+    route_class=TimedAPIRoute,
 )
 
 
@@ -43,13 +67,66 @@ async def users_create_random_endpoint():
     return await create_new_random_user()
 
 
+def user_columns(fields: Optional[Tuple[str, ...]]) -> Optional[Tuple[str, ...]]:
+    # id and xmin are always needed for cursors and ETags
+    return None if fields is None else (*fields, "id", "xmin")
+
+
+async def users_as_ndjson(fields: Optional[Tuple[str, ...]] = None) -> AsyncIterator[bytes]:
+    chunk = []
+    async for user in stream_users(only=fields):
+        chunk.append(orjson.dumps(row_as_dict(UserReadSchema, user, fields), default=default_encoder))
+        if len(chunk) == STREAM_BATCH_SIZE:
+            yield b"\n".join(chunk) + b"\n"
+            chunk.clear()
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
 @staff_api_router.get(
     "",
-    response_model=List[UserReadSchema],
+    response_model=UserPageSchema,
     name="users:list",
 )
-async def users_list_endpoint():
-    return await get_users()
+async def users_list_endpoint(
+        request: Request,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        after: Optional[str] = Query(None, description="Opaque cursor of the next page"),
+        stream: bool = Query(False, description="Stream all users as newline-delimited JSON"),
+        with_total: bool = Query(False, description="Include estimated number of users"),
+        fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
+    try:
+        fields = parse_fields(fields, UserReadSchema)
+        after_id = decode_cursor(after) if after else None
+    except (InvalidFields, InvalidCursor) as ex:
+        return BadRequestJsonResponse(content=str(ex))
+
+    if stream:
+        return StreamingResponse(users_as_ndjson(fields), media_type=NDJSON_MEDIA_TYPE)
+
+    # one extra row tells whether the next page exists without issuing count(*)
+    users = await get_users_page(limit=limit + 1, after_id=after_id, only=user_columns(fields))
+    next_cursor = next_url = None
+    headers = {}
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1].id)
+        next_url = str(request.url.include_query_params(after=next_cursor))
+        headers["Link"] = f'<{next_url}>; rel="next"'
+
+    total = await users_count(mode=CountMode.ESTIMATED) if with_total else None
+    etag = rows_etag(users, next_cursor, total, fields)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    headers.update(validators(etag))
+    items = rows_as_dicts(UserReadSchema, users, fields)
+    return schema_response(
+        UserPageSchema,
+        {"items": items, "next_cursor": next_cursor, "next": next_url, "total": total},
+        headers=headers,
+        partial=fields is not None,
+    )
 
 
 @staff_api_router.post(
@@ -86,13 +163,29 @@ async def users_create_endpoint(
     response_model=UserReadSchema,
     name="users:get"
 )
-async def users_retrieve_endpoint(user_id: int = Path(...)):
-    user = await get_user_by_id(user_id)
+async def users_retrieve_endpoint(
+        request: Request,
+        user_id: int = Path(...),
+        fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION),
+):
     try:
-        return UserReadSchema.from_orm(user)
-    except ValidationError:
+        fields = parse_fields(fields, UserReadSchema)
+    except InvalidFields as ex:
+        return BadRequestJsonResponse(content=str(ex))
+
+    if (user := await get_user_by_id(user_id, only=user_columns(fields))) is None:
         return NotFoundJsonResponse(content="user does not exist")
 
+    etag = row_etag(user, fields)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return schema_response(
+        UserReadSchema,
+        row_as_dict(UserReadSchema, user, fields),
+        headers=validators(etag),
+        partial=fields is not None,
+    )
+
 
 @staff_api_router.delete(
     "/{user_id}",
@@ -102,8 +195,10 @@ async def users_retrieve_endpoint(user_id: int = Path(...)):
 )
 async def users_delete_endpoint(user_id: int = Path(...)):
     try:
-        await delete_user(user_id=user_id)
+        deleted_users = await delete_user(user_id=user_id)
     except DatabaseError:
+        deleted_users = []
+    if not deleted_users:
         raise HTTPException(
             status_code=400, detail=f"There isn't entry with id={user_id}"
         )
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 
 from pydantic import BaseModel, Field, EmailStr
 
@@ -28,10 +28,18 @@ class UserReadSchema(BaseModel):
     id: int
     first_name: str
     last_name: str
-    phone_number: str
+    phone_number: Optional[str]
     email: EmailStr
     balance: float
     username: str
 
     class Config:
         orm_mode = True
+
+
+class UserPageSchema(BaseModel):
+    items: List[UserReadSchema]
+    next_cursor: Optional[str] = None
+    next: Optional[str] = None
+    # planner estimation, requested with `with_total=true`
+    total: Optional[int] = None
@@ -4,23 +4,47 @@ from argon2 import PasswordHasher as ArgonPasswordHasher
 from fastapi import FastAPI
 from fastapi.exceptions import HTTPException, RequestValidationError
 from fastapi.openapi.utils import get_openapi
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.cors import CORSMiddleware
-from starlette.middleware.sessions import SessionMiddleware
 
 from .builder import BaseFastAPIApplicationBuilder
-from .errors import http_error_handler, http422_error_handler
+from .errors import (
+    http_error_handler,
+    http422_error_handler,
+    login_rate_limited_handler,
+    password_hasher_overloaded_handler,
+)
 from .events import create_on_startup_handler, create_on_shutdown_handler
-from .middlewares import add_process_time_header
+from .middlewares import (
+    DataLoaderMiddleware,
+    DependencyScopeMiddleware,
+    DrainingMiddleware,
+    MetricsMiddleware,
+    QueryStatsMiddleware,
+    RequestDrain,
+    ServerSideSessionMiddleware,
+    ServerTimingMiddleware,
+)
 from .routers import setup_routes_v1
+from server.api.metrics.endpoints import metrics_api_router
 from server.config.infrastructure.databases.postgres import DatabaseComponents, AsyncDatabaseComponents
 from server.config.settings import make_fastapi_instance_kwargs, Settings
-from server.apps.authentication.sequrity.oauth.integrations import OAUTH_INTEGRATIONS
-from server.apps.authentication.sequrity.oauth.authentication import register_integrations
-from server.shared.di import injector
+from server.jobs import create_job_queue
+from server.apps.authentication.sequrity.oauth.authentication import create_oauth
+from server.apps.authentication.sequrity.hashers import ExecutorPasswordHasher, PasswordHasherOverloaded
+from server.apps.authentication.sequrity.rate_limit import LoginRateLimited
+from server.apps.authentication.sequrity.jwt.authentication import JWTAuthenticationService, JWTLoginService
+from server.shared.di import Lifetime, injector
 from server.shared.dependencies.database import AsyncDatabase, Database
 from server.shared.dependencies.settings import Settings
-from server.shared.dependencies.auth import PasswordHasher, OAuth
+from server.shared.dependencies.auth import PasswordHasher, AsyncPasswordHasher, OAuth
+from server.shared.dependencies.cache import CountCache, PrincipalCache, TokenCache
+from server.shared.dependencies.jobs import JobQueue
+from server.shared.dependencies.rate_limit import RateLimitStore
+from server.shared.dependencies.sessions import SessionStore
+from server.shared.utils.cache import TTLCache
+from server.shared.utils.rate_limit import create_rate_limit_store
+from server.shared.utils.sessions import create_session_store
 
 ALLOWED_METHODS = ["POST", "PUT", "DELETE", "GET"]
 
@@ -31,6 +55,7 @@ class DevelopmentApplicationBuilder(BaseFastAPIApplicationBuilder):
     def __init__(self, settings: Settings) -> None:
         super().__init__(settings=settings)
         self.app: FastAPI = FastAPI(
+            default_response_class=ORJSONResponse,
             **make_fastapi_instance_kwargs(app_settings=self._settings.application)
         )  # type: ignore
         self.app.config = self._settings  # type: ignore
@@ -50,7 +75,6 @@ class DevelopmentApplicationBuilder(BaseFastAPIApplicationBuilder):
 
     @no_type_check
     def setup_middlewares(self):
-        self.app.add_middleware(BaseHTTPMiddleware, dispatch=add_process_time_header)
         self.app.add_middleware(
             middleware_class=CORSMiddleware,
             allow_origins=self._settings.application.backend_cors_origins,
@@ -60,25 +84,62 @@ class DevelopmentApplicationBuilder(BaseFastAPIApplicationBuilder):
             expose_headers=["User-Agent", "Authorization"],
         )
         self.app.add_middleware(
-            middleware_class=SessionMiddleware,
-            secret_key=self._settings.application.secret_key
+            ServerSideSessionMiddleware,
+            cookie_name=self._settings.session.cookie_name,
+            max_age=self._settings.session.max_age,
+            same_site=self._settings.session.same_site,
+            https_only=self._settings.session.https_only,
         )
+        self.app.add_middleware(DataLoaderMiddleware)
+        self.app.add_middleware(DependencyScopeMiddleware)
+        self.app.add_middleware(
+            QueryStatsMiddleware,
+            debug=self._settings.application.debug,
+            statements_warning=self._settings.database.statements_per_request_warning,
+        )
+        # the last added middlewares are the outermost ones, so timings cover all the other middlewares
+        self.app.add_middleware(ServerTimingMiddleware)
+        # shutdown handler drains requests through the same object
+        self.app.state.drain = RequestDrain()
+        self.app.add_middleware(DrainingMiddleware, drain=self.app.state.drain)
+        self.app.add_middleware(MetricsMiddleware)
 
     @no_type_check
     def configure_routes(self):
         self.app.include_router(setup_routes_v1(self._settings.application))
+        self.app.include_router(metrics_api_router)
 
     def configure_exception_handlers(self) -> None:
         self.app.add_exception_handler(HTTPException, http_error_handler)
         self.app.add_exception_handler(RequestValidationError, http422_error_handler)
+        self.app.add_exception_handler(PasswordHasherOverloaded, password_hasher_overloaded_handler)
+        self.app.add_exception_handler(LoginRateLimited, login_rate_limited_handler)
 
     def configure_application_dependencies(self) -> None:
         self.app.state.settings = self._settings
         injector.register(Settings, lambda: self._settings)
-        injector.register(Database, DatabaseComponents)
+        injector.register(Database, DatabaseComponents, lazy=True)
         injector.register(AsyncDatabase, AsyncDatabaseComponents)
-        injector.register(PasswordHasher, ArgonPasswordHasher)
-        injector.register(OAuth, lambda: register_integrations(*OAUTH_INTEGRATIONS))
+        injector.register(PasswordHasher, ArgonPasswordHasher, lazy=True)
+        injector.register(AsyncPasswordHasher, ExecutorPasswordHasher, lazy=True)
+        injector.register(PrincipalCache, lambda: TTLCache(
+            maxsize=self._settings.security.principal_cache_size,
+            ttl=self._settings.security.principal_cache_ttl,
+        ))
+        injector.register(TokenCache, lambda: TTLCache(
+            maxsize=self._settings.security.token_cache_size,
+            ttl=self._settings.security.token_cache_ttl,
+        ))
+        injector.register(CountCache, lambda: TTLCache(
+            maxsize=self._settings.database.count_cache_size,
+            ttl=self._settings.database.count_cache_ttl,
+        ))
+        injector.register(JWTAuthenticationService, JWTAuthenticationService)
+        injector.register(JWTLoginService, JWTLoginService, lifetime=Lifetime.SCOPED)
+        injector.register(OAuth, lambda: create_oauth(self._settings.oauth), lazy=True)
+        injector.register(SessionStore, lambda: create_session_store(self._settings.session), lazy=True)
+        injector.register(RateLimitStore, lambda: create_rate_limit_store(self._settings.login_rate_limit), lazy=True)
+        injector.register(JobQueue, lambda: create_job_queue(self._settings), lazy=True)
 
     def configure_events(self) -> None:
         self.app.add_event_handler("startup", create_on_startup_handler(self.app))
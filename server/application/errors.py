@@ -7,7 +7,12 @@ from fastapi.openapi.utils import validation_error_response_definition
 from pydantic import ValidationError
 from starlette.requests import Request
 from starlette.responses import JSONResponse
-from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
+from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY, HTTP_429_TOO_MANY_REQUESTS, HTTP_503_SERVICE_UNAVAILABLE
+
+from server.apps.authentication.sequrity.hashers import PasswordHasherOverloaded
+from server.apps.authentication.sequrity.rate_limit import LoginRateLimited
+
+PASSWORD_HASHER_RETRY_AFTER_SECONDS = 1
 
 
 async def http_error_handler(_: Request, exc: HTTPException) -> JSONResponse:
@@ -24,6 +29,22 @@ async def http422_error_handler(
     )
 
 
+async def password_hasher_overloaded_handler(_: Request, exc: PasswordHasherOverloaded) -> JSONResponse:
+    return JSONResponse(
+        {"errors": [exc.message]},
+        status_code=HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(PASSWORD_HASHER_RETRY_AFTER_SECONDS)},
+    )
+
+
+async def login_rate_limited_handler(_: Request, exc: LoginRateLimited) -> JSONResponse:
+    return JSONResponse(
+        {"errors": [exc.message]},
+        status_code=HTTP_429_TOO_MANY_REQUESTS,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 validation_error_response_definition["properties"] = {
     "errors": {
         "title": "Errors",
@@ -1,19 +1,67 @@
+import logging
+import time
 from typing import Callable, Coroutine, Any
 
 from fastapi import FastAPI
 
+logger = logging.getLogger(__name__)
+
 
 # noinspection PyUnusedLocal
 def create_on_startup_handler(app: FastAPI) -> Callable[..., Coroutine[Any, Any, None]]:
     async def on_startup() -> None:
-        from server.config.infrastructure.databases.postgres import create_all, recreate
-        await create_all(app.state.settings.database.connection_uri)
+        from server.application.warmup import warm_up
+        from server.config.infrastructure.databases.schema import SchemaMode, ensure_schema
+        from server.shared.di import injector
+        from server.shared.dependencies.database import AsyncDatabase
+        database_settings = app.state.settings.database
+        database = injector.get(AsyncDatabase)
+        # the pooled engine of the application is reused, so no extra engine is created and left open
+        await ensure_schema(database.engine, SchemaMode(database_settings.startup_schema))
+        # the worker reports ready only after startup handlers, so first requests find everything warm
+        if database_settings.warm_up_connections > 0:
+            await warm_up(app, database, min(database_settings.warm_up_connections, database_settings.pool_size))
+        database.start_liveness_check()
 
     return on_startup
 
 
 def create_on_shutdown_handler(app: FastAPI) -> Callable[..., Coroutine[Any, Any, None]]:
     async def on_shutdown() -> None:
-        ...
+        """
+        Drain, then dispose: new requests are rejected, in-flight requests and transactions get
+        `shutdown_timeout` seconds to finish, then database pools are closed.
+        Uvicorn sends the lifespan shutdown only after all connections are closed, so under gunicorn requests are
+        drained by `DrainingServer` before that, and here the rest of the same deadline is left for the pools
+        """
+        from server.shared.di import injector
+        from server.shared.dependencies.auth import AsyncPasswordHasher, OAuth
+        from server.shared.dependencies.database import AsyncDatabase, Database
+        from server.shared.dependencies.jobs import JobQueue
+
+        drain = app.state.drain
+        # the server usually started draining on the exit signal (see `DrainingServer`), then it's the same deadline
+        drain.start()
+        deadline = drain.started_at + app.state.settings.application.shutdown_timeout
+        if not await drain.wait(timeout=deadline - time.monotonic()):
+            logger.warning("Shutdown deadline reached with %d requests in flight", drain.in_flight)
+
+        # lazy dependencies, that were never used, aren't created just to be closed
+        if (jobs := injector.peek(JobQueue)) is not None:
+            # deferred jobs of the drained requests may still need the database
+            await jobs.shutdown(timeout=max(deadline - time.monotonic(), 0.0))
+        if (password_hasher := injector.peek(AsyncPasswordHasher)) is not None:
+            password_hasher.shutdown()
+        if (oauth := injector.peek(OAuth)) is not None:
+            await oauth.shutdown()
+        database = injector.get(AsyncDatabase)
+        await database.stop_liveness_check()
+        stats = await database.dispose(timeout=max(deadline - time.monotonic(), 0.0))
+        if (sync_database := injector.peek(Database)) is not None:
+            stats["closed"] += sync_database.dispose()
+        logger.info(
+            "Database pools are closed: %d connections closed cleanly, %d were still in use",
+            stats["closed"], stats["in_use"],
+        )
 
     return on_shutdown
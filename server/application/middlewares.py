@@ -1,15 +1,332 @@
+import asyncio
+import json
+import logging
+import secrets
 import time
-from typing import Coroutine, Any, Callable
+import typing
 
-from fastapi.openapi.models import Response
-from starlette.requests import Request
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
+from server.shared.di import injector
+from server.shared.di.dependency_provider import scoped_instances
+from server.shared.dependencies.database import AsyncDatabase
+from server.shared.dependencies.sessions import SessionStore
+from server.shared.metrics import (
+    DB_STATEMENTS_PER_REQUEST,
+    DB_TIME_PER_REQUEST,
+    HTTP_REQUESTS,
+    HTTP_REQUESTS_IN_PROGRESS,
+    HTTP_REQUEST_DURATION,
+    observe_pool,
+)
+from server.shared.utils.dataloader import dataloader_scope
+from server.shared.utils.query_stats import QueryStats, query_stats
+from server.shared.utils.sessions import Session
+from server.shared.utils.timing import RequestTimings, request_timings
 
-async def add_process_time_header(
-        request: Request, call_next: Callable[[Request], Coroutine[Any, Any, Response]]
-) -> Response:
-    start_time = time.monotonic()
-    response = await call_next(request)
-    process_time = time.monotonic() - start_time
-    response.headers["X-Process-Time"] = str(process_time)  # type: ignore  # noqa
-    return response
+logger = logging.getLogger("sqlalchemy.execution")
+
+
+class RequestDrain:
+    """
+    Requests in flight of the worker. On shutdown it starts draining:
+    new requests are rejected and the shutdown handler waits until the running ones are finished
+    """
+
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.draining = False
+        # monotonic time when draining started, the shutdown deadline counts from it
+        self.started_at: typing.Optional[float] = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def enter(self) -> None:
+        self.in_flight += 1
+        self._idle.clear()
+
+    def exit(self) -> None:
+        self.in_flight -= 1
+        if not self.in_flight:
+            self._idle.set()
+
+    def start(self) -> None:
+        if not self.draining:
+            self.draining = True
+            self.started_at = time.monotonic()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait until no requests are in flight, return False if some are still running after timeout"""
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class DrainingMiddleware:
+    """
+    Pure ASGI middleware, that counts requests in flight
+    and answers `503 Service Unavailable` with `Connection: close` once the worker is shutting down,
+    so keep-alive clients reconnect to another worker instead of being cut off
+    """
+
+    def __init__(self, app: ASGIApp, drain: RequestDrain) -> None:
+        self.app = app
+        self.drain = drain
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if self.drain.draining:
+            response = JSONResponse(
+                {"errors": ["server is shutting down"]},
+                status_code=503,
+                headers={"Connection": "close", "Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        self.drain.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.drain.exit()
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware, that reports where the request time was spent in the `Server-Timing` header:
+
+        Server-Timing: db;dur=3.10, hash;dur=41.52, serialize;dur=0.85, total;dur=47.30
+
+    `total` is measured until the response headers are sent, so streaming responses aren't buffered
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = request_timings.set(timings)
+        started_at = time.perf_counter()
+
+        async def send_with_timings(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_started_at = time.perf_counter()
+                if timings.endpoint_finished_at is not None:
+                    timings.add("serialize", response_started_at - timings.endpoint_finished_at)
+                timings.add("total", response_started_at - started_at)
+
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.as_server_timing())
+                headers["X-Process-Time"] = str(response_started_at - started_at)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            request_timings.reset(token)
+
+
+class QueryStatsMiddleware:
+    """
+    Pure ASGI middleware, that collects statements executed during the request.
+    In debug mode they are reported in response headers:
+
+        X-DB-Query-Count: 3
+        X-DB-Time: 0.0041
+        X-DB-Slowest-Query: select_page:User;dur=0.0029
+
+    they are always exported as `db_statements_per_request` and `db_time_per_request_seconds` metrics,
+    and requests with more than `statements_warning` statements are logged
+    """
+
+    def __init__(self, app: ASGIApp, debug: bool = False, statements_warning: int = 20) -> None:
+        self.app = app
+        self.debug = debug
+        self.statements_warning = statements_warning
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = query_stats.set(stats)
+
+        async def send_with_query_stats(message: Message) -> None:
+            if message["type"] == "http.response.start" and self.debug:
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(stats.count)
+                headers["X-DB-Time"] = f"{stats.total_seconds:.4f}"
+                if stats.slowest_statement is not None:
+                    headers["X-DB-Slowest-Query"] = f"{stats.slowest_statement};dur={stats.slowest_seconds:.4f}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_query_stats)
+        finally:
+            query_stats.reset(token)
+            DB_STATEMENTS_PER_REQUEST.observe(stats.count)
+            DB_TIME_PER_REQUEST.observe(stats.total_seconds)
+            if stats.count > self.statements_warning:
+                logger.warning(
+                    "%s %s executed %d statements in %.4fs, the slowest is %s",
+                    scope["method"], scope["path"], stats.count, stats.total_seconds, stats.slowest_statement
+                )
+
+
+class DataLoaderMiddleware:
+    """
+    Pure ASGI middleware, that opens a data loader scope per request,
+    so lookups like `get_user_by_id` made by dependencies and the endpoint are batched and memoized together
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with dataloader_scope():
+            await self.app(scope, receive, send)
+
+
+class DependencyScopeMiddleware:
+    """Pure ASGI middleware, that opens a dependency scope per request, scoped dependencies live until the response"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # the context variable is set directly, it's cheaper than entering `dependency_scope()`
+        token = scoped_instances.set({})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            scoped_instances.reset(token)
+
+
+class ServerSideSessionMiddleware:
+    """
+    Pure ASGI middleware, that keeps `request.session` in a `SessionStore`, the cookie carries only a random id.
+    The store is read only for requests with the cookie and written only when the session was changed,
+    an emptied session is deleted. Unknown ids aren't reused, a new session always gets a new id
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            store: typing.Optional[SessionStore] = None,
+            cookie_name: str = "session_id",
+            max_age: int = 14 * 24 * 60 * 60,
+            same_site: str = "lax",
+            https_only: bool = False,
+    ) -> None:
+        self.app = app
+        self._store = store
+        self.cookie_name = cookie_name
+        self.max_age = max_age
+        self.security_flags = "httponly; samesite=" + same_site
+        if https_only:
+            self.security_flags += "; secure"
+
+    @property
+    def store(self) -> SessionStore:
+        # resolved on first use, the store is a lazy dependency
+        if self._store is None:
+            self._store = injector.get(SessionStore)
+        return self._store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id = HTTPConnection(scope).cookies.get(self.cookie_name)
+        data = await self.store.load(session_id) if session_id else None
+        if data is None:
+            session_id = None
+        session = scope["session"] = Session(json.loads(data) if data else {})
+
+        async def send_with_session(message: Message) -> None:
+            nonlocal session_id
+            if message["type"] == "http.response.start" and session.modified:
+                path = scope.get("root_path", "") or "/"
+                headers = MutableHeaders(scope=message)
+                if session:
+                    session_id = session_id or secrets.token_urlsafe(32)
+                    await self.store.save(session_id, json.dumps(session))
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.cookie_name}={session_id}; path={path}; Max-Age={self.max_age}; {self.security_flags}",
+                    )
+                elif session_id:
+                    await self.store.delete(session_id)
+                    headers.append(
+                        "Set-Cookie",
+                        f"{self.cookie_name}=null; path={path}; expires=Thu, 01 Jan 1970 00:00:00 GMT; "
+                        f"{self.security_flags}",
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_with_session)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware, that exports request count, latency and in-progress requests to prometheus.
+    Requests are labelled with the route path template, so `/users/1` and `/users/2` are the same series
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        started_at = time.perf_counter()
+        duration = None
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status_code, duration
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                duration = time.perf_counter() - started_at
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            in_progress.dec()
+            # router puts matched api route into the scope, the rest (docs, 404) share one series
+            route = scope.get("route")
+            route_path = route.path if route is not None else "<other>"
+            HTTP_REQUESTS.labels(method, route_path, str(status_code)).inc()
+            HTTP_REQUEST_DURATION.labels(method, route_path).observe(
+                duration if duration is not None else time.perf_counter() - started_at
+            )
+            if engine := getattr(injector.get(AsyncDatabase), "engine", None):
+                observe_pool(engine.pool)
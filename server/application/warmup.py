@@ -0,0 +1,80 @@
+"""
+Warm-up stage of a worker, that runs on startup before the worker reports ready,
+so the first requests don't pay for lazy initialization:
+
+* pool connections are opened (connecting and the dialect initialization aren't free)
+* hot statements are executed on every opened connection, it fills SQLAlchemy compiled cache
+  and prepared statement cache of asyncpg, that is kept per connection
+* OpenAPI schema is generated and response schemas are touched
+"""
+import asyncio
+import contextlib
+import logging
+import time
+import typing
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from server.apps.staff.models import User
+from server.config.infrastructure.databases.postgres import current_session
+from server.shared.api.responses import row_as_dict
+from server.shared.utils.database import exists, select_in, select_one, select_page
+
+logger = logging.getLogger(__name__)
+
+# statements of the hottest endpoints, parameters don't match anything, only plans and compiled forms matter
+HOT_STATEMENTS: typing.List[typing.Callable[[], typing.Awaitable[typing.Any]]] = [
+    lambda: select_in(User, User.id, [0]),
+    lambda: select_in(User, User.username, [""]),
+    lambda: select_one(User, User.id == 0),
+    lambda: select_page(User, limit=1, after=0),
+    lambda: exists(User, User.id == 0),
+]
+
+
+async def run_hot_statements(connection: AsyncConnection) -> None:
+    async with AsyncSession(bind=connection) as session:
+        token = current_session.set(session)
+        try:
+            for statement in HOT_STATEMENTS:
+                await statement()
+        finally:
+            current_session.reset(token)
+            await session.rollback()
+
+
+async def warm_up_engine(engine: AsyncEngine, connections: int) -> None:
+    async with contextlib.AsyncExitStack() as stack:
+        # connections are held together, otherwise the pool would hand out the same one again and again
+        opened = await asyncio.gather(*(stack.enter_async_context(engine.connect()) for _ in range(connections)))
+        for connection in opened:
+            await run_hot_statements(connection)
+
+
+def warm_up_schemas(app: FastAPI) -> None:
+    app.openapi()
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.response_model is not None:
+            model = route.response_model
+            # generic response models (e.g. `List[Schema]`) have nothing to touch
+            if isinstance(model, type) and issubclass(model, BaseModel):
+                model.schema()
+                row_as_dict(model, dict.fromkeys(field.alias for field in model.__fields__.values()))
+
+
+async def warm_up(app: FastAPI, database: typing.Any, connections: int) -> None:
+    started_at = time.perf_counter()
+    engines = [database.engine, *getattr(database, "replica_engines", ())]
+    results = await asyncio.gather(*(warm_up_engine(engine, connections) for engine in engines), return_exceptions=True)
+    for error in (result for result in results if isinstance(result, Exception)):
+        # the worker still starts, the pool connects lazily as before
+        logger.warning("Warm-up of database connections failed: %r", error)
+    try:
+        warm_up_schemas(app)
+    except Exception:
+        # a broken schema fails the requests of its endpoint later, not the whole worker
+        logger.exception("Warm-up of response schemas failed")
+    logger.info("Worker is warmed up in %.3fs", time.perf_counter() - started_at)
@@ -0,0 +1,15 @@
+from datetime import datetime, timezone
+import typing
+
+from server.apps.audit.models import AuditEvent
+from server.jobs import batch_job
+from server.shared.utils.database import create_many
+
+
+@batch_job("audit.write_events", batch_size=500)
+async def write_audit_events(payloads: typing.List[typing.Dict[str, typing.Any]]) -> None:
+    # events of a batch are written with one statement
+    await create_many(AuditEvent, [
+        {**payload, "created_at": datetime.fromtimestamp(payload["created_at"], timezone.utc)}
+        for payload in payloads
+    ])
@@ -0,0 +1,13 @@
+import sqlalchemy as sa
+from sqlalchemy import Identity
+
+from server.config.infrastructure.databases.postgres import Base
+
+
+class AuditEvent(Base):
+    id = sa.Column(sa.BigInteger, Identity(always=True, cache=50), primary_key=True)
+    event = sa.Column(sa.VARCHAR(50), nullable=False)
+    username = sa.Column(sa.VARCHAR(70), index=True)
+    client_ip = sa.Column(sa.VARCHAR(45))
+    # when it happened, rows are written later by the job
+    created_at = sa.Column(sa.TIMESTAMP(timezone=True), nullable=False)
@@ -0,0 +1,22 @@
+import logging
+import time
+import typing
+
+from server.apps.audit.jobs import write_audit_events
+
+logger = logging.getLogger(__name__)
+
+
+async def record_audit_event(
+        event: str, *, username: typing.Optional[str] = None, client_ip: typing.Optional[str] = None
+) -> None:
+    """Best effort, the request goes on without its audit event when the queue is unavailable"""
+    try:
+        await write_audit_events.defer({
+            "event": event,
+            "username": username,
+            "client_ip": client_ip,
+            "created_at": time.time(),
+        })
+    except Exception:
+        logger.exception("Audit event %s of %s wasn't recorded", event, username)
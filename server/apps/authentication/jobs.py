@@ -0,0 +1,18 @@
+import typing
+
+from server.apps.staff.services import update_password_hash
+from server.jobs import job
+from server.shared.di import injector
+from server.shared.dependencies.auth import AsyncPasswordHasher
+
+
+# the payload holds the password, so the job never leaves the process
+@job("authentication.rehash_password", local=True, max_attempts=3)
+async def rehash_password(payload: typing.Dict[str, typing.Any]) -> None:
+    hasher: AsyncPasswordHasher = injector.get(AsyncPasswordHasher)
+    await update_password_hash(
+        password_hash=await hasher.hash(payload["password"]),
+        user_id=payload["user_id"],
+        # the password may have been changed meanwhile, the newer hash isn't overwritten then
+        current_hash=payload["password_hash"],
+    )
@@ -0,0 +1,119 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+import os
+import time
+from typing import Any, Callable, Literal, Optional, Tuple, Union
+
+from server.config.settings import PasswordHasherSettings
+from server.shared.di import injector
+from server.shared.dependencies.auth import PasswordHasher
+from server.shared.dependencies.settings import Settings
+from server.shared.metrics import PASSWORD_HASHER_DURATION, PASSWORD_HASHER_REJECTED
+from server.shared.utils.timing import record_timing
+
+
+class PasswordHasherOverloaded(Exception):
+    def __init__(self, message: str = "too many concurrent password hashing requests, try again later"):
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+@dataclass
+class PasswordHasherStats:
+    completed: int = 0
+    rejected: int = 0
+    queue_wait_seconds: float = 0.0
+    compute_seconds: float = 0.0
+
+
+def _timed_call(function: Callable[..., Any], *args: Any) -> Tuple[Any, Optional[BaseException], float]:
+    # executed inside the pool worker, so the measured time is a pure hashing cost,
+    # failed verification is returned instead of raised to keep its timing too
+    started_at = time.perf_counter()
+    try:
+        return function(*args), None, time.perf_counter() - started_at
+    except Exception as ex:
+        return None, ex, time.perf_counter() - started_at
+
+
+class ExecutorPasswordHasher:
+    """
+    Async facade over a blocking `PasswordHasher`, that runs hashing in a dedicated thread/process pool,
+    so argon2 doesn't block the event loop.
+
+    At most `max_workers + max_queue_size` calls are accepted at once, the rest are waiting for a free slot
+    up to `queue_timeout` seconds and then rejected with `PasswordHasherOverloaded`
+    """
+
+    def __init__(
+            self, hasher: Optional[PasswordHasher] = None, settings: Optional[PasswordHasherSettings] = None
+    ) -> None:
+        if hasher is None:
+            hasher = injector.get(PasswordHasher)
+        if settings is None:
+            settings = injector.get(Settings).password_hasher
+        self._hasher = hasher
+        self._settings = settings
+        self._slots = asyncio.Semaphore(settings.max_workers + settings.max_queue_size)
+        self._executor: Optional[Executor] = None
+        self._executor_pid: Optional[int] = None
+        self.stats = PasswordHasherStats()
+
+    async def hash(self, password: Union[str, bytes]) -> str:
+        return await self._run(self._hasher.hash, password)
+
+    async def verify(self, hash: Union[str, bytes], password: Union[str, bytes]) -> Literal[True]:
+        return await self._run(self._hasher.verify, hash, password)
+
+    def check_needs_rehash(self, hash: str) -> bool:
+        # only parses parameters of the hash, it's cheap enough to stay on the event loop
+        return self._hasher.check_needs_rehash(hash)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, function: Callable[..., Any], *args: Any) -> Any:
+        submitted_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self._settings.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats.rejected += 1
+            PASSWORD_HASHER_REJECTED.inc()
+            raise PasswordHasherOverloaded()
+
+        compute_time = 0.0
+        try:
+            loop = asyncio.get_running_loop()
+            result, error, compute_time = await loop.run_in_executor(
+                self._get_executor(), _timed_call, function, *args
+            )
+        finally:
+            self._slots.release()
+            elapsed = time.perf_counter() - submitted_at
+            self.stats.completed += 1
+            self.stats.compute_seconds += compute_time
+            self.stats.queue_wait_seconds += elapsed - compute_time
+            PASSWORD_HASHER_DURATION.labels(function.__name__, "wait").observe(elapsed - compute_time)
+            PASSWORD_HASHER_DURATION.labels(function.__name__, "compute").observe(compute_time)
+            record_timing("hash", elapsed)
+
+        if error is not None:
+            raise error
+        return result
+
+    def _get_executor(self) -> Executor:
+        # pool is created lazily and recreated after fork, because worker threads/processes aren't inherited
+        if self._executor is None or self._executor_pid != os.getpid():
+            if self._settings.executor == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self._settings.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._settings.max_workers, thread_name_prefix="password-hasher"
+                )
+            self._executor_pid = os.getpid()
+        return self._executor
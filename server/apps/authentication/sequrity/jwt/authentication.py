@@ -1,6 +1,8 @@
 from dataclasses import dataclass, field as dc_field
 from datetime import datetime, timedelta
-from typing import Any, Dict, NewType
+import hashlib
+import time
+from typing import Any, Dict, NewType, cast
 
 from argon2.exceptions import VerificationError
 import jwt
@@ -12,10 +14,12 @@ from starlette.requests import Request
 
 from server.apps.authentication.sequrity.jwt.dto import TokenPayload
 from server.apps.staff.models import User
-from server.apps.staff.services import get_user_by_username, update_password_hash
+from server.apps.authentication.jobs import rehash_password
+from server.apps.staff.services import get_principal_by_username, get_user_by_username
 from server.config.settings import Settings
 from server.shared.di import injector
-from server.shared.dependencies.auth import PasswordHasher
+from server.shared.dependencies.auth import AsyncPasswordHasher
+from server.shared.dependencies.cache import TokenCache
 from server.shared.dependencies.settings import Settings as SettingsProtocol
 
 JWTToken = NewType("JWTToken", str)
@@ -31,14 +35,14 @@ class UserIsUnauthorized(Exception):
 
 @dataclass
 class JWTLoginService:
-    password_hasher: PasswordHasher = dc_field(init=False)
+    settings: SettingsProtocol
+    password_hasher: AsyncPasswordHasher
     algorithm: str = dc_field(init=False)
     secret_key: str = dc_field(init=False)
     token_expires_in_minutes: float = dc_field(init=False)
 
     def __post_init__(self):
-        settings: Settings = injector.get(SettingsProtocol)
-        self.password_hasher = injector.get(PasswordHasher)
+        settings = cast(Settings, self.settings)
         self.algorithm = settings.security.jwt_algorithm
         self.secret_key = settings.security.jwt_secret_key
         self.token_expires_in_minutes = settings.security.jwt_access_token_expire_in_minutes
@@ -47,17 +51,19 @@ class JWTLoginService:
         if not (user := await get_user_by_username(str(form_data.username))):
             raise UserIsUnauthorized()
 
-        if self.password_hasher.check_needs_rehash(user.password_hash):
-            await update_password_hash(
-                password_hash=self.password_hasher.hash(form_data.password),
-                user_id=user.id
-            )
-
         try:
-            self.password_hasher.verify(user.password_hash, form_data.password)
+            await self.password_hasher.verify(user.password_hash, form_data.password)
         except VerificationError:
             raise UserIsUnauthorized()
 
+        # only a verified password is rehashed, and the new hash is computed after the response
+        if self.password_hasher.check_needs_rehash(user.password_hash):
+            await rehash_password.defer({
+                "user_id": user.id,
+                "password": form_data.password,
+                "password_hash": user.password_hash,
+            })
+
         return JWTToken(self._generate_jwt_token({
             "sub": form_data.username,
             "username": form_data.username,
@@ -75,13 +81,15 @@ class JWTLoginService:
 
 @dataclass
 class JWTAuthenticationService:
+    settings: SettingsProtocol
+    token_cache: TokenCache
     token_resolver: OAuth2PasswordBearer = dc_field(init=False)
     algorithm: str = dc_field(init=False)
     secret_key: str = dc_field(init=False)
     token_expires_in_minutes: float = dc_field(init=False)
 
     def __post_init__(self):
-        settings: Settings = injector.get(SettingsProtocol)
+        settings = cast(Settings, self.settings)
         self.token_resolver = OAuth2PasswordBearer(
             tokenUrl=f"{settings.application.api_prefix}/v1/oauth",
             scopes={
@@ -122,18 +130,28 @@ class JWTAuthenticationService:
         return await self._retrieve_user_or_raise_exception(token_payload.username)
 
     def _decode_token(self, token: str) -> TokenPayload:
+        # the same bearer token comes with every request of a client, so signature is verified only once
+        # and the payload is cached under the token digest until the token expires
+        token_digest = hashlib.sha256(token.encode()).digest()
+        if token_payload := self.token_cache.get(token_digest):
+            return token_payload
+
         try:
             payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return TokenPayload(username=payload["username"], scopes=payload.get("scopes", []))
-        except (jwt.DecodeError, ValidationError) as e:
+            token_payload = TokenPayload(username=payload["username"], scopes=payload.get("scopes", []))
+        except (jwt.InvalidTokenError, KeyError, ValidationError):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Input bearer token is incorrect",
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
+        expires_at = payload.get("exp")
+        self.token_cache.set(token_digest, token_payload, ttl=None if expires_at is None else expires_at - time.time())
+        return token_payload
+
     async def _retrieve_user_or_raise_exception(self, username: str) -> User:
-        if user := await get_user_by_username(username=username):  # type: User
+        if user := await get_principal_by_username(username=username):  # type: User
             return user
 
         raise HTTPException(
@@ -148,4 +166,5 @@ async def JWTAuthentication(
         security_scopes: SecurityScopes,
         authorization_: str = Header(None)  # hack to display header input in Swagger
 ):
-    return await JWTAuthenticationService()(request, security_scopes)
+    jwt_authentication: JWTAuthenticationService = injector.get(JWTAuthenticationService)
+    return await jwt_authentication(request, security_scopes)
@@ -0,0 +1,54 @@
+import typing
+
+from authlib.integrations.starlette_client import OAuth, StarletteOAuth2App
+
+from .metadata import ProviderMetadataCache
+from server.shared.utils.http import SharedTransport
+
+
+class CachedStarletteOAuth2App(StarletteOAuth2App):
+    """
+    OAuth 2 / OIDC client, that takes discovery metadata and JWKS from a `ProviderMetadataCache`
+    instead of keeping its own copy forever, and exchanges tokens over a shared keep-alive connection pool
+    """
+
+    metadata_cache: typing.Optional[ProviderMetadataCache] = None
+
+    def attach(self, metadata_cache: ProviderMetadataCache, transport: SharedTransport) -> None:
+        self.metadata_cache = metadata_cache
+        # authlib opens a client per call with these kwargs
+        self.client_kwargs = {**self.client_kwargs, "transport": transport}
+
+    async def load_server_metadata(self) -> typing.Dict[str, typing.Any]:
+        if self._server_metadata_url and self.metadata_cache is not None:
+            self.server_metadata.update(await self.metadata_cache.get(self._server_metadata_url))
+            return self.server_metadata
+        return await super().load_server_metadata()
+
+    async def fetch_jwk_set(self, force: bool = False) -> typing.Dict[str, typing.Any]:
+        metadata = await self.load_server_metadata()
+        if (uri := metadata.get("jwks_uri")) is None or self.metadata_cache is None:
+            return await super().fetch_jwk_set(force)
+        if force:
+            return await self.metadata_cache.refresh(uri)
+        return await self.metadata_cache.get(uri)
+
+
+class CachedOAuth(OAuth):
+    """OAuth registry, which clients share one metadata cache and one connection pool"""
+
+    oauth2_client_cls = CachedStarletteOAuth2App
+
+    def __init__(self, config: typing.Any, metadata_cache: ProviderMetadataCache, transport: SharedTransport) -> None:
+        super().__init__(config)
+        self.metadata_cache = metadata_cache
+        self.transport = transport
+
+    def create_client(self, name: str) -> typing.Any:
+        client = super().create_client(name)
+        if isinstance(client, CachedStarletteOAuth2App) and client.metadata_cache is None:
+            client.attach(self.metadata_cache, self.transport)
+        return client
+
+    async def shutdown(self) -> None:
+        await self.transport.shutdown()
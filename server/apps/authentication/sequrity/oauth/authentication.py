@@ -1,11 +1,27 @@
-from authlib.integrations.starlette_client import OAuth
+from pathlib import Path
+from typing import TYPE_CHECKING
+
 from starlette.config import Config
 
 from .dto import OAuthIntegration
+from .integrations import OAUTH_INTEGRATIONS
+from server.config.settings import OAuthSettings
+
+if TYPE_CHECKING:
+    from .apps import CachedOAuth
+    from .metadata import ProviderMetadataCache
+    from server.shared.utils.http import SharedTransport
 
 
-def register_integrations(config: Config, *integrations: OAuthIntegration) -> OAuth:
-    client = OAuth(config)
+def register_integrations(
+        config: Config,
+        *integrations: OAuthIntegration,
+        metadata_cache: "ProviderMetadataCache",
+        transport: "SharedTransport",
+) -> "CachedOAuth":
+    # authlib pulls in httpx and its OAuth 1/2 clients, it's imported only when OAuth is used
+    from .apps import CachedOAuth
+    client = CachedOAuth(config, metadata_cache=metadata_cache, transport=transport)
 
     for integration in integrations:
         client.register(
@@ -15,3 +31,21 @@ def register_integrations(config: Config, *integrations: OAuthIntegration) -> OA
         )
 
     return client
+
+
+def create_oauth(settings: OAuthSettings) -> "CachedOAuth":
+    """Registry of all integrations, that share provider metadata cache and keep-alive connections"""
+    from .metadata import ProviderMetadataCache
+    from server.shared.utils.http import SharedTransport
+
+    transport = SharedTransport(
+        max_connections=settings.http_max_connections, keepalive_expiry=settings.http_keepalive_expiry
+    )
+    metadata_cache = ProviderMetadataCache(
+        transport,
+        ttl=settings.metadata_ttl,
+        stale_ttl=settings.metadata_stale_ttl,
+        path=Path(settings.metadata_cache_path) if settings.metadata_cache_path else None,
+        timeout=settings.http_timeout,
+    )
+    return register_integrations(Config(), *OAUTH_INTEGRATIONS, metadata_cache=metadata_cache, transport=transport)
@@ -0,0 +1,135 @@
+import asyncio
+from dataclasses import asdict, dataclass
+import json
+import logging
+import os
+import pathlib
+import re
+import tempfile
+import time
+import typing
+
+import httpx
+
+from server.shared.utils.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+MAX_AGE = re.compile(r"max-age=(\d+)")
+
+
+@dataclass
+class MetadataEntry:
+    value: typing.Dict[str, typing.Any]
+    fetched_at: float
+    expires_at: float
+
+
+class ProviderMetadataCache:
+    """
+    OIDC discovery documents and JWKS of providers, shared by all requests of a worker.
+
+    A fresh entry is returned as is. An expired one is still returned for `stale_ttl` seconds,
+    while a background task refreshes it, so logins don't wait for the provider (stale-while-revalidate).
+    Only a missing or too old entry is fetched on the request path, concurrent misses share one fetch.
+    Entries live `ttl` seconds, unless the provider sends `Cache-Control: max-age`.
+
+    With `path` entries are kept in a JSON file and loaded on start, so restarted workers don't fetch them again
+    """
+
+    def __init__(
+            self,
+            transport: httpx.AsyncBaseTransport,
+            ttl: float = 3600.0,
+            stale_ttl: float = 86400.0,
+            path: typing.Optional[pathlib.Path] = None,
+            timeout: float = 10.0,
+            min_refresh_interval: float = 60.0,
+            clock: typing.Callable[[], float] = time.time,
+    ) -> None:
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.path = path
+        self.timeout = timeout
+        self.min_refresh_interval = min_refresh_interval
+        self._transport = transport
+        self._clock = clock
+        self._entries: typing.Dict[str, MetadataEntry] = self._load() if path else {}
+        self._fetches = SingleFlight()
+        self._background: typing.Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    async def get(self, url: str) -> typing.Dict[str, typing.Any]:
+        entry = self._entries.get(url)
+        now = self._clock()
+        if entry is not None and now < entry.expires_at:
+            self.hits += 1
+            return entry.value
+        if entry is not None and now < entry.expires_at + self.stale_ttl:
+            self.stale_hits += 1
+            self._refresh_in_background(url)
+            return entry.value
+        self.misses += 1
+        return await self._fetches.do(url, lambda: self._fetch(url))
+
+    async def refresh(self, url: str) -> typing.Dict[str, typing.Any]:
+        """
+        Fetch now, e.g. JWKS when a token is signed with an unknown key after rotation.
+        Tokens with bogus keys must not hammer the provider, so an entry younger than `min_refresh_interval` is kept
+        """
+        entry = self._entries.get(url)
+        if entry is not None and self._clock() - entry.fetched_at < self.min_refresh_interval:
+            return entry.value
+        return await self._fetches.do(url, lambda: self._fetch(url))
+
+    def stats(self) -> typing.Dict[str, int]:
+        return {"hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses, "size": len(self._entries)}
+
+    def _refresh_in_background(self, url: str) -> None:
+        if self._fetches.in_flight(url):
+            return
+        task = asyncio.ensure_future(self._refresh_quietly(url))
+        # the loop keeps only weak references to tasks
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _refresh_quietly(self, url: str) -> None:
+        try:
+            await self._fetches.do(url, lambda: self._fetch(url))
+        except Exception as error:
+            # the stale entry is served until it's too old, then the request path fetches and fails loudly
+            logger.warning("Refresh of %s failed: %r", url, error)
+
+    async def _fetch(self, url: str) -> typing.Dict[str, typing.Any]:
+        async with httpx.AsyncClient(transport=self._transport, timeout=self.timeout) as client:
+            response = await client.get(url)
+            response.raise_for_status()
+        value = response.json()
+        fetched_at = self._clock()
+        max_age = MAX_AGE.search(response.headers.get("cache-control", ""))
+        ttl = int(max_age.group(1)) if max_age else self.ttl
+        self._entries[url] = MetadataEntry(value=value, fetched_at=fetched_at, expires_at=fetched_at + ttl)
+        if self.path:
+            self._save()
+        return value
+
+    def _load(self) -> typing.Dict[str, MetadataEntry]:
+        try:
+            return {url: MetadataEntry(**entry) for url, entry in json.loads(self.path.read_text()).items()}
+        except FileNotFoundError:
+            return {}
+        except (ValueError, TypeError) as error:
+            logger.warning("Metadata cache %s is ignored: %r", self.path, error)
+            return {}
+
+    def _save(self) -> None:
+        # happens once per provider document and ttl, a small blocking write is fine;
+        # replaced atomically, so concurrent workers never read a half-written file
+        entries = {url: asdict(entry) for url, entry in self._entries.items()}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=self.path.parent, prefix=self.path.name)
+        with os.fdopen(descriptor, "w") as file:
+            json.dump(entries, file)
+        os.replace(temporary, self.path)
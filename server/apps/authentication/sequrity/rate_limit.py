@@ -0,0 +1,45 @@
+import math
+
+from fastapi import Depends
+from fastapi.security import OAuth2PasswordRequestForm
+from starlette.requests import Request
+
+from server.config.settings import Settings
+from server.shared.di import injector
+from server.shared.dependencies.rate_limit import RateLimitStore
+from server.shared.dependencies.settings import Settings as SettingsProtocol
+from server.shared.metrics import LOGIN_RATE_LIMITED
+
+
+class LoginRateLimited(Exception):
+    def __init__(self, retry_after: float, message: str = "too many login attempts, try again later"):
+        self.retry_after = retry_after
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+async def login_rate_limit(
+        request: Request, form_data: OAuth2PasswordRequestForm = Depends()
+) -> OAuth2PasswordRequestForm:
+    """
+    Login form, after the client IP and the username took a token from their buckets.
+    It runs before any database lookup or password hashing, so a credential stuffing burst is rejected cheaply
+    """
+    settings: Settings = injector.get(SettingsProtocol)
+    limits = settings.login_rate_limit
+    if not limits.enabled:
+        return form_data
+
+    store: RateLimitStore = injector.get(RateLimitStore)
+    client_ip = request.client.host if request.client else "unknown"
+    buckets = (
+        ("ip", client_ip, limits.ip_per_minute, limits.ip_burst),
+        ("username", form_data.username.lower(), limits.username_per_minute, limits.username_burst),
+    )
+    for scope, key, per_minute, burst in buckets:
+        if retry_after := store.take(f"login:{scope}:{key}", per_minute / 60, burst):
+            LOGIN_RATE_LIMITED.labels(scope).inc()
+            raise LoginRateLimited(retry_after=math.ceil(retry_after))
+    return form_data
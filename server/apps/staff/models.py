@@ -13,3 +13,5 @@ class User(Base):
     password_hash = sa.Column(VARCHAR(100), unique=False)
     balance = sa.Column(sa.DECIMAL, server_default="0")
     username = sa.Column(sa.VARCHAR(70), nullable=False, unique=True, index=True)
+    # postgres system column, it changes on every update of the row, so it's used as the row version (ETag)
+    xmin = sa.Column(sa.BigInteger, system=True)
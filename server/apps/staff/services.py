@@ -3,14 +3,18 @@ from random import randint
 import typing
 
 from server.apps.staff.models import User
-from server.shared.utils.database import Model, select_all, create, select_one, update, delete, count
+from server.shared.utils.database import (
+    Model, Only, CountMode, select_all, select_one, create, load_one, update, delete, count, select_page, stream_all,
+    on_write,
+)
 from server.shared.di import injector
-from server.shared.dependencies.auth import PasswordHasher
+from server.shared.dependencies.auth import AsyncPasswordHasher
+from server.shared.dependencies.cache import PrincipalCache
 
 
 async def create_new_random_user() -> Model:
-    hasher: PasswordHasher = injector.get(PasswordHasher)
-    password_hash = hasher.hash("password")
+    hasher: AsyncPasswordHasher = injector.get(AsyncPasswordHasher)
+    password_hash = await hasher.hash("password")
     return await create(User, **{
             "first_name": "First name",
             "last_name": "Last name",
@@ -25,14 +29,14 @@ async def create_user(
         *,
         first_name: str,
         last_name: str,
-        phone_number: str,
+        phone_number: typing.Optional[str],
         email: str,
         password: str,
         balance: typing.Union[Decimal, float, None] = None,
         username: typing.Optional[str] = None
 ) -> Model:
-    hasher: PasswordHasher = injector.get(PasswordHasher)
-    password_hash = hasher.hash(password)
+    hasher: AsyncPasswordHasher = injector.get(AsyncPasswordHasher)
+    password_hash = await hasher.hash(password)
     return await create(
         User,
         first_name=first_name,
@@ -45,25 +49,68 @@ async def create_user(
     )
 
 
-async def get_users(*clauses: typing.Any) -> typing.List[Model]:
-    return await select_all(User, *clauses)
+async def get_users(*clauses: typing.Any, only: Only = None) -> typing.List[Model]:
+    return await select_all(User, *clauses, only=only)
+
+
+async def get_users_page(
+        *clauses: typing.Any, limit: int, after_id: typing.Optional[int] = None, only: Only = None
+) -> typing.List[Model]:
+    return await select_page(User, *clauses, limit=limit, after=after_id, only=only)
+
+
+def stream_users(*clauses: typing.Any, only: Only = None) -> typing.AsyncIterator[Model]:
+    return stream_all(User, *clauses, only=only)
 
 
 async def get_user_by_username(username: str):
-    return await select_one(User, User.username == username)
+    return await load_one(User, username, User.username)
+
+
+async def get_principal_by_username(username: str):
+    """
+    Same as `get_user_by_username`, but goes through the principal cache,
+    that is used to resolve authenticated users without a database round trip on each request
+    """
+    cache: PrincipalCache = injector.get(PrincipalCache)
+    if (user := cache.get(username)) is None:
+        if user := await get_user_by_username(username):
+            cache.set(username, user)
+    return user
+
+
+def evict_principals(*usernames: str) -> None:
+    cache: PrincipalCache = injector.get(PrincipalCache)
+    for username in usernames:
+        cache.pop(username)
+
+
+@on_write(User)
+def evict_written_principals(rows: typing.Sequence[typing.Mapping[str, typing.Any]]) -> None:
+    evict_principals(*(row["username"] for row in rows))
+    # rows hold new values, a principal cached under the old username is found by id
+    if written_ids := {row["id"] for row in rows}:
+        cache: PrincipalCache = injector.get(PrincipalCache)
+        cache.pop_where(lambda user: user.id in written_ids)
 
 
-async def get_user_by_id(user_id: int):
-    return await select_one(User, User.id == user_id)
+async def get_user_by_id(user_id: int, only: Only = None):
+    if only is not None:
+        return await select_one(User, User.id == user_id, only=only)
+    return await load_one(User, user_id)
 
 
-async def update_password_hash(password_hash: str, user_id: int) -> None:
-    await update(User, User.id == user_id, password_hash=password_hash)
+async def update_password_hash(password_hash: str, user_id: int, current_hash: typing.Optional[str] = None) -> None:
+    """`current_hash` makes it a compare-and-set: the hash is replaced only if it's still the same"""
+    clauses = [User.id == user_id]
+    if current_hash is not None:
+        clauses.append(User.password_hash == current_hash)
+    await update(User, *clauses, password_hash=password_hash)
 
 
-async def delete_user(user_id: int):
-    return await select_one(User, User.id == user_id)
+async def delete_user(user_id: int) -> typing.List[Model]:
+    return await delete(User, User.id == user_id)
 
 
-async def users_count() -> int:
-    return await count(User)
+async def users_count(*clauses: typing.Any, mode: CountMode = CountMode.EXACT) -> int:
+    return await count(User, *clauses, mode=mode)
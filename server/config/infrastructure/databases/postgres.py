@@ -1,11 +1,15 @@
+import asyncio
 from contextvars import ContextVar
 
 import contextlib
 from functools import cached_property
+import itertools
 import logging
-from typing import AsyncGenerator, Callable, Optional, cast, Type, Dict, Any
-from sqlalchemy import inspect, create_engine
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncSessionTransaction
+import time
+from typing import AsyncGenerator, Callable, Optional, cast, Type, Dict, Any, List
+from sqlalchemy import inspect, create_engine, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, AsyncSessionTransaction
 from sqlalchemy.orm import sessionmaker, scoped_session, Session
 from sqlalchemy.orm.decl_api import (
     registry,
@@ -25,6 +29,20 @@ mapper_registry = registry()
 ASTERISK = "*"
 
 
+def create_pooled_async_engine(connection_uri: str, database_settings: Any) -> AsyncEngine:
+    return create_async_engine(
+        url=connection_uri,
+        future=True,
+        echo=database_settings.echo,
+        pool_size=database_settings.pool_size,
+        max_overflow=database_settings.max_overflow,
+        pool_timeout=database_settings.pool_timeout,
+        pool_recycle=database_settings.pool_recycle,
+        pool_pre_ping=database_settings.pool_pre_ping,
+        connect_args={"prepared_statement_cache_size": database_settings.prepared_statement_cache_size},
+    )
+
+
 async def create_all(connection_uri: str) -> None:
     """
     Should be executed before doing alembic migrations
@@ -33,16 +51,22 @@ async def create_all(connection_uri: str) -> None:
     """
     engine = create_async_engine(connection_uri, pool_pre_ping=True, future=True)
 
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    finally:
+        await engine.dispose()
 
 
 async def recreate(connection_uri: str) -> None:
     engine = create_async_engine(connection_uri, pool_pre_ping=True, future=True)
 
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.drop_all)
-        # await conn.run_sync(Base.metadata.create_all)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            # await conn.run_sync(Base.metadata.create_all)
+    finally:
+        await engine.dispose()
 
 
 class Base(metaclass=DeclarativeMeta):
@@ -82,6 +106,8 @@ class Base(metaclass=DeclarativeMeta):
 
 
 class DatabaseComponents:
+    """Synchronous engine for code, that can't be async. It's registered lazily, the API doesn't use it"""
+
     def __init__(self) -> None:
         settings = injector.get(Settings)
         self.connection_uri = settings.database.connection_uri
@@ -89,10 +115,21 @@ class DatabaseComponents:
             self.connection_uri.replace('+asyncpg', ''),
             pool_pre_ping=True,
             future=True,
-            echo=True,
+            echo=settings.database.echo,
         )
         self.session_factory = scoped_session(sessionmaker(autocommit=False, autoflush=False, bind=self.engine))
 
+    def reset_after_fork(self) -> None:
+        # connections of the parent process are left to it, they aren't closed here
+        self.engine.dispose(close=False)
+
+    def dispose(self) -> int:
+        """Close pooled connections, return how many were idle and closed cleanly"""
+        closed = self.engine.pool.checkedin()
+        self.session_factory.remove()
+        self.engine.dispose()
+        return closed
+
     @contextlib.contextmanager
     def session(self) -> Callable[..., contextlib.AbstractContextManager[Session]]:
         session: Session = self.session_factory()
@@ -107,19 +144,131 @@ class DatabaseComponents:
 
 
 class AsyncDatabaseComponents:
-    def __init__(self, connection_uri: str = None) -> None:
+    """
+    Primary engine and optional read replicas, every engine has its own pool.
+
+    Read-only operations go to replicas in round-robin, writes and explicit transactions go to the primary.
+    After a write, reads of the same request or session stay on the primary for `read_your_writes_window` seconds
+    """
+
+    def __init__(self, connection_uri: str = None, replica_connection_uris: Optional[List[str]] = None) -> None:
+        settings = injector.get(Settings)
         if not connection_uri:
-            settings = injector.get(Settings)
             connection_uri = settings.database.connection_uri
+        if replica_connection_uris is None:
+            replica_connection_uris = settings.database.replica_connection_uris
         self.connection_uri = connection_uri
-        self.engine = create_async_engine(url=self.connection_uri, pool_pre_ping=True, future=True)
+        self.database_settings = settings.database
+        self.engine = create_pooled_async_engine(self.connection_uri, self.database_settings)
         self.session: AsyncSession = sessionmaker(  # NOQA
             self.engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
         )
+        self.replica_engines = [
+            create_pooled_async_engine(uri, self.database_settings) for uri in replica_connection_uris
+        ]
+        self._replica_sessions = itertools.cycle([
+            sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)  # NOQA
+            for engine in self.replica_engines
+        ])
+        self._liveness_check_task: Optional[asyncio.Task] = None
+
+    def session_factory(self, read_only: bool = False) -> Callable[..., AsyncSession]:
+        if not read_only or not self.replica_engines:
+            return self.session
+        if written_recently(self.database_settings.read_your_writes_window):
+            return self.session
+        return next(self._replica_sessions)
+
+    def start_liveness_check(self) -> None:
+        if self.database_settings.liveness_check_interval > 0 and self._liveness_check_task is None:
+            self._liveness_check_task = asyncio.create_task(self._check_liveness_periodically())
+
+    async def stop_liveness_check(self) -> None:
+        if self._liveness_check_task is not None:
+            self._liveness_check_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._liveness_check_task
+            self._liveness_check_task = None
+
+    async def check_liveness(self) -> bool:
+        """
+        Ping the database with a pooled connection. If it fails, the database was most likely restarted,
+        so all pooled connections are stale and the pool is recreated
+        """
+        alive = True
+        for engine in (self.engine, *self.replica_engines):
+            try:
+                async with engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+            except (DBAPIError, OSError):
+                logger.warning(
+                    "Liveness check of %s failed, connection pool is recreated", engine.url.host, exc_info=True
+                )
+                await engine.dispose()
+                alive = False
+        return alive
+
+    async def _check_liveness_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.database_settings.liveness_check_interval)
+            try:
+                await self.check_liveness()
+            except Exception:
+                logger.exception("Unexpected error during database liveness check")
+
+    def pool_stats(self) -> Dict[str, Any]:
+        pool = self.engine.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": self.database_settings.max_overflow,
+            "timeout": self.database_settings.pool_timeout,
+            "max_connections_per_worker": self.database_settings.pool_size + self.database_settings.max_overflow,
+            "replicas": len(self.replica_engines),
+        }
+
+    def reset_after_fork(self) -> None:
+        # connections of the parent process are left to it, they aren't closed here
+        for engine in (self.engine, *self.replica_engines):
+            engine.sync_engine.dispose(close=False)
+        self._liveness_check_task = None
+
+    async def dispose(self, timeout: float = 0.0) -> Dict[str, int]:
+        """
+        Wait up to `timeout` seconds for checked out connections (running transactions) to come back,
+        then close all pools. Connections, that are still in use, are closed by the pool when returned
+        """
+        engines = (self.engine, *self.replica_engines)
+        deadline = time.monotonic() + timeout
+        while any(engine.pool.checkedout() for engine in engines) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+        stats = {"closed": 0, "in_use": 0}
+        for engine in engines:
+            stats["closed"] += engine.pool.checkedin()
+            stats["in_use"] += engine.pool.checkedout()
+            await engine.dispose()
+        return stats
+
+    async def server_max_connections(self) -> int:
+        async with self.engine.connect() as connection:
+            return int((await connection.execute(text("SHOW max_connections"))).scalar())
 
     @contextlib.asynccontextmanager
-    async def async_session(self) -> AsyncGenerator:
-        """Yield an :class:`_asyncio.AsyncSessionTransaction` object."""
+    async def async_session(self, read_only: bool = False) -> AsyncGenerator:
+        """
+        Yield an :class:`_asyncio.AsyncSessionTransaction` object.
+
+        `read_only` sessions may be opened on a replica, they are used by single statements only,
+        explicit sessions (`current_session`) always belong to the primary
+        """
+        if read_only:
+            async with self.session_factory(read_only=True)() as session:
+                yield session
+            return
+
         async with self.session() as session:
             if not session.in_transaction() and session.is_active:
                 async with session.begin():
@@ -130,19 +279,9 @@ class AsyncDatabaseComponents:
                 yield  # type: ignore
 
 
-class AsyncDatabaseTestComponents:
-    def __init__(self, connection_uri: str = None) -> None:
-        if not connection_uri:
-            settings = injector.get(Settings)
-            connection_uri = settings.database.connection_uri
-        self.connection_uri = connection_uri
-        self.engine = create_async_engine(url=self.connection_uri, pool_pre_ping=True, future=True)
-        self.session: AsyncSession = sessionmaker(  # NOQA
-            self.engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
-        )
-
+class AsyncDatabaseTestComponents(AsyncDatabaseComponents):
     @contextlib.asynccontextmanager
-    async def async_session(self) -> AsyncGenerator:
+    async def async_session(self, read_only: bool = False) -> AsyncGenerator:
         """Yield an :class:`_asyncio.AsyncSessionTransaction` object."""
         async with self.engine.begin() as connection:
             await connection.run_sync(Base.metadata.drop_all)
@@ -168,3 +307,14 @@ class AsyncDatabaseTestComponents:
 
 
 current_session = ContextVar("current_session", default=None)
+# monotonic time of the last write made by the current request (or task), see `read_your_writes_window`
+last_write_at: ContextVar[Optional[float]] = ContextVar("last_write_at", default=None)
+
+
+def mark_write() -> None:
+    last_write_at.set(time.monotonic())
+
+
+def written_recently(window: float) -> bool:
+    written_at = last_write_at.get()
+    return written_at is not None and time.monotonic() - written_at < window
@@ -0,0 +1,94 @@
+"""
+Schema check at worker startup.
+
+Every worker used to reflect the whole schema with `create_all` on its own short-lived engine,
+now one cheap query tells whether all tables exist, and only when some are missing they are created
+under an advisory lock, so concurrent boots don't race each other
+"""
+import enum
+import functools
+import logging
+from typing import List, Optional, Tuple
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import BigInteger, Table, func, inspect, literal, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from server.config.infrastructure.databases.postgres import Base
+from server.config.settings import BASE_DIR
+
+logger = logging.getLogger("sqlalchemy.execution")
+
+MIGRATIONS_DIR = BASE_DIR / "server" / "config" / "infrastructure" / "databases" / "migrations"
+# arbitrary, but the same for all workers of the application; it doesn't fit into int4, so it's bound as bigint
+SCHEMA_LOCK_ID = 7_306_571_402
+
+
+class SchemaMode(str, enum.Enum):
+    # create missing tables, when the schema isn't up to date
+    CHECK = "check"
+    # previous behaviour: reflect and create everything on every boot
+    CREATE_ALL = "create_all"
+    # schema is managed by migrations only
+    SKIP = "skip"
+
+
+@functools.lru_cache(maxsize=None)
+def alembic_head() -> Optional[str]:
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
+async def schema_state(connection: AsyncConnection) -> Tuple[Optional[str], List[str]]:
+    """Current alembic revision (if migrations were ever applied) and tables of the metadata, that don't exist"""
+    tables = Base.metadata.sorted_tables
+    alembic_version, *existing = (await connection.execute(
+        select(func.to_regclass("alembic_version"), *(func.to_regclass(table.fullname) for table in tables))
+    )).one()
+    missing = [table.fullname for table, oid in zip(tables, existing) if oid is None]
+
+    revision = None
+    if alembic_version is not None:
+        revision = (await connection.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+    return revision, missing
+
+
+async def ensure_schema(engine: AsyncEngine, mode: SchemaMode = SchemaMode.CHECK) -> None:
+    if mode is SchemaMode.SKIP:
+        return
+
+    if mode is SchemaMode.CHECK:
+        async with engine.connect() as connection:
+            revision, missing = await schema_state(connection)
+        if not missing:
+            if revision is not None and revision != alembic_head():
+                logger.warning(
+                    "Database schema is at revision %s, migrations head is %s, run `alembic upgrade head`",
+                    revision, alembic_head(),
+                )
+            return
+
+    async with engine.begin() as connection:
+        # released with the transaction, other workers wait here and find the tables created
+        await connection.execute(select(func.pg_advisory_xact_lock(literal(SCHEMA_LOCK_ID, BigInteger))))
+        if mode is SchemaMode.CREATE_ALL:
+            await connection.run_sync(Base.metadata.create_all)
+            return
+
+        # `to_regclass` may answer from the catalog cache of the backend, that isn't refreshed by the advisory lock,
+        # so tables, that a concurrent boot has just created, are looked up with a plain catalog query
+        tables = await connection.run_sync(missing_tables)
+        if tables:
+            logger.info("Creating missing tables: %s", ", ".join(table.fullname for table in tables))
+            await connection.run_sync(Base.metadata.create_all, tables=tables, checkfirst=False)
+
+
+def missing_tables(connection: Connection) -> List[Table]:
+    inspector = inspect(connection)
+    return [
+        table for table in Base.metadata.sorted_tables
+        if not inspector.has_table(table.name, schema=table.schema)
+    ]
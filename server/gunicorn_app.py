@@ -1,13 +1,101 @@
+import glob
+import logging
 import multiprocessing
-from typing import Any, Dict, Optional
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
 
 from gunicorn.app.base import Application
+from gunicorn.arbiter import Arbiter
+from uvicorn.main import Server
+from uvicorn.workers import UvicornWorker
+
+logger = logging.getLogger("uvicorn.error")
 
 
 def number_of_workers() -> int:
     return (multiprocessing.cpu_count() * 2) + 1
 
 
+def prepare_metrics_directory() -> str:
+    """
+    Point prometheus to a clean directory shared by all workers,
+    must be called before `prometheus_client` is imported
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+    else:
+        path = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+    for stale_file in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale_file)
+    return path
+
+
+def child_exit(server: Any, worker: Any) -> None:
+    from server.shared.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
+
+
+def post_fork(server: Any, worker: Any) -> None:
+    """
+    With `preload_app` the application, its engines and `injector` singletons are created by the master process.
+    Pools must never be shared between processes, so every worker starts with its own empty pools
+    """
+    from server.shared.di import injector
+    from server.shared.dependencies.database import AsyncDatabase, Database
+    for protocol in (Database, AsyncDatabase):
+        if (database := injector.peek(protocol)) is not None:
+            database.reset_after_fork()
+
+
+class DrainingServer(Server):
+    """
+    Uvicorn server, that drains requests of the application (`app.state.drain`) before it shuts down.
+
+    Uvicorn itself waits for every connection to close, without a deadline, and only then sends
+    the lifespan shutdown, so the application would never see a request in flight. Here draining starts
+    with the exit signal: listeners are closed, requests on kept-alive connections get `503` with
+    `Connection: close`, and the running ones get `shutdown_timeout` seconds. Connections, that are still busy
+    after that, are bounded by gunicorn `graceful_timeout`
+    """
+
+    def handle_exit(self, sig: Any, frame: Any) -> None:
+        if (drain := self._drain()) is not None:
+            drain.start()
+        super().handle_exit(sig, frame)
+
+    async def shutdown(self, sockets: Optional[List[Any]] = None) -> None:
+        if (drain := self._drain()) is not None:
+            drain.start()
+            for server in self.servers:
+                server.close()
+            timeout = drain.started_at + self.config.app.state.settings.application.shutdown_timeout
+            if not await drain.wait(timeout=max(timeout - time.monotonic(), 0.0)):
+                logger.warning("Shutdown deadline reached with %d requests in flight", drain.in_flight)
+        await super().shutdown(sockets=sockets)
+
+    def _drain(self) -> Any:
+        return getattr(getattr(self.config.app, "state", None), "drain", None)
+
+
+class DrainingUvicornWorker(UvicornWorker):
+    async def _serve(self) -> None:
+        self.config.app = self.wsgi
+        server = DrainingServer(config=self.config)
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
+
+
+class ProductionUvicornWorker(DrainingUvicornWorker):
+    """Uvicorn worker with explicitly chosen uvloop event loop and httptools parser instead of `auto` detection"""
+
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools"}
+
+
 class StandaloneApplication(Application):
     def __init__(self, app: Any, options: Optional[Dict[Any, Any]] = None):
         self._options = options
@@ -0,0 +1,14 @@
+"""
+Background jobs: request handlers defer work, that doesn't have to delay the response,
+and workers run it later with retries and batching
+
+    @batch_job("audit.write_events", batch_size=500)
+    async def write_audit_events(payloads):
+        ...
+
+    await write_audit_events.defer({"event": "login.failed", ...})
+"""
+from .brokers import AMQPBroker, MemoryBroker, create_broker
+from .queue import BrokerJobQueue, create_job_queue
+from .registry import Job, JobDefinition, UnknownJob, batch_job, job, registry
+from .worker import Worker
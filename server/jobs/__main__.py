@@ -0,0 +1,65 @@
+"""
+Worker process of the RabbitMQ queue: `python -m server.jobs`.
+Dependencies are configured the same way as in the web application, jobs use the same services
+"""
+import asyncio
+import importlib
+import logging
+import signal
+
+from server.application.dev import DevelopmentApplicationBuilder
+from server.config.infrastructure.databases.schema import SchemaMode, ensure_schema
+from server.config.settings import Settings, settings
+from server.jobs.brokers import AMQPBroker
+from server.jobs.worker import Worker
+from server.shared.di import injector
+from server.shared.dependencies.database import AsyncDatabase
+
+logger = logging.getLogger("server.jobs")
+
+# modules, that register job handlers
+JOB_MODULES = (
+    "server.apps.audit.jobs",
+    "server.apps.authentication.jobs",
+)
+
+
+async def serve(settings: Settings) -> None:
+    for module in JOB_MODULES:
+        importlib.import_module(module)
+    database = injector.get(AsyncDatabase)
+    # the worker may start before the web application, that creates missing tables
+    await ensure_schema(database.engine, SchemaMode(settings.database.startup_schema))
+
+    broker = AMQPBroker(settings.rabbitmq.uri, settings.rabbitmq.queue, settings.rabbitmq.prefetch_count)
+    worker = Worker(
+        broker,
+        concurrency=settings.jobs.concurrency,
+        batch_size=settings.jobs.batch_size,
+        batch_linger=settings.jobs.batch_linger,
+    )
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signal_number, stopping.set)
+
+    await broker.consume()
+    worker.start()
+    logger.info("Worker consumes %s", settings.rabbitmq.queue)
+    await stopping.wait()
+
+    await worker.stop(timeout=settings.application.shutdown_timeout)
+    await broker.close()
+    await database.dispose(timeout=settings.application.shutdown_timeout)
+
+
+def run_worker() -> None:
+    logging.basicConfig(level=logging.INFO)
+    if settings.jobs.backend != "amqp":
+        raise SystemExit("JOBS_BACKEND is `memory`, jobs run inside the web workers, there is nothing to consume")
+    DevelopmentApplicationBuilder(settings=settings).configure_application_dependencies()
+    asyncio.run(serve(settings))
+
+
+if __name__ == "__main__":
+    run_worker()
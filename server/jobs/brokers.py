@@ -0,0 +1,201 @@
+"""
+Brokers deliver jobs to workers. `MemoryBroker` keeps them in the process, nothing survives a restart;
+`AMQPBroker` keeps them in durable RabbitMQ queues and acknowledges a message only after its job was handled
+"""
+import asyncio
+import collections
+import dataclasses
+import logging
+import typing
+
+from .registry import Job
+
+logger = logging.getLogger(__name__)
+
+
+class Delivery:
+    __slots__ = ("job", "_ack")
+
+    def __init__(self, job: Job, ack: typing.Optional[typing.Callable[[], typing.Awaitable[None]]] = None) -> None:
+        self.job = job
+        self._ack = ack
+
+    async def ack(self) -> None:
+        if self._ack is not None:
+            await self._ack()
+
+
+class BufferedBroker:
+    """Received deliveries wait in a local buffer, workers take them in batches"""
+
+    def __init__(self) -> None:
+        self._buffer: "asyncio.Queue[Delivery]" = asyncio.Queue()
+        # deliveries, that a lingering `receive` took from the buffer, but hasn't returned yet
+        self._held = 0
+
+    async def receive(self, max_size: int, linger: float = 0.0) -> typing.List[Delivery]:
+        """
+        Wait for a delivery, then give others up to `linger` seconds to arrive, so they are handled in one batch.
+        When the call is cancelled while it lingers, taken deliveries are put back in front of the buffer
+        """
+        batch = [await self._buffer.get()]
+        self._take_ready(batch, max_size)
+        if linger > 0 and len(batch) < max_size:
+            self._held = len(batch)
+            try:
+                await asyncio.sleep(linger)
+            except asyncio.CancelledError:
+                self._put_back(batch)
+                raise
+            finally:
+                self._held = 0
+            self._take_ready(batch, max_size)
+        return batch
+
+    def _take_ready(self, batch: typing.List[Delivery], max_size: int) -> None:
+        while len(batch) < max_size and not self._buffer.empty():
+            batch.append(self._buffer.get_nowait())
+
+    def _put_back(self, batch: typing.List[Delivery]) -> None:
+        rest = []
+        self._take_ready(rest, self._buffer.qsize())
+        for delivery in (*batch, *rest):
+            self._buffer.put_nowait(delivery)
+
+
+class MemoryBroker(BufferedBroker):
+    def __init__(self) -> None:
+        super().__init__()
+        self._delayed: typing.Set[asyncio.TimerHandle] = set()
+        # the last jobs, that failed all their attempts, without payloads: those may hold secrets,
+        # e.g. the password of a rehash, and nothing consumes in-memory dead letters
+        self.dead: typing.Deque[Job] = collections.deque(maxlen=100)
+
+    @property
+    def pending(self) -> int:
+        """Jobs, that are queued or collected into a batch, but not handed to a worker yet"""
+        return self._buffer.qsize() + self._held
+
+    async def publish(self, job: Job, delay: float = 0.0) -> None:
+        # a round trip through the encoding keeps the behaviour of the real broker: the payload is copied,
+        # and a payload, that can't be serialized, fails here instead of in production
+        delivery = Delivery(Job.decode(job.encode()))
+        if delay <= 0:
+            self._buffer.put_nowait(delivery)
+            return
+
+        def put() -> None:
+            self._delayed.discard(handle)
+            self._buffer.put_nowait(delivery)
+
+        handle = asyncio.get_running_loop().call_later(delay, put)
+        self._delayed.add(handle)
+
+    async def dead_letter(self, job: Job) -> None:
+        logger.warning("Job %s %s is dead at attempt %d, its payload is dropped", job.name, job.id, job.attempt)
+        self.dead.append(dataclasses.replace(job, payload={}))
+
+    async def close(self) -> None:
+        for handle in self._delayed:
+            handle.cancel()
+        if dropped := len(self._delayed) + self._buffer.qsize():
+            logger.warning("%d in-memory jobs are dropped", dropped)
+        self._delayed.clear()
+
+
+class AMQPBroker(BufferedBroker):
+    """
+    Jobs are persistent messages of a durable queue. A retry with a delay goes to `<queue>.retry.<delay ms>`,
+    a queue with the message TTL, that dead-letters expired messages back to the main queue.
+    Undecodable messages and jobs, that failed all attempts, go to `<queue>.dead`
+    """
+
+    def __init__(self, uri: str, queue: str = "jobs", prefetch_count: int = 200) -> None:
+        super().__init__()
+        self.uri = uri
+        self.queue_name = queue
+        self.prefetch_count = prefetch_count
+        self._connection: typing.Any = None
+        self._channel: typing.Any = None
+        self._declared: typing.Set[str] = set()
+        self._consumer_tag: typing.Optional[str] = None
+        self._queue: typing.Any = None
+        self._connecting = asyncio.Lock()
+
+    async def connect(self) -> None:
+        async with self._connecting:
+            if self._channel is not None:
+                return
+            # aio-pika is needed only by processes, that use RabbitMQ
+            import aio_pika
+
+            self._connection = await aio_pika.connect_robust(self.uri)
+            channel = await self._connection.channel()
+            await channel.set_qos(prefetch_count=self.prefetch_count)
+            await channel.declare_queue(f"{self.queue_name}.dead", durable=True)
+            self._queue = await channel.declare_queue(self.queue_name, durable=True, arguments={
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": f"{self.queue_name}.dead",
+            })
+            self._channel = channel
+
+    async def publish(self, job: Job, delay: float = 0.0) -> None:
+        await self._publish(job.encode(), await self._delay_queue(delay) if delay > 0 else self.queue_name, job.id)
+
+    async def dead_letter(self, job: Job) -> None:
+        await self._publish(job.encode(), f"{self.queue_name}.dead", job.id)
+
+    async def consume(self) -> None:
+        """Start filling the buffer with messages of the queue, `receive` takes them from there"""
+        await self.connect()
+        self._consumer_tag = await self._queue.consume(self._on_message)
+
+    async def close(self) -> None:
+        if self._consumer_tag is not None:
+            await self._queue.cancel(self._consumer_tag)
+            self._consumer_tag = None
+        if self._connection is not None:
+            # unacknowledged messages are redelivered to another consumer
+            await self._connection.close()
+            self._connection = self._channel = None
+            self._declared.clear()
+
+    async def _publish(self, body: bytes, routing_key: str, message_id: str) -> None:
+        import aio_pika
+
+        await self.connect()
+        message = aio_pika.Message(
+            body,
+            content_type="application/json",
+            delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            message_id=message_id,
+        )
+        await self._channel.default_exchange.publish(message, routing_key=routing_key)
+
+    async def _delay_queue(self, delay: float) -> str:
+        milliseconds = max(1, round(delay * 1000))
+        name = f"{self.queue_name}.retry.{milliseconds}"
+        if name not in self._declared:
+            await self.connect()
+            await self._channel.declare_queue(name, durable=True, arguments={
+                "x-message-ttl": milliseconds,
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": self.queue_name,
+            })
+            self._declared.add(name)
+        return name
+
+    async def _on_message(self, message: typing.Any) -> None:
+        try:
+            job = Job.decode(message.body)
+        except (ValueError, TypeError):
+            logger.error("Message %s isn't a job, it's moved to the dead letter queue", message.message_id)
+            await message.reject(requeue=False)
+            return
+        self._buffer.put_nowait(Delivery(job, message.ack))
+
+
+def create_broker(settings: typing.Any) -> typing.Union[MemoryBroker, AMQPBroker]:
+    if settings.jobs.backend == "amqp":
+        return AMQPBroker(settings.rabbitmq.uri, settings.rabbitmq.queue, settings.rabbitmq.prefetch_count)
+    return MemoryBroker()
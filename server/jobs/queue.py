@@ -0,0 +1,62 @@
+import asyncio
+import typing
+
+from server.shared.metrics import JOBS_ENQUEUED
+from .brokers import AMQPBroker, MemoryBroker, create_broker
+from .registry import Job, get_definition
+from .worker import Worker
+
+
+class BrokerJobQueue:
+    """
+    Queue of a web worker. Jobs go to the configured broker, `local` ones always go to the in-memory broker,
+    that the web worker consumes itself (when `in_process` is on). The local worker starts with the first job
+    """
+
+    def __init__(
+            self,
+            broker: typing.Union[MemoryBroker, AMQPBroker],
+            local_broker: typing.Optional[MemoryBroker] = None,
+            *,
+            in_process: bool = True,
+            concurrency: int = 4,
+            batch_size: int = 100,
+            batch_linger: float = 0.05,
+    ) -> None:
+        self.broker = broker
+        self.local_broker = local_broker or (broker if isinstance(broker, MemoryBroker) else MemoryBroker())
+        self.in_process = in_process
+        self.local_worker = Worker(
+            self.local_broker, concurrency=concurrency, batch_size=batch_size, batch_linger=batch_linger
+        )
+
+    async def enqueue(self, name: str, payload: typing.Dict[str, typing.Any], delay: float = 0.0) -> None:
+        definition = get_definition(name)
+        broker = self.local_broker if definition.local else self.broker
+        if broker is self.local_broker and self.in_process:
+            self.local_worker.start()
+        await broker.publish(Job(name, payload), delay=delay)
+        JOBS_ENQUEUED.labels(name).inc()
+
+    async def shutdown(self, timeout: float) -> None:
+        """Local jobs, that are queued or running, get `timeout` seconds, then brokers are closed"""
+        if self.in_process:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            # a job may be queued, collected into a batch or running, the worker is stopped once it's all done
+            while (self.local_broker.pending or not self.local_worker.idle) and loop.time() < deadline:
+                await asyncio.sleep(0.01)
+            await self.local_worker.stop(timeout=max(deadline - loop.time(), 0.0))
+        await self.local_broker.close()
+        if self.broker is not self.local_broker:
+            await self.broker.close()
+
+
+def create_job_queue(settings: typing.Any) -> BrokerJobQueue:
+    return BrokerJobQueue(
+        create_broker(settings),
+        in_process=settings.jobs.in_process,
+        concurrency=settings.jobs.concurrency,
+        batch_size=settings.jobs.batch_size,
+        batch_linger=settings.jobs.batch_linger,
+    )
@@ -0,0 +1,117 @@
+import dataclasses
+import time
+import typing
+import uuid
+
+import orjson
+
+from server.shared.di import injector
+from server.shared.dependencies.jobs import JobQueue
+
+Payload = typing.Dict[str, typing.Any]
+BatchHandler = typing.Callable[[typing.List[Payload]], typing.Awaitable[None]]
+
+
+@dataclasses.dataclass(frozen=True)
+class Job:
+    """Message of the queue, `payload` has to be JSON serializable"""
+
+    name: str
+    payload: Payload
+    id: str = dataclasses.field(default_factory=lambda: uuid.uuid4().hex)
+    attempt: int = 1
+    enqueued_at: float = dataclasses.field(default_factory=time.time)
+
+    def encode(self) -> bytes:
+        return orjson.dumps(dataclasses.asdict(self))
+
+    @classmethod
+    def decode(cls, body: bytes) -> "Job":
+        return cls(**orjson.loads(body))
+
+    def next_attempt(self) -> "Job":
+        return dataclasses.replace(self, attempt=self.attempt + 1)
+
+
+@dataclasses.dataclass(frozen=True)
+class JobDefinition:
+    name: str
+    # always called with a list of payloads, single jobs get a list of one
+    handler: BatchHandler
+    batch_size: int = 1
+    max_attempts: int = 5
+    # delay before the second attempt, it doubles with every following one
+    retry_delay: float = 1.0
+    # the payload never leaves the process (e.g. it contains a password), so the job runs in the web worker
+    local: bool = False
+
+    def backoff(self, attempt: int) -> float:
+        return self.retry_delay * 2 ** (attempt - 1)
+
+    async def defer(self, payload: Payload, delay: float = 0.0) -> None:
+        queue: JobQueue = injector.get(JobQueue)
+        await queue.enqueue(self.name, payload, delay=delay)
+
+
+class UnknownJob(Exception):
+    def __init__(self, name: str):
+        self.message = f"job {name!r} isn't registered"
+
+    def __str__(self):
+        return self.message
+
+
+registry: typing.Dict[str, JobDefinition] = {}
+
+
+def get_definition(name: str) -> JobDefinition:
+    try:
+        return registry[name]
+    except KeyError:
+        raise UnknownJob(name) from None
+
+
+def _register(definition: JobDefinition) -> JobDefinition:
+    if definition.name in registry:
+        raise ValueError(f"Job {definition.name!r} is already registered")
+    registry[definition.name] = definition
+    return definition
+
+
+def job(
+        name: str, *, max_attempts: int = 5, retry_delay: float = 1.0, local: bool = False
+) -> typing.Callable[[typing.Callable[[Payload], typing.Awaitable[None]]], JobDefinition]:
+    """
+    Register a handler of one job
+
+        @job("authentication.rehash_password", local=True)
+        async def rehash_password(payload):
+            ...
+
+        await rehash_password.defer({"user_id": 1, ...})
+    """
+    def decorator(handler: typing.Callable[[Payload], typing.Awaitable[None]]) -> JobDefinition:
+        async def handle_batch(payloads: typing.List[Payload]) -> None:
+            for payload in payloads:
+                await handler(payload)
+
+        return _register(JobDefinition(
+            name, handle_batch, batch_size=1, max_attempts=max_attempts, retry_delay=retry_delay, local=local
+        ))
+
+    return decorator
+
+
+def batch_job(
+        name: str, *, batch_size: int = 100, max_attempts: int = 5, retry_delay: float = 1.0, local: bool = False
+) -> typing.Callable[[BatchHandler], JobDefinition]:
+    """
+    Register a handler, that gets up to `batch_size` payloads of jobs, that were queued together.
+    A failed call retries all jobs of the batch, so the handler has to write them atomically
+    """
+    def decorator(handler: BatchHandler) -> JobDefinition:
+        return _register(JobDefinition(
+            name, handler, batch_size=batch_size, max_attempts=max_attempts, retry_delay=retry_delay, local=local
+        ))
+
+    return decorator
@@ -0,0 +1,141 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+import typing
+
+from server.shared.metrics import JOB_DURATION, JOBS_PROCESSED
+from .brokers import Delivery
+from .registry import JobDefinition, UnknownJob, get_definition
+
+logger = logging.getLogger(__name__)
+
+
+class Broker(typing.Protocol):
+    async def receive(self, max_size: int, linger: float = 0.0) -> typing.List[Delivery]: ...
+
+    async def publish(self, job: typing.Any, delay: float = 0.0) -> None: ...
+
+    async def dead_letter(self, job: typing.Any) -> None: ...
+
+
+class Worker:
+    """
+    Takes batches of deliveries from the broker and runs up to `concurrency` of them at once.
+    Jobs of one name in a batch go to the handler together, split by `batch_size` of its definition.
+    A failed job is published again with the attempt number increased and a backoff delay,
+    after `max_attempts` it goes to the dead letters; either way the delivery is acknowledged
+    """
+
+    def __init__(
+            self, broker: Broker, *, concurrency: int = 4, batch_size: int = 100, batch_linger: float = 0.05
+    ) -> None:
+        self.broker = broker
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.batch_linger = batch_linger
+        self._task: typing.Optional[asyncio.Task] = None
+        self._in_flight: typing.Set[asyncio.Task] = set()
+
+    @property
+    def idle(self) -> bool:
+        """No batch is being processed"""
+        return not self._in_flight
+
+    def start(self) -> asyncio.Task:
+        if self._task is None:
+            # the worker may be started by a request, it must not inherit its session, scope or loaders
+            self._task = contextvars.Context().run(asyncio.get_running_loop().create_task, self.run())
+        return self._task
+
+    async def stop(self, timeout: float) -> None:
+        """Stop taking new jobs and give the running ones `timeout` seconds to finish"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._in_flight:
+            _, pending = await asyncio.wait(self._in_flight, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning("%d job batches were cancelled on shutdown", len(pending))
+
+    async def run(self) -> None:
+        slots = asyncio.Semaphore(self.concurrency)
+        while True:
+            # a batch is taken only when there is a free slot, the rest stays in the broker
+            await slots.acquire()
+            try:
+                deliveries = await self.broker.receive(self.batch_size, self.batch_linger)
+            except BaseException:
+                slots.release()
+                raise
+            task = asyncio.create_task(self.process(deliveries))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+            task.add_done_callback(lambda _: slots.release())
+            task.add_done_callback(_log_failure)
+
+    async def process(self, deliveries: typing.Sequence[Delivery]) -> None:
+        by_name: typing.Dict[str, typing.List[Delivery]] = {}
+        for delivery in deliveries:
+            by_name.setdefault(delivery.job.name, []).append(delivery)
+
+        for name, group in by_name.items():
+            try:
+                definition = get_definition(name)
+            except UnknownJob as error:
+                logger.error("%s, %d jobs are moved to the dead letters", error, len(group))
+                await self._settle(group, outcome="dead")
+                continue
+            for chunk in _chunks(group, definition.batch_size):
+                await self._run(definition, chunk)
+
+    async def _run(self, definition: JobDefinition, deliveries: typing.List[Delivery]) -> None:
+        started_at = time.perf_counter()
+        try:
+            await definition.handler([delivery.job.payload for delivery in deliveries])
+        except Exception:
+            logger.exception("Job %s failed for a batch of %d", definition.name, len(deliveries))
+            await self._retry(definition, deliveries)
+        else:
+            await self._settle(deliveries, outcome="done")
+        finally:
+            JOB_DURATION.labels(definition.name).observe(time.perf_counter() - started_at)
+
+    async def _retry(self, definition: JobDefinition, deliveries: typing.List[Delivery]) -> None:
+        retried, dead = [], []
+        for delivery in deliveries:
+            job = delivery.job
+            if job.attempt < definition.max_attempts:
+                await self.broker.publish(job.next_attempt(), delay=definition.backoff(job.attempt))
+                retried.append(delivery)
+            else:
+                dead.append(delivery)
+        await self._settle(retried, outcome="retried")
+        await self._settle(dead, outcome="dead")
+
+    async def _settle(self, deliveries: typing.List[Delivery], outcome: str) -> None:
+        for delivery in deliveries:
+            if outcome == "dead":
+                await self.broker.dead_letter(delivery.job)
+            try:
+                await delivery.ack()
+            except Exception:
+                # the connection was lost, the broker delivers the message again
+                logger.warning("Job %s %s wasn't acknowledged", delivery.job.name, delivery.job.id, exc_info=True)
+            JOBS_PROCESSED.labels(delivery.job.name, outcome).inc()
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    # e.g. the broker is unavailable for a retry, unacknowledged deliveries come back later
+    if not task.cancelled() and (error := task.exception()) is not None:
+        logger.error("Job batch wasn't processed", exc_info=error)
+
+
+def _chunks(items: typing.List[Delivery], size: int) -> typing.Iterator[typing.List[Delivery]]:
+    iterator = iter(items)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
@@ -0,0 +1,45 @@
+"""
+Conditional GET: responses carry a weak `ETag` built from row versions (`xmin`),
+a client sends it back in `If-None-Match` and gets `304 Not Modified` without the body being serialized
+"""
+import hashlib
+import typing
+
+from starlette import status
+from starlette.requests import Request
+from starlette.responses import Response
+
+# the client may store the response, but has to revalidate it on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: typing.Any) -> str:
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def row_etag(row: typing.Any, *extra: typing.Any) -> str:
+    return make_etag(row.id, row.xmin, *extra)
+
+
+def rows_etag(rows: typing.Iterable[typing.Any], *extra: typing.Any) -> str:
+    return make_etag(*((row.id, row.xmin) for row in rows), *extra)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison, as `If-None-Match` requires"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque_tag for candidate in if_none_match.split(","))
+
+
+def validators(etag: str) -> typing.Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validators(etag))
@@ -0,0 +1,26 @@
+import typing
+
+from pydantic import BaseModel
+
+
+class InvalidFields(ValueError):
+    def __init__(self, unknown: typing.Sequence[str]):
+        self.unknown = unknown
+
+    def __str__(self):
+        return f"unknown fields: {', '.join(self.unknown)}"
+
+
+def parse_fields(
+        fields: typing.Optional[str], schema: typing.Type[BaseModel]
+) -> typing.Optional[typing.Tuple[str, ...]]:
+    """
+    Sparse fieldset `?fields=id,username`, only fields of the response schema are allowed,
+    so columns, that aren't exposed (e.g. `password_hash`), can't be requested
+    """
+    if not fields:
+        return None
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    if unknown := [field for field in requested if field not in schema.__fields__]:
+        raise InvalidFields(unknown)
+    return requested or None
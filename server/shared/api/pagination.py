@@ -0,0 +1,35 @@
+import base64
+import binascii
+import typing
+
+import orjson
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    def __init__(self, cursor: str):
+        self.cursor = cursor
+
+    def __str__(self):
+        return f"invalid pagination cursor: {self.cursor!r}"
+
+
+def encode_cursor(after: typing.Any) -> str:
+    """
+    Pack keyset position into an opaque url-safe token, so clients never depend on its structure
+    """
+    return base64.urlsafe_b64encode(orjson.dumps({"after": after})).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        after = orjson.loads(base64.urlsafe_b64decode(padded))["after"]
+    except (binascii.Error, ValueError, KeyError, TypeError) as ex:
+        raise InvalidCursor(cursor) from ex
+    # keyset position is a row id, anything else would fail in the database instead of here
+    if type(after) is not int:
+        raise InvalidCursor(cursor)
+    return after
@@ -1,10 +1,15 @@
-from typing import Optional, Type, Any, TypeVar, Union
+from decimal import Decimal
+from typing import Optional, Type, Any, TypeVar, Union, Dict, Iterable, List, Mapping, Tuple
 
+import orjson
 from fastapi.responses import ORJSONResponse
-from pydantic import ValidationError
+from pydantic import BaseModel, ValidationError
 from starlette import status
 from starlette.background import BackgroundTask
 
+from server.shared.di import injector
+from server.shared.dependencies.settings import Settings
+
 Model = TypeVar("Model")
 
 
@@ -53,3 +58,57 @@ def get_pydantic_model_or_return_raw_response(
         return model.from_orm(db_obj)  # type: ignore
     except ValidationError:
         return BadRequestJsonResponse()
+
+
+def default_encoder(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class TrustedORJSONResponse(ORJSONResponse):
+    """
+    Content is encoded straight to bytes, without `response_model` validation and `jsonable_encoder`,
+    so it must already have the shape of the schema, see `row_as_dict`
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=default_encoder, option=orjson.OPT_NON_STR_KEYS)
+
+
+_schema_fields: Dict[Type[BaseModel], Tuple[str, ...]] = {}
+
+
+def row_as_dict(schema: Type[BaseModel], row: Any, fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Take only fields of the schema (or the requested subset of them) from ORM object, read model or row mapping,
+    the rest (e.g. `password_hash`) never leaks
+    """
+    if fields is None and (fields := _schema_fields.get(schema)) is None:
+        fields = _schema_fields[schema] = tuple(field.alias for field in schema.__fields__.values())
+    if isinstance(row, Mapping):
+        return {field: row[field] for field in fields}
+    return {field: getattr(row, field) for field in fields}
+
+
+def rows_as_dicts(
+        schema: Type[BaseModel], rows: Iterable[Any], fields: Optional[Iterable[str]] = None
+) -> List[Dict[str, Any]]:
+    return [row_as_dict(schema, row, fields) for row in rows]
+
+
+def schema_response(
+        schema: Type[BaseModel],
+        content: Any,
+        status_code: int = status.HTTP_200_OK,
+        headers: Optional[Mapping[str, str]] = None,
+        partial: bool = False,
+) -> ORJSONResponse:
+    """
+    Response of trusted content, that is built by the application itself from database rows.
+    It's validated against the schema only when `TRUSTED_RESPONSES` is disabled,
+    `partial` content (sparse fieldsets) can't be validated against the full schema, so it's never validated
+    """
+    if partial or injector.get(Settings).application.trusted_responses:
+        return TrustedORJSONResponse(content, status_code=status_code, headers=headers)
+    return ORJSONResponse(schema.parse_obj(content).dict(), status_code=status_code, headers=headers)
@@ -0,0 +1,47 @@
+import asyncio
+import functools
+from typing import Any, Callable, Tuple
+
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.routing import Match
+from starlette.types import Scope
+
+from server.shared.utils.timing import mark_endpoint_finished
+
+
+class TimedAPIRoute(APIRoute):
+    """
+    Route, that marks the moment when endpoint returns, everything after it and before the response is sent
+    (validation against `response_model`, encoding to JSON) is reported as serialization time.
+
+    Matched route is also put into the scope as `scope["route"]`, to label metrics with the path template
+    """
+
+    def matches(self, scope: Scope) -> Tuple[Match, Scope]:
+        match, child_scope = super().matches(scope)
+        if match != Match.NONE:
+            child_scope["route"] = self
+        return match, child_scope
+
+    def get_route_handler(self) -> Callable[[Request], Any]:
+        call = self.dependant.call
+
+        if asyncio.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def timed_call(*args: Any, **kwargs: Any) -> Any:
+                try:
+                    return await call(*args, **kwargs)
+                finally:
+                    mark_endpoint_finished()
+        else:
+            @functools.wraps(call)
+            def timed_call(*args: Any, **kwargs: Any) -> Any:
+                try:
+                    return call(*args, **kwargs)
+                finally:
+                    mark_endpoint_finished()
+
+        self.dependant.call = timed_call
+        return super().get_route_handler()
+
@@ -1,7 +1,5 @@
 from typing import Union, Literal, Protocol
 
-from authlib.oauth2 import OAuth2Client
-
 
 class PasswordHasher(Protocol):
     def hash(self, password: Union[str, bytes]) -> str: ...
@@ -11,5 +9,13 @@ class PasswordHasher(Protocol):
     def check_needs_rehash(self, hash: str) -> bool: ...
 
 
+class AsyncPasswordHasher(Protocol):
+    async def hash(self, password: Union[str, bytes]) -> str: ...
+
+    async def verify(self, hash: Union[str, bytes], password: Union[str, bytes]) -> Literal[True]: ...
+
+    def check_needs_rehash(self, hash: str) -> bool: ...
+
+
 class OAuth(Protocol):
-    ...
+    async def shutdown(self) -> None: ...
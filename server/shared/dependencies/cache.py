@@ -0,0 +1,29 @@
+from typing import Any, Callable, Dict, Hashable, Optional, Protocol
+
+
+class PrincipalCache(Protocol):
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Optional[Any]: ...
+
+    def set(self, key: Hashable, value: Any) -> None: ...
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Optional[Any]: ...
+
+    def pop_where(self, predicate: Callable[[Any], bool]) -> int: ...
+
+    def stats(self) -> Dict[str, Any]: ...
+
+
+class TokenCache(Protocol):
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Optional[Any]: ...
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None: ...
+
+    def stats(self) -> Dict[str, Any]: ...
+
+
+class CountCache(Protocol):
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Optional[Any]: ...
+
+    def set(self, key: Hashable, value: Any) -> None: ...
+
+    def stats(self) -> Dict[str, Any]: ...
@@ -1,6 +1,7 @@
 import contextlib
-from typing import AsyncGenerator, Callable, Protocol
+from typing import Any, AsyncGenerator, Callable, Dict, Protocol
 
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlalchemy.orm import Session
 
 
@@ -8,7 +9,33 @@ class Database(Protocol):
     def session(self) -> Callable[..., contextlib.AbstractContextManager[Session]]:
         ...
 
+    def reset_after_fork(self) -> None:
+        ...
+
+    def dispose(self) -> int:
+        ...
+
 
 class AsyncDatabase(Protocol):
-    async def async_session(self) -> AsyncGenerator:
+    engine: AsyncEngine
+
+    async def async_session(self, read_only: bool = False) -> AsyncGenerator:
+        ...
+
+    def start_liveness_check(self) -> None:
+        ...
+
+    async def stop_liveness_check(self) -> None:
+        ...
+
+    def pool_stats(self) -> Dict[str, Any]:
+        ...
+
+    async def server_max_connections(self) -> int:
+        ...
+
+    def reset_after_fork(self) -> None:
+        ...
+
+    async def dispose(self, timeout: float = 0.0) -> Dict[str, int]:
         ...
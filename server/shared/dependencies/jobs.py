@@ -0,0 +1,7 @@
+from typing import Any, Dict, Protocol
+
+
+class JobQueue(Protocol):
+    async def enqueue(self, name: str, payload: Dict[str, Any], delay: float = 0.0) -> None: ...
+
+    async def shutdown(self, timeout: float) -> None: ...
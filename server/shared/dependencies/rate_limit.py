@@ -0,0 +1,5 @@
+from typing import Protocol
+
+
+class RateLimitStore(Protocol):
+    def take(self, key: str, rate: float, burst: float) -> float: ...
@@ -0,0 +1,9 @@
+from typing import Optional, Protocol
+
+
+class SessionStore(Protocol):
+    async def load(self, session_id: str) -> Optional[str]: ...
+
+    async def save(self, session_id: str, data: str) -> None: ...
+
+    async def delete(self, session_id: str) -> None: ...
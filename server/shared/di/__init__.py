@@ -1 +1 @@
-from .dependency_provider import injector
+from .dependency_provider import Lifetime, dependency_scope, injector
@@ -1,36 +1,202 @@
+import contextlib
+import enum
+import functools
 import inspect
+import typing
+from contextvars import ContextVar
 from textwrap import dedent
-from typing import Callable, Dict, Type
+from typing import Any, Callable, Dict, Iterator, Optional, Set, Tuple, Type
 
 from .exceptions import DependencyInjectionError, DependencyNotFound
 
 
+class Lifetime(str, enum.Enum):
+    # one instance per process
+    SINGLETON = "singleton"
+    # a new instance on every `get`
+    FACTORY = "factory"
+    # one instance per scope, `DependencyScopeMiddleware` opens a scope per request
+    SCOPED = "scoped"
+
+
+# instances of scoped dependencies, that were created in the current scope
+scoped_instances: ContextVar[Optional[Dict[Type, Any]]] = ContextVar("scoped_instances", default=None)
+
+
+@contextlib.contextmanager
+def dependency_scope() -> Iterator[None]:
+    """
+    Scoped dependencies are created once inside the block and shared by everything, that runs in it.
+    Outside of a scope they behave like factories
+    """
+    token = scoped_instances.set({})
+    try:
+        yield
+    finally:
+        scoped_instances.reset(token)
+
+
+def _unwrap_optional(annotation: Any) -> Any:
+    if typing.get_origin(annotation) is typing.Union:
+        arguments = [argument for argument in typing.get_args(annotation) if argument is not type(None)]
+        if len(arguments) == 1:
+            return arguments[0]
+    return annotation
+
+
+@functools.lru_cache(maxsize=None)
+def constructor_parameters(cls: Any) -> Tuple[Tuple[str, Any], ...]:
+    """Annotated parameters of the class constructor, `Optional[X]` is treated as `X`"""
+    try:
+        hints = typing.get_type_hints(cls.__init__)
+    except (NameError, TypeError):
+        return ()
+    return tuple(
+        (name, _unwrap_optional(annotation)) for name, annotation in hints.items() if name != "return"
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def functions_with_signatures(cls: Any) -> Dict[str, inspect.Signature]:
+    # ignore all functions which start with an underscore
+    return {
+        t[0]: inspect.signature(t[1])
+        for t in inspect.getmembers(cls)
+        if t[0][0] != "_" and inspect.isfunction(t[1])
+    }
+
+
 class DependencyProvider:
+    """
+    Protocols are registered with an implementation (a class or a factory function) and a lifetime.
+
+    Constructor parameters annotated with registered protocols are injected. The way to build every dependency
+    is compiled on the first `get` into a resolver, so `get` itself is a dict lookup and a call;
+    any registration drops compiled resolvers, as they may refer to the replaced implementation
+    """
+
     def __init__(self):
         self.provider_map: Dict[Type, Callable] = {}
+        self.lifetimes: Dict[Type, Lifetime] = {}
+        self._singletons: Dict[Type, Any] = {}
+        self._resolvers: Dict[Type, Callable[[], Any]] = {}
+        self._checked: Set[Tuple[Any, Any]] = set()
 
     def get(self, protocol):
-        try:
-            return self.provider_map[protocol]()
-        except KeyError:
-            raise DependencyNotFound(protocol)
+        resolver = self._resolvers.get(protocol) or self._compile(protocol)
+        return resolver()
 
-    def register_as_singleton(self, protocol, cls):
-        instance = cls()
-        self.provider_map[protocol] = lambda: instance
+    def peek(self, protocol):
+        """Singleton instance if it's already created, lazy singletons aren't created by this call"""
+        return self._singletons.get(protocol)
+
+    def register_as_singleton(self, protocol, cls, lazy: bool = False):
+        self._register(protocol, cls, Lifetime.SINGLETON)
+        if lazy:
+            return
+        # created at registration, so misconfiguration fails on startup instead of the first request
+        try:
+            self._singletons[protocol] = self._compile_constructor(protocol)()
+        except Exception:
+            del self.provider_map[protocol], self.lifetimes[protocol]
+            raise
 
     def register_as_factory(self, protocol, cls):
-        self.provider_map[protocol] = cls
+        self._register(protocol, cls, Lifetime.FACTORY)
+
+    def register_as_scoped(self, protocol, cls):
+        self._register(protocol, cls, Lifetime.SCOPED)
 
-    def register(self, protocol, cls, as_singleton: bool = True):
+    def register(
+            self, protocol, cls, as_singleton: bool = True, lifetime: Optional[Lifetime] = None, lazy: bool = False
+    ):
+        """`lazy` singletons are created on the first `get`, for optional subsystems that many workers never use"""
         self.check_implements_protocol(protocol, cls)
 
-        if as_singleton:
-            self.register_as_singleton(protocol, cls)
-        else:
+        if lifetime is None:
+            lifetime = Lifetime.SINGLETON if as_singleton else Lifetime.FACTORY
+        if lifetime is Lifetime.SINGLETON:
+            self.register_as_singleton(protocol, cls, lazy=lazy)
+        elif lifetime is Lifetime.FACTORY:
             self.register_as_factory(protocol, cls)
+        else:
+            self.register_as_scoped(protocol, cls)
+
+    def _register(self, protocol, cls, lifetime: Lifetime) -> None:
+        self.provider_map[protocol] = cls
+        self.lifetimes[protocol] = lifetime
+        self._singletons.pop(protocol, None)
+        self._resolvers.clear()
+
+    def _compile(self, protocol, resolving: Tuple[Type, ...] = ()) -> Callable[[], Any]:
+        if (resolver := self._resolvers.get(protocol)) is not None:
+            return resolver
+        if protocol not in self.provider_map:
+            raise DependencyNotFound(protocol)
+        if protocol in resolving:
+            chain = " -> ".join(getattr(item, "__name__", repr(item)) for item in (*resolving, protocol))
+            raise DependencyInjectionError(f"Circular dependency: {chain}")
+
+        lifetime = self.lifetimes[protocol]
+        if lifetime is Lifetime.SINGLETON:
+            if (instance := self._singletons.get(protocol)) is None:
+                instance = self._singletons[protocol] = self._compile_constructor(protocol, resolving)()
+            resolver = lambda: instance  # noqa: E731
+        elif lifetime is Lifetime.FACTORY:
+            resolver = self._compile_constructor(protocol, resolving)
+        else:
+            resolver = self._compile_scoped(protocol, self._compile_constructor(protocol, resolving))
+        self._resolvers[protocol] = resolver
+        return resolver
+
+    def _compile_constructor(self, protocol, resolving: Tuple[Type, ...] = ()) -> Callable[[], Any]:
+        cls = self.provider_map[protocol]
+        if self.lifetimes[protocol] is Lifetime.SINGLETON:
+            # a singleton would keep the instance of the first scope forever
+            for name, dependency in (constructor_parameters(cls) if inspect.isclass(cls) else ()):
+                if self.lifetimes.get(dependency) is Lifetime.SCOPED:
+                    raise DependencyInjectionError(f"Singleton {protocol} can't depend on scoped {dependency}")
+        constants, dependencies = {}, []
+        # factory functions get no arguments
+        for name, dependency in (constructor_parameters(cls) if inspect.isclass(cls) else ()):
+            if dependency not in self.provider_map:
+                continue
+            resolve = self._compile(dependency, (*resolving, protocol))
+            if self.lifetimes[dependency] is Lifetime.SINGLETON:
+                # singletons are bound once, only the other dependencies are resolved on every call
+                constants[name] = resolve()
+            else:
+                dependencies.append((name, resolve))
+
+        if constants:
+            cls = functools.partial(cls, **constants)
+        if not dependencies:
+            return cls
+
+        def construct():
+            return cls(**{name: resolve() for name, resolve in dependencies})
+
+        return construct
+
+    @staticmethod
+    def _compile_scoped(protocol, construct: Callable[[], Any]) -> Callable[[], Any]:
+        def resolve():
+            instances = scoped_instances.get()
+            if instances is None:
+                return construct()
+            try:
+                return instances[protocol]
+            except KeyError:
+                instance = instances[protocol] = construct()
+                return instance
+
+        return resolve
 
     def check_implements_protocol(self, protocol, cls):
+        # factory functions (e.g. lambdas, that pass settings into a constructor) can't be checked before the call
+        if not inspect.isclass(cls) or (protocol, cls) in self._checked:
+            return
+
         protocol_funcs = self.get_functions_with_signatures(protocol)
         cls_funcs = self.get_functions_with_signatures(cls)
 
@@ -46,14 +212,10 @@ class DependencyProvider:
                         """
                     )
                 )
+        self._checked.add((protocol, cls))
 
     def get_functions_with_signatures(self, cls):
-        # ignore all functions which start with an underscore
-        return {
-            t[0]: inspect.signature(t[1])
-            for t in inspect.getmembers(cls)
-            if t[0][0] != "_" and inspect.isfunction(t[1])
-        }
+        return functions_with_signatures(cls)
 
 
 injector = DependencyProvider()
@@ -0,0 +1,89 @@
+"""
+Prometheus metrics of the application.
+
+Gunicorn runs several workers, so metrics are written into files of the shared `PROMETHEUS_MULTIPROC_DIR`
+directory and `/metrics` aggregates them over all workers. The variable has to be set before
+`prometheus_client` is imported, otherwise every worker reports only its own values
+"""
+import os
+import typing
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+
+MULTIPROCESS_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "Number of processed requests", ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time until response headers are sent", ["method", "route"]
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests that are being processed", ["method"], multiprocess_mode="livesum"
+)
+
+DB_POOL_SIZE = Gauge(
+    "db_pool_size", "Configured size of connection pools", multiprocess_mode="livesum"
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections", "Connections checked out from pools", multiprocess_mode="livesum"
+)
+DB_POOL_OVERFLOW = Gauge(
+    "db_pool_overflow_connections", "Connections opened above pool size", multiprocess_mode="livesum"
+)
+DB_STATEMENTS_PER_REQUEST = Histogram(
+    "db_statements_per_request", "Statements executed during a request", buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+DB_TIME_PER_REQUEST = Histogram(
+    "db_time_per_request_seconds", "Time spent in the database during a request"
+)
+DB_SINGLE_FLIGHT_QUERIES = Counter(
+    "db_single_flight_queries_total",
+    "Single-flight read queries, that were executed or joined an identical in-flight one",
+    ["outcome"],
+)
+
+PASSWORD_HASHER_DURATION = Histogram(
+    "password_hasher_duration_seconds",
+    "Time of password hashing calls, split into waiting for a worker and hashing itself",
+    ["operation", "phase"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+PASSWORD_HASHER_REJECTED = Counter(
+    "password_hasher_rejected_total", "Hashing calls rejected because the hasher queue was full"
+)
+LOGIN_RATE_LIMITED = Counter(
+    "login_rate_limited_total", "Login attempts rejected by the rate limiter, by the exhausted bucket", ["scope"]
+)
+
+JOBS_ENQUEUED = Counter("jobs_enqueued_total", "Background jobs put into the queue", ["job"])
+JOBS_PROCESSED = Counter(
+    "jobs_processed_total", "Background jobs handled by workers, by the outcome of the attempt", ["job", "outcome"]
+)
+JOB_DURATION = Histogram("job_duration_seconds", "Time of a handler call, that may process a batch of jobs", ["job"])
+
+
+def is_multiprocess_mode() -> bool:
+    return MULTIPROCESS_DIR_ENV in os.environ
+
+
+def collect_metrics() -> bytes:
+    registry: CollectorRegistry = REGISTRY
+    if is_multiprocess_mode():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def observe_pool(pool: typing.Any) -> None:
+    # NullPool and other pools without a queue have nothing to report
+    if not hasattr(pool, "checkedout"):
+        return
+    DB_POOL_SIZE.set(pool.size())
+    DB_POOL_CHECKED_OUT.set(pool.checkedout())
+    DB_POOL_OVERFLOW.set(max(pool.overflow(), 0))
+
+
+def mark_process_dead(pid: int) -> None:
+    if is_multiprocess_mode():
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,75 @@
+from collections import OrderedDict
+import time
+import typing
+
+Key = typing.TypeVar("Key", bound=typing.Hashable)
+Value = typing.TypeVar("Value")
+
+
+class TTLCache(typing.Generic[Key, Value]):
+    """
+    In-process LRU cache, where every entry also expires `ttl` seconds after it was set.
+    It isn't thread-safe and meant to be used from the event loop only
+
+        cache = TTLCache(maxsize=1000, ttl=30)
+        cache.set("key", value)
+        cache.get("key")
+    """
+
+    def __init__(
+            self, maxsize: int, ttl: float, timer: typing.Callable[[], float] = time.monotonic
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._entries: "OrderedDict[Key, typing.Tuple[float, Value]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Key, default: typing.Optional[Value] = None) -> typing.Optional[Value]:
+        try:
+            expires_at, value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        if expires_at <= self._timer():
+            del self._entries[key]
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Key, value: Value, ttl: typing.Optional[float] = None) -> None:
+        """
+        :param ttl: lifetime of this entry, it can only shorten the default `ttl` of the cache
+        """
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._entries[key] = (self._timer() + ttl, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Key, default: typing.Optional[Value] = None) -> typing.Optional[Value]:
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def pop_where(self, predicate: typing.Callable[[Value], bool]) -> int:
+        """Drop entries, whose value matches `predicate`, it goes through the whole cache"""
+        keys = [key for key, (_, value) in self._entries.items() if predicate(value)]
+        for key in keys:
+            del self._entries[key]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        return len(self._entries)
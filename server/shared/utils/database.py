@@ -1,22 +1,43 @@
+import enum
 from functools import partial, wraps
+import time
 import typing
 
+import orjson
 from sqlalchemy import (
+    any_,
+    bindparam,
     lambda_stmt,
     select as sql_select,
     update as sql_update,
     exists as sql_exists,
     delete as sql_delete,
-    func
+    func,
+    text,
 )
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement
 
 from ..di import injector
+from ..dependencies.cache import CountCache
 from ..dependencies.database import AsyncDatabase
-from ...config.infrastructure.databases.postgres import current_session
+from ..dependencies.settings import Settings
+from ..metrics import DB_SINGLE_FLIGHT_QUERIES
+from .dataloader import DataLoader, clear_loaders, get_loader
+from .query_stats import record_query
+from .read_models import Field, projection
+from .singleflight import single_flight
+from .timing import record_timing
+from ...config.infrastructure.databases.postgres import current_session, mark_write, written_recently
 
 Model = typing.TypeVar("Model")
 ASTERISK = "*"
+STREAM_BATCH_SIZE = 1000
+Only = typing.Optional[typing.Iterable[Field]]
+SINGLE_FLIGHT_DIALECT = postgresql.dialect()
 
 
 async def get_db_session() -> typing.Callable[..., typing.AsyncContextManager]:  # type: ignore
@@ -32,23 +53,117 @@ async def get_db_session() -> typing.Callable[..., typing.AsyncContextManager]:
     return db.async_session
 
 
-def async_db_operation(function=None, *, callback=lambda value: value, to_model: bool = False):
+def statement_name(function: typing.Callable, args: typing.Sequence[typing.Any]) -> str:
+    """Cheap label of the statement for stats, e.g. `select_one:User`, compiling SQL is too expensive for that"""
+    if args and (model_name := getattr(args[0], "__name__", None)):
+        return f"{function.__name__}:{model_name}"
+    return function.__name__
+
+
+WriteHook = typing.Callable[[typing.Sequence[typing.Mapping[str, typing.Any]]], None]
+_write_hooks: typing.Dict[typing.Any, typing.List[WriteHook]] = {}
+
+
+def on_write(model: typing.Any) -> typing.Callable[[WriteHook], WriteHook]:
+    """
+    Register a hook, that is called after `create`, `update` or `delete` of `model` rows with the written rows.
+    Everything, that keeps derived state of rows (caches, memoized loaders), invalidates it here
+
+        @on_write(User)
+        def evict_principals(rows):
+            ...
+    """
+    def decorator(hook: WriteHook) -> WriteHook:
+        _write_hooks.setdefault(model, []).append(hook)
+        return hook
+
+    return decorator
+
+
+def run_write_hooks(model: typing.Any, result: typing.Any) -> None:
+    if result is None:
+        rows = []
+    elif isinstance(result, typing.Mapping):
+        rows = [result]
+    else:
+        rows = list(result)
+    # memoized rows of the request are dropped for every model, even without registered hooks
+    forget_loaded(model)
+    for hook in _write_hooks.get(model, ()):
+        hook(rows)
+
+
+def single_flight_key(stmt: typing.Any) -> typing.Hashable:
+    compiled = stmt.compile(dialect=SINGLE_FLIGHT_DIALECT)
+    return str(compiled), repr(sorted(compiled.params.items()))
+
+
+def can_share_execution(database_settings: typing.Any) -> bool:
+    # an open transaction may see its own uncommitted changes, and an in-flight read started before
+    # the own write of the request may not see it
+    return (
+        database_settings.single_flight
+        and current_session.get() is None
+        and not written_recently(database_settings.read_your_writes_window)
+    )
+
+
+def async_db_operation(
+        function=None,
+        *,
+        callback=lambda value: value,
+        to_model: bool = False,
+        read_only: bool = False,
+        single_flight_allowed: bool = False,
+):
+    """
+    Execute statement, that is returned by the decorated function, in the current session or in a new one.
+
+    `read_only` statements may be routed to a read replica, the rest go to the primary
+    and keep the following reads of the request on the primary for a while (read-your-writes).
+
+    `single_flight_allowed` read statements are coalesced when `DB_SINGLE_FLIGHT` is enabled:
+    identical statements with identical parameters, that are executed concurrently outside of a transaction,
+    share one execution and one result. Shared ORM objects are detached, they must not be modified
+    """
     if function is None:
-        return partial(async_db_operation, callback=callback, to_model=to_model)
+        return partial(
+            async_db_operation,
+            callback=callback,
+            to_model=to_model,
+            read_only=read_only,
+            single_flight_allowed=single_flight_allowed,
+        )
+
+    async def execute(stmt: typing.Any) -> typing.Any:
+        if session := current_session.get():
+            return callback(await session.execute(stmt))
+
+        db = injector.get(AsyncDatabase)
+
+        async with db.async_session(read_only=read_only) as session:
+            return callback(await session.execute(stmt))
 
     @wraps(function)
     async def wrapper(*args, **kwargs):
         stmt = await function(*args, **kwargs)
+        started_at = time.perf_counter()
 
-        if session := current_session.get():
-            result = await session.execute(stmt)
+        if read_only and single_flight_allowed and can_share_execution(injector.get(Settings).database):
+            key = single_flight_key(stmt)
+            DB_SINGLE_FLIGHT_QUERIES.labels("coalesced" if single_flight.in_flight(key) else "executed").inc()
+            result = await single_flight.do(key, partial(execute, stmt))
         else:
-            db = injector.get(AsyncDatabase)
+            result = await execute(stmt)
 
-            async with db.async_session() as session:
-                result = await session.execute(stmt)
+        if not read_only:
+            mark_write()
+            if args:
+                run_write_hooks(args[0], result)
 
-        result = callback(result)
+        elapsed = time.perf_counter() - started_at
+        record_timing("db", elapsed)
+        record_query(statement_name(function, args), elapsed)
 
         if to_model:
             model = args[0]
@@ -66,37 +181,143 @@ async def create(model: Model, /, **values: typing.Any) -> Model:
     return insert_stmt
 
 
-@async_db_operation(callback=lambda value: value.scalars().all())
-async def select_all(model: Model, *clauses: typing.Any) -> typing.List[Model]:
+@async_db_operation(callback=lambda value: value.mappings().all())
+async def create_many(model: Model, rows: typing.Sequence[typing.Mapping[str, typing.Any]], /) -> typing.List[Model]:
+    """Add rows of model into database with one statement"""
+    return insert(model).values(list(rows)).returning(model)
+
+
+def selectable(model: Model, only: Only = None) -> typing.Any:
+    """
+    Whole entity, or only the given columns as lightweight `ReadModel`s (`only=["id", "username"]`),
+    that skip the identity map and attribute instrumentation and fetch less data
+    """
+    return model if only is None else projection(model, only)
+
+
+@async_db_operation(callback=lambda value: value.scalars().all(), read_only=True)
+async def select_all(model: Model, *clauses: typing.Any, only: Only = None) -> typing.List[Model]:
     """
     Selecting data from table and filter by kwargs data
 
     :param model:
     :param clauses:
+    :param only: columns to select, see `selectable`
     :return:
     """
+    if only is not None:
+        return sql_select(selectable(model, only)).where(*clauses)
     stmt = lambda_stmt(lambda: sql_select(model))
     stmt += lambda s: s.where(*clauses)
     return stmt
 
 
-@async_db_operation(callback=lambda value: value.scalars().first())
-async def select_one(model: Model, *clauses: typing.Any) -> Model:
+@async_db_operation(callback=lambda value: value.scalars().all(), read_only=True)
+async def select_page(
+        model: Model, *clauses: typing.Any, limit: int, after: typing.Optional[typing.Any] = None, only: Only = None
+) -> typing.List[Model]:
+    """
+    Keyset pagination: return up to `limit` rows ordered by primary key, starting right after `after`.
+    Unlike OFFSET, the cost of a page doesn't grow with its position, because postgres seeks by pk index
+
+    :param model:
+    :param clauses:
+    :param limit: max rows in a page
+    :param after: primary key of the last row from the previous page
+    :param only: columns to select, see `selectable`
+    :return:
+    """
+    stmt = sql_select(selectable(model, only)).where(*clauses)
+    if after is not None:
+        stmt = stmt.where(model.id > after)
+    return stmt.order_by(model.id).limit(limit)
+
+
+async def stream_all(
+        model: Model, *clauses: typing.Any, batch_size: int = STREAM_BATCH_SIZE, only: Only = None
+) -> typing.AsyncIterator[Model]:
+    """
+    Iterate over table rows through a server-side cursor,
+    so memory usage stays the same regardless of the table size
+
+        async for user in stream_all(User):
+            do staff
+    """
+    stmt = (
+        sql_select(selectable(model, only))
+        .where(*clauses)
+        .order_by(model.id)
+        .execution_options(yield_per=batch_size)
+    )
+
+    if session := current_session.get():
+        async for row in await session.stream_scalars(stmt):
+            yield row
+        return
+
+    db = injector.get(AsyncDatabase)
+
+    async with db.async_session(read_only=True) as session:
+        async for row in await session.stream_scalars(stmt):
+            yield row
+
+
+@async_db_operation(callback=lambda value: value.scalars().first(), read_only=True, single_flight_allowed=True)
+async def select_one(model: Model, *clauses: typing.Any, only: Only = None) -> Model:
     """
     Return scalar value
     """
+    if only is not None:
+        return sql_select(selectable(model, only)).where(*clauses)
     stmt = lambda_stmt(lambda: sql_select(model))
     stmt += lambda s: s.where(*clauses)
     return stmt
 
 
-@async_db_operation(callback=lambda value: None)
-async def update(model: Model, *clauses: typing.Any, **values: typing.Any) -> None:
-    stmt = sql_update(model).where(*clauses).values(**values).returning(None)
+@async_db_operation(callback=lambda value: value.scalars().all(), read_only=True, single_flight_allowed=True)
+async def select_in(model: Model, column: typing.Any, keys: typing.Sequence[typing.Any]) -> typing.List[Model]:
+    """`WHERE column = ANY(:keys)`, one bound array keeps the statement the same for any number of keys"""
+    return sql_select(model).where(column == any_(bindparam("keys", list(keys), type_=ARRAY(column.type))))
+
+
+def model_loader(model: Model, column: typing.Optional[typing.Any] = None) -> DataLoader:
+    """Request-scoped loader of `model` rows by a unique column (primary key by default)"""
+    column = model.id if column is None else column
+
+    async def batch_load(keys: typing.List[typing.Any]) -> typing.Dict[typing.Any, Model]:
+        return {getattr(row, column.key): row for row in await select_in(model, column, keys)}
+
+    return get_loader((model, column.key), lambda: DataLoader(batch_load))
+
+
+async def load_one(model: Model, key: typing.Any, column: typing.Optional[typing.Any] = None) -> typing.Optional[Model]:
+    """
+    Same as `select_one(model, column == key)`, but concurrent lookups of the request are batched into one query
+    and repeated lookups are served from memory
+
+        user, other = await asyncio.gather(load_one(User, 1), load_one(User, "admin", User.username))
+    """
+    return await model_loader(model, column).load(key)
+
+
+async def load_many(
+        model: Model, keys: typing.Iterable[typing.Any], column: typing.Optional[typing.Any] = None
+) -> typing.List[typing.Optional[Model]]:
+    return await model_loader(model, column).load_many(keys)
+
+
+def forget_loaded(model: typing.Any) -> None:
+    """Drop rows of `model` memoized by the request loaders, writes call it automatically"""
+    clear_loaders(lambda key: isinstance(key, tuple) and key[0] is model)
+
+
+@async_db_operation(callback=lambda value: value.mappings().all())
+async def update(model: Model, *clauses: typing.Any, **values: typing.Any) -> typing.List[Model]:
+    stmt = sql_update(model).where(*clauses).values(**values).returning(ASTERISK)
     return stmt
 
 
-@async_db_operation(callback=lambda value: value.scalar())
+@async_db_operation(callback=lambda value: value.scalar(), read_only=True, single_flight_allowed=True)
 async def exists(model: Model, *clauses: typing.Any) -> typing.Optional[bool]:
     stmt = sql_exists(sql_select(model).where(*clauses)).select()
     return stmt
@@ -108,7 +329,77 @@ async def delete(model: Model, *clauses: typing.Any) -> typing.List[Model]:
     return stmt
 
 
-@async_db_operation(callback=lambda value: value.scalars().first())
-async def count(model: Model) -> int:
-    stmt = func.count(model.id)
-    return stmt
+class CountMode(str, enum.Enum):
+    EXACT = "exact"
+    # planner estimation, it costs nothing but may be off by a few percent, good enough for dashboards and totals
+    ESTIMATED = "estimated"
+    # exact count, that is reused until it expires, see `DB_COUNT_CACHE_TTL`
+    CACHED = "cached"
+
+
+class Explain(Executable, ClauseElement):
+    """`EXPLAIN (FORMAT JSON) <statement>`, returns the plan of statement without executing it"""
+
+    inherit_cache = False
+
+    def __init__(self, statement: typing.Any) -> None:
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler: typing.Any, **kw: typing.Any) -> str:
+    return "EXPLAIN (FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+def _plan_rows(plan: typing.Any) -> int:
+    if isinstance(plan, (str, bytes)):
+        plan = orjson.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def _count_statement(model: Model, *clauses: typing.Any) -> typing.Any:
+    return sql_select(func.count()).select_from(model).where(*clauses)
+
+
+@async_db_operation(callback=lambda value: value.scalar(), read_only=True)
+async def exact_count(model: Model, *clauses: typing.Any) -> int:
+    return _count_statement(model, *clauses)
+
+
+@async_db_operation(callback=lambda value: value.scalar(), read_only=True)
+async def table_size_estimate(model: Model) -> int:
+    """Live rows according to the statistics, -1 if the table has never been vacuumed or analyzed"""
+    return text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)").bindparams(
+        table=model.__table__.fullname
+    )
+
+
+@async_db_operation(callback=lambda value: _plan_rows(value.scalar()), read_only=True)
+async def plan_rows_estimate(model: Model, *clauses: typing.Any) -> int:
+    return Explain(sql_select(model).where(*clauses))
+
+
+async def count(model: Model, *clauses: typing.Any, mode: CountMode = CountMode.EXACT) -> int:
+    """
+    Count rows of any `Base` model, that match clauses
+
+        await count(User, mode=CountMode.ESTIMATED)
+        await count(User, User.balance > 0, mode=CountMode.CACHED)
+
+    Exact count of a big table is a full scan, so prefer estimations wherever exact value isn't necessary
+    """
+    if mode is CountMode.ESTIMATED:
+        if not clauses and (estimate := await table_size_estimate(model)) >= 0:
+            return estimate
+        return await plan_rows_estimate(model, *clauses)
+
+    if mode is CountMode.CACHED:
+        compiled = _count_statement(model, *clauses).compile()
+        key = (str(compiled), repr(sorted(compiled.params.items())))
+        cache: CountCache = injector.get(CountCache)
+        if (value := cache.get(key)) is None:
+            value = await exact_count(model, *clauses)
+            cache.set(key, value)
+        return value
+
+    return await exact_count(model, *clauses)
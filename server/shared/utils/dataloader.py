@@ -0,0 +1,94 @@
+import asyncio
+from contextvars import ContextVar
+import contextlib
+import typing
+
+Key = typing.TypeVar("Key", bound=typing.Hashable)
+Value = typing.TypeVar("Value")
+BatchLoad = typing.Callable[[typing.List[Key]], typing.Awaitable[typing.Mapping[Key, Value]]]
+
+
+class DataLoader(typing.Generic[Key, Value]):
+    """
+    Collects keys requested during one event loop tick and loads them with a single `batch_load` call.
+    Loaded values (and misses) are memoized, so the loader must live no longer than a request
+
+        loader = DataLoader(load_users_by_id)
+        first, second = await asyncio.gather(loader.load(1), loader.load(2))  # one query
+    """
+
+    def __init__(self, batch_load: BatchLoad) -> None:
+        self._batch_load = batch_load
+        self._loaded: typing.Dict[Key, asyncio.Future] = {}
+        self._pending: typing.Dict[Key, asyncio.Future] = {}
+
+    def load(self, key: Key) -> typing.Awaitable[typing.Optional[Value]]:
+        if (future := self._loaded.get(key)) is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            loop.call_soon(self._dispatch)
+        self._pending[key] = self._loaded[key] = future
+        return future
+
+    async def load_many(self, keys: typing.Iterable[Key]) -> typing.List[typing.Optional[Value]]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def clear(self, *keys: Key) -> None:
+        """Forget loaded values, all of them if no keys passed"""
+        if not keys:
+            self._loaded.clear()
+        for key in keys:
+            self._loaded.pop(key, None)
+
+    def _dispatch(self) -> None:
+        batch, self._pending = self._pending, {}
+        asyncio.ensure_future(self._load_batch(batch))
+
+    async def _load_batch(self, batch: typing.Dict[Key, asyncio.Future]) -> None:
+        try:
+            values = await self._batch_load(list(batch))
+        except Exception as ex:
+            for key, future in batch.items():
+                # failures aren't memoized, the next load retries
+                self._loaded.pop(key, None)
+                if not future.done():
+                    future.set_exception(ex)
+            return
+
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(values.get(key))
+
+
+loaders: ContextVar[typing.Optional[typing.Dict[typing.Hashable, DataLoader]]] = ContextVar("loaders", default=None)
+
+
+@contextlib.contextmanager
+def dataloader_scope() -> typing.Iterator[None]:
+    """
+    Loaders are shared and memoized inside the block, `DataLoaderMiddleware` opens one per request.
+    Outside of a scope every lookup gets its own loader, so nothing is batched or memoized
+    """
+    token = loaders.set({})
+    try:
+        yield
+    finally:
+        loaders.reset(token)
+
+
+def get_loader(key: typing.Hashable, factory: typing.Callable[[], DataLoader]) -> DataLoader:
+    if (scope := loaders.get()) is None:
+        return factory()
+    if (loader := scope.get(key)) is None:
+        loader = scope[key] = factory()
+    return loader
+
+
+def clear_loaders(predicate: typing.Callable[[typing.Hashable], bool]) -> None:
+    if scope := loaders.get():
+        for key, loader in scope.items():
+            if predicate(key):
+                loader.clear()
@@ -0,0 +1,40 @@
+import typing
+
+import httpx
+
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    """
+    Keep-alive connection pool for short-lived clients. Libraries like authlib open an `httpx.AsyncClient`
+    for every call and close it right after, which closes its transport too; this one survives closing
+    of the clients, so connections to the same host are reused. `shutdown` closes the pool for real
+
+        transport = SharedTransport()
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.get(url)
+    """
+
+    def __init__(
+            self,
+            transport: typing.Optional[httpx.AsyncBaseTransport] = None,
+            max_connections: int = 10,
+            keepalive_expiry: float = 60.0,
+    ) -> None:
+        if transport is None:
+            limits = httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            )
+            transport = httpx.AsyncHTTPTransport(limits=limits, retries=1)
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        # called by every client on exit, the pool outlives them
+        pass
+
+    async def shutdown(self) -> None:
+        await self._transport.aclose()
@@ -0,0 +1,31 @@
+from contextvars import ContextVar
+import typing
+
+
+class QueryStats:
+    """
+    Statements executed through `async_db_operation` during one request
+    """
+
+    __slots__ = ("count", "total_seconds", "slowest_statement", "slowest_seconds")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest_statement: typing.Optional[str] = None
+        self.slowest_seconds = 0.0
+
+    def add(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds >= self.slowest_seconds:
+            self.slowest_statement = statement
+            self.slowest_seconds = seconds
+
+
+query_stats: ContextVar[typing.Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def record_query(statement: str, seconds: float) -> None:
+    if (stats := query_stats.get()) is not None:
+        stats.add(statement, seconds)
@@ -0,0 +1,128 @@
+"""
+Token buckets: every key has up to `burst` tokens, refilled at `rate` tokens per second, and every hit takes one.
+`take` returns 0 when a token was taken, otherwise seconds until the next one is available
+"""
+import hashlib
+import mmap
+import os
+import pathlib
+import struct
+import time
+import typing
+from collections import OrderedDict
+
+
+def refill(tokens: float, updated_at: float, now: float, rate: float, burst: float) -> float:
+    # a clock, that went back (the shared file outlived a reboot), doesn't take tokens away
+    return min(burst, tokens + max(0.0, now - updated_at) * rate)
+
+
+def retry_after(tokens: float, rate: float) -> float:
+    return (1 - tokens) / rate
+
+
+class MemoryRateLimitStore:
+    """
+    Buckets of one worker, split into shards by key hash. Every shard is an LRU of at most `max_keys / shards` keys,
+    so a flood of distinct keys (e.g. spoofed usernames) evicts the least recently used buckets of its shard only
+    """
+
+    def __init__(
+            self, shards: int = 16, max_keys: int = 100_000, clock: typing.Callable[[], float] = time.monotonic
+    ) -> None:
+        self._shards: typing.List["OrderedDict[str, typing.List[float]]"] = [OrderedDict() for _ in range(shards)]
+        self._max_keys_per_shard = max(1, max_keys // shards)
+        self._clock = clock
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        shard = self._shards[hash(key) % len(self._shards)]
+        now = self._clock()
+        if (bucket := shard.get(key)) is None:
+            bucket = shard[key] = [burst, now]
+            if len(shard) > self._max_keys_per_shard:
+                shard.popitem(last=False)
+        else:
+            shard.move_to_end(key)
+            bucket[0] = refill(bucket[0], bucket[1], now, rate, burst)
+            bucket[1] = now
+
+        if bucket[0] < 1:
+            return retry_after(bucket[0], rate)
+        bucket[0] -= 1
+        return 0.0
+
+
+class SharedRateLimitStore:
+    """
+    Buckets shared by all workers of a node: a fixed table of slots in a memory-mapped file.
+    Slots are grouped into shards, a worker holds an `fcntl` lock of the shard byte range while it updates a bucket.
+    A key is looked up among `probes` slots of its shard, when all are taken by other keys the stalest one is reused.
+    The clock is `time.monotonic`, that is the same for all processes of the machine
+    """
+
+    SLOT = struct.Struct("<Qdd")  # key hash, tokens, updated at
+
+    def __init__(
+            self,
+            path: pathlib.Path,
+            shards: int = 16,
+            slots_per_shard: int = 4096,
+            probes: int = 8,
+            clock: typing.Callable[[], float] = time.monotonic,
+    ) -> None:
+        # fcntl is POSIX only, the memory store doesn't need it
+        import fcntl
+        self._fcntl = fcntl
+        self.shards = shards
+        self.slots_per_shard = slots_per_shard
+        self.probes = min(probes, slots_per_shard)
+        self._clock = clock
+        size = shards * slots_per_shard * self.SLOT.size
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._descriptor).st_size < size:
+            os.ftruncate(self._descriptor, size)
+        self._map = mmap.mmap(self._descriptor, size)
+
+    def take(self, key: str, rate: float, burst: float) -> float:
+        key_hash = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") | 1
+        shard = key_hash % self.shards
+        shard_size = self.slots_per_shard * self.SLOT.size
+        first_slot = (key_hash // self.shards) % self.slots_per_shard
+
+        self._fcntl.lockf(self._descriptor, self._fcntl.LOCK_EX, shard_size, shard * shard_size)
+        try:
+            now = self._clock()
+            offset, bucket = self._find_slot(key_hash, shard * shard_size, first_slot)
+            tokens = burst if bucket is None else refill(*bucket, now, rate, burst)
+            allowed = tokens >= 1
+            self.SLOT.pack_into(self._map, offset, key_hash, tokens - 1 if allowed else tokens, now)
+        finally:
+            self._fcntl.lockf(self._descriptor, self._fcntl.LOCK_UN, shard_size, shard * shard_size)
+        return 0.0 if allowed else retry_after(tokens, rate)
+
+    def _find_slot(
+            self, key_hash: int, shard_offset: int, first_slot: int
+    ) -> typing.Tuple[int, typing.Optional[typing.Tuple[float, float]]]:
+        """Offset of the key's slot and its bucket, or of a free (or the stalest) slot and None"""
+        stalest_offset, stalest_updated_at = None, float("inf")
+        for probe in range(self.probes):
+            offset = shard_offset + (first_slot + probe) % self.slots_per_shard * self.SLOT.size
+            slot_hash, tokens, updated_at = self.SLOT.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                return offset, (tokens, updated_at)
+            if slot_hash == 0:
+                return offset, None
+            if updated_at < stalest_updated_at:
+                stalest_offset, stalest_updated_at = offset, updated_at
+        return stalest_offset, None
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._descriptor)
+
+
+def create_rate_limit_store(settings: typing.Any) -> typing.Union[MemoryRateLimitStore, SharedRateLimitStore]:
+    if settings.backend == "shared":
+        return SharedRateLimitStore(pathlib.Path(settings.shared_path), shards=settings.shards)
+    return MemoryRateLimitStore(shards=settings.shards, max_keys=settings.max_keys)
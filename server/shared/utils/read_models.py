@@ -0,0 +1,71 @@
+import functools
+import typing
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Bundle
+
+Field = typing.Union[str, typing.Any]
+
+
+class ReadModel:
+    """
+    Lightweight read-only row of selected columns: no identity map, no attribute instrumentation,
+    just `__slots__`, so it's cheap to build and small in memory
+    """
+
+    __slots__: typing.Tuple[str, ...] = ()
+
+    def __init__(self, *values: typing.Any) -> None:
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: typing.Any) -> None:
+        raise AttributeError(f"{type(self).__qualname__} is read-only")
+
+    def as_dict(self) -> typing.Dict[str, typing.Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other: typing.Any) -> bool:
+        return type(self) is type(other) and self.as_dict() == other.as_dict()
+
+    def __repr__(self) -> str:
+        values = " ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__qualname__}({values})"
+
+
+class ReadModelBundle(Bundle):
+    """Selects columns as one `ReadModel` per row, so `result.scalars()` works the same way as for entities"""
+
+    def __init__(self, read_model: typing.Type[ReadModel], *columns: typing.Any) -> None:
+        super().__init__(read_model.__name__, *columns)
+        self.read_model = read_model
+
+    def create_row_processor(self, query: typing.Any, procs: typing.Any, labels: typing.Any) -> typing.Callable:
+        read_model = self.read_model
+
+        def process(row: typing.Any) -> ReadModel:
+            return read_model(*(proc(row) for proc in procs))
+
+        return process
+
+
+def field_name(field: Field) -> str:
+    return field if isinstance(field, str) else field.key
+
+
+@functools.lru_cache(maxsize=256)
+def _projection(model: typing.Any, names: typing.Tuple[str, ...]) -> ReadModelBundle:
+    columns = inspect(model).columns
+    if unknown := [name for name in names if name not in columns]:
+        raise ValueError(f"{model.__name__} has no columns {', '.join(unknown)}")
+    read_model = type(f"{model.__name__}Read", (ReadModel,), {"__slots__": names})
+    return ReadModelBundle(read_model, *(getattr(model, name) for name in names))
+
+
+def projection(model: typing.Any, only: typing.Iterable[Field]) -> ReadModelBundle:
+    """
+    Bundle of `model` columns, that is selected instead of the whole entity
+
+        select(projection(User, ["id", User.username]))
+    """
+    return _projection(model, tuple(dict.fromkeys(field_name(field) for field in only)))
@@ -0,0 +1,131 @@
+"""
+Server-side sessions: `request.session` is kept in a `SessionStore`, the cookie carries only a random id.
+Sessions are stored as JSON, like the signed cookie of starlette kept them
+"""
+import asyncio
+import hashlib
+import os
+import pathlib
+import tempfile
+import time
+import typing
+
+from server.shared.utils.cache import TTLCache
+
+
+class Session(dict):
+    """
+    `request.session`, that remembers whether it was changed, so untouched sessions are never written back.
+    Only assignments to top-level keys are noticed, mutated nested values have to be assigned again
+    """
+
+    def __init__(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.modified = False
+
+    def __setitem__(self, key: str, value: typing.Any) -> None:
+        self.modified = True
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self.modified = True
+        super().__delitem__(key)
+
+    def pop(self, key: str, *default: typing.Any) -> typing.Any:
+        self.modified = self.modified or key in self
+        return super().pop(key, *default)
+
+    def popitem(self) -> typing.Tuple[str, typing.Any]:
+        self.modified = True
+        return super().popitem()
+
+    def setdefault(self, key: str, default: typing.Any = None) -> typing.Any:
+        self.modified = self.modified or key not in self
+        return super().setdefault(key, default)
+
+    def update(self, *args: typing.Any, **kwargs: typing.Any) -> None:
+        self.modified = True
+        super().update(*args, **kwargs)
+
+    def clear(self) -> None:
+        self.modified = self.modified or bool(self)
+        super().clear()
+
+
+class MemorySessionStore:
+    """LRU of sessions in the worker process, for a single worker; sessions expire `ttl` seconds after a write"""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._sessions: TTLCache[str, str] = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def load(self, session_id: str) -> typing.Optional[str]:
+        return self._sessions.get(session_id)
+
+    async def save(self, session_id: str, data: str) -> None:
+        self._sessions.set(session_id, data)
+
+    async def delete(self, session_id: str) -> None:
+        self._sessions.pop(session_id)
+
+
+class FileSessionStore:
+    """
+    Session per file in a directory, shared by all workers of a node. Files are named by a hash of the session id
+    and replaced atomically, a session expires `ttl` seconds after its file was written.
+    Expired files are purged on every `purge_every`-th write. File operations run in threads
+    """
+
+    def __init__(self, directory: pathlib.Path, ttl: float, purge_every: int = 1000) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self.purge_every = purge_every
+        self._writes = 0
+        directory.mkdir(parents=True, exist_ok=True)
+
+    async def load(self, session_id: str) -> typing.Optional[str]:
+        return await asyncio.to_thread(self._read, self._path(session_id))
+
+    async def save(self, session_id: str, data: str) -> None:
+        self._writes += 1
+        await asyncio.to_thread(self._write, self._path(session_id), data, self._writes % self.purge_every == 0)
+
+    async def delete(self, session_id: str) -> None:
+        await asyncio.to_thread(self._path(session_id).unlink, missing_ok=True)
+
+    def _path(self, session_id: str) -> pathlib.Path:
+        return self.directory / hashlib.sha256(session_id.encode()).hexdigest()
+
+    def _read(self, path: pathlib.Path) -> typing.Optional[str]:
+        try:
+            if path.stat().st_mtime + self.ttl < time.time():
+                path.unlink(missing_ok=True)
+                return None
+            return path.read_text()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path: pathlib.Path, data: str, purge: bool) -> None:
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, prefix=".")
+        with os.fdopen(descriptor, "w") as file:
+            file.write(data)
+        os.replace(temporary, path)
+        if purge:
+            self.purge()
+
+    def purge(self) -> int:
+        expired_before = time.time() - self.ttl
+        purged = 0
+        for path in self.directory.iterdir():
+            try:
+                if path.stat().st_mtime < expired_before:
+                    path.unlink(missing_ok=True)
+                    purged += 1
+            except FileNotFoundError:
+                pass
+        return purged
+
+
+def create_session_store(settings: typing.Any) -> typing.Union[MemorySessionStore, FileSessionStore]:
+    if settings.backend == "file":
+        return FileSessionStore(pathlib.Path(settings.directory), ttl=settings.max_age)
+    return MemorySessionStore(maxsize=settings.cache_size, ttl=settings.max_age)
@@ -0,0 +1,45 @@
+import asyncio
+import typing
+
+T = typing.TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Concurrent calls with the same key share one execution and its result
+
+        result = await single_flight.do(key, lambda: session.execute(stmt))
+
+    The shared call runs in its own task, so a cancelled caller (e.g. disconnected client)
+    doesn't cancel it for the others
+    """
+
+    def __init__(self) -> None:
+        self._calls: typing.Dict[typing.Hashable, asyncio.Future] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def in_flight(self, key: typing.Hashable) -> bool:
+        return key in self._calls
+
+    async def do(self, key: typing.Hashable, function: typing.Callable[[], typing.Awaitable[T]]) -> T:
+        if (call := self._calls.get(key)) is None:
+            call = self._calls[key] = asyncio.ensure_future(function())
+            call.add_done_callback(lambda done: self._forget(key, done))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(call)
+
+    def _forget(self, key: typing.Hashable, call: asyncio.Future) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # the error is re-raised to every caller, retrieve it in case all of them were cancelled
+        if not call.cancelled():
+            call.exception()
+
+    def stats(self) -> typing.Dict[str, int]:
+        return {"executed": self.executed, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,36 @@
+from contextvars import ContextVar
+import time
+import typing
+
+
+class RequestTimings:
+    """
+    Durations of request stages, collected while the request is processed
+
+    Stages are reported in the `Server-Timing` header, so they are named with a token (`db`, `hash`...)
+    """
+
+    __slots__ = ("durations", "endpoint_finished_at")
+
+    def __init__(self) -> None:
+        self.durations: typing.Dict[str, float] = {}
+        self.endpoint_finished_at: typing.Optional[float] = None
+
+    def add(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def as_server_timing(self) -> str:
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.durations.items())
+
+
+request_timings: ContextVar[typing.Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record_timing(name: str, seconds: float) -> None:
+    if (timings := request_timings.get()) is not None:
+        timings.add(name, seconds)
+
+
+def mark_endpoint_finished() -> None:
+    if (timings := request_timings.get()) is not None:
+        timings.endpoint_finished_at = time.perf_counter()
@@ -54,6 +54,8 @@ def event_loop(request) -> Generator:
 @pytest.fixture(scope='module')
 def app() -> FastAPI:
     settings = Settings()
+    # tests run deferred jobs explicitly, a background worker would share the test database session
+    settings.jobs.in_process = False
     app = build_app(DevelopmentApplicationBuilder(settings=settings))
     injector.register(AsyncDatabase, AsyncDatabaseTestComponents)
     return app
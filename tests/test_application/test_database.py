@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import text
+
+from server.config.infrastructure.databases.postgres import AsyncDatabaseComponents, last_write_at, mark_write
+from server.config.infrastructure.databases.schema import SchemaMode, alembic_head, ensure_schema, schema_state
+from server.shared.di import injector
+from server.shared.dependencies.database import AsyncDatabase
+from server.shared.dependencies.settings import Settings
+
+pytestmark = [pytest.mark.asyncio]
+
+
+async def test_liveness_check(app: FastAPI) -> None:
+    assert await injector.get(AsyncDatabase).check_liveness() is True
+
+
+async def test_pool_stats_endpoint(client: AsyncClient, app: FastAPI) -> None:
+    response = await client.get(app.url_path_for("pool_stats"))
+
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["max_connections_per_worker"] == stats["size"] + stats["max_overflow"]
+    assert stats["server_max_connections"] > 0
+    assert stats["replicas"] == 0
+
+
+async def test_read_replica_routing(app: FastAPI) -> None:
+    primary_uri = injector.get(Settings).database.connection_uri
+    database = AsyncDatabaseComponents(replica_connection_uris=[primary_uri, primary_uri])
+    token = last_write_at.set(None)
+    try:
+        replicas = {database.session_factory(read_only=True).kw["bind"] for _ in range(4)}
+        assert replicas == set(database.replica_engines)
+        assert database.session_factory(read_only=False) is database.session
+
+        # own writes stay visible: reads go to the primary right after a write
+        mark_write()
+        assert database.session_factory(read_only=True) is database.session
+    finally:
+        last_write_at.reset(token)
+        for engine in (database.engine, *database.replica_engines):
+            await engine.dispose()
+
+
+async def test_missing_tables_are_created_by_one_of_concurrent_boots(initialized_app: FastAPI) -> None:
+    engine = injector.get(AsyncDatabase).engine
+    async with engine.begin() as connection:
+        await connection.execute(text("DROP TABLE IF EXISTS users CASCADE"))
+
+    # both find the table missing, the second one waits for the lock and finds it created
+    await asyncio.gather(ensure_schema(engine, SchemaMode.CHECK), ensure_schema(engine, SchemaMode.CHECK))
+
+    async with engine.connect() as connection:
+        _, missing = await schema_state(connection)
+    assert missing == []
+
+
+async def test_startup_schema_check(initialized_app: FastAPI) -> None:
+    engine = injector.get(AsyncDatabase).engine
+    await ensure_schema(engine, SchemaMode.CHECK)
+
+    async with engine.connect() as connection:
+        _, missing = await schema_state(connection)
+    assert missing == []
+    assert alembic_head() is not None
+
+
+async def test_dispose_reports_closed_connections(app: FastAPI) -> None:
+    database = AsyncDatabaseComponents(replica_connection_uris=[])
+    assert await database.check_liveness() is True
+
+    assert await database.dispose(timeout=1) == {"closed": 1, "in_use": 0}
+
+
+async def test_reset_after_fork_starts_with_empty_pool(app: FastAPI) -> None:
+    database = AsyncDatabaseComponents(replica_connection_uris=[])
+    assert await database.check_liveness() is True
+    inherited_pool = database.engine.pool
+
+    database.reset_after_fork()
+
+    assert database.engine.pool is not inherited_pool
+    assert database.engine.pool.checkedin() == 0
+    # inherited connections belong to the parent, they are left open
+    assert inherited_pool.checkedin() == 1
+    assert await database.check_liveness() is True
+    await database.dispose()
+    inherited_pool.dispose()
@@ -0,0 +1,69 @@
+import asyncio
+import signal
+import socket
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from uvicorn import Config
+
+from server.application.middlewares import DrainingMiddleware, RequestDrain
+from server.gunicorn_app import DrainingServer, prepare_metrics_directory
+
+
+def test_configured_metrics_directory_is_cleaned(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    directory = tmp_path / "metrics"
+    directory.mkdir()
+    (directory / "counter_1.db").touch()
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(directory))
+    monkeypatch.setattr(tempfile, "mkdtemp", pytest.fail)
+
+    assert prepare_metrics_directory() == str(directory)
+    assert list(directory.iterdir()) == []
+
+
+@pytest.mark.asyncio
+async def test_server_drains_requests_on_exit_signal() -> None:
+    release = asyncio.Event()
+    app = FastAPI()
+    app.state.drain = RequestDrain()
+    app.state.settings = SimpleNamespace(application=SimpleNamespace(shutdown_timeout=5))
+    app.add_middleware(DrainingMiddleware, drain=app.state.drain)
+
+    @app.get("/slow")
+    async def slow() -> str:
+        await release.wait()
+        return "done"
+
+    @app.get("/fast")
+    async def fast() -> str:
+        return "done"
+
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    url = "http://127.0.0.1:%d" % listener.getsockname()[1]
+    server = DrainingServer(Config(app, lifespan="off", log_config=None))
+    serving = asyncio.ensure_future(server.serve(sockets=[listener]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    async with httpx.AsyncClient(base_url=url) as slow_client, httpx.AsyncClient(base_url=url) as keep_alive_client:
+        assert (await keep_alive_client.get("/fast")).status_code == 200
+        running = asyncio.ensure_future(slow_client.get("/slow"))
+        while app.state.drain.in_flight == 0:
+            await asyncio.sleep(0.01)
+
+        server.handle_exit(signal.SIGTERM, None)
+        await asyncio.sleep(0.2)
+        # the server waits for the running request, another request on an open connection is turned away
+        assert not serving.done()
+        rejected = await keep_alive_client.get("/fast")
+        assert rejected.status_code == 503
+        assert rejected.headers["Connection"] == "close"
+
+        release.set()
+        assert (await running).status_code == 200
+        await asyncio.wait_for(serving, timeout=5)
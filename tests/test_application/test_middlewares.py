@@ -0,0 +1,118 @@
+import asyncio
+from typing import AsyncContextManager, Awaitable, Callable
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+
+from server.application.middlewares import DrainingMiddleware, RequestDrain, ServerSideSessionMiddleware
+from server.apps.staff.models import User
+from server.shared.utils.sessions import MemorySessionStore
+
+pytestmark = [pytest.mark.asyncio]
+
+
+async def test_server_timing_header(
+        db_session: Callable[..., AsyncContextManager],
+        client: AsyncClient,
+        test_user: Callable[..., Awaitable[User]],
+        app: FastAPI
+) -> None:
+    async with db_session():
+        await test_user()
+        response = await client.get(app.url_path_for("users:list"))
+
+    stages = {metric.split(";")[0] for metric in response.headers["Server-Timing"].split(", ")}
+    assert {"db", "serialize", "total"} <= stages
+
+
+async def test_query_stats_headers_in_debug_mode(
+        db_session: Callable[..., AsyncContextManager],
+        client: AsyncClient,
+        test_user: Callable[..., Awaitable[User]],
+        app: FastAPI
+) -> None:
+    async with db_session():
+        user = await test_user()
+        response = await client.get(app.url_path_for("users:get", user_id=str(user.id)))
+
+    assert response.headers["X-DB-Query-Count"] == "1"
+    assert response.headers["X-DB-Slowest-Query"].startswith("select_in:User")
+
+
+async def test_metrics_are_labelled_with_route_template(client: AsyncClient, app: FastAPI) -> None:
+    await client.get(app.url_path_for("users:get", user_id="not-an-id"))
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert 'route="/api/v1/users/{user_id}"' in response.text
+
+
+async def test_draining_rejects_new_requests_and_waits_for_running_ones() -> None:
+    drain = RequestDrain()
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send) -> None:
+        await release.wait()
+        await PlainTextResponse("done")(scope, receive, send)
+
+    async with AsyncClient(app=DrainingMiddleware(slow_app, drain=drain), base_url="http://test") as client:
+        running = asyncio.ensure_future(client.get("/"))
+        await asyncio.sleep(0.01)
+        assert drain.in_flight == 1
+
+        drain.start()
+        rejected = await client.get("/")
+        assert rejected.status_code == 503
+        assert rejected.headers["Connection"] == "close"
+        assert await drain.wait(timeout=0.01) is False
+
+        release.set()
+        assert (await running).text == "done"
+        assert await drain.wait(timeout=1) is True
+
+
+class RecordingSessionStore(MemorySessionStore):
+    def __init__(self) -> None:
+        super().__init__(maxsize=10, ttl=60)
+        self.saves = 0
+
+    async def save(self, session_id: str, data: str) -> None:
+        self.saves += 1
+        await super().save(session_id, data)
+
+
+async def session_app(scope, receive, send) -> None:
+    request = Request(scope, receive)
+    if request.url.path == "/login":
+        request.session["user"] = {"name": "user", "picture": "x" * 2000}
+    elif request.url.path == "/logout":
+        request.session.pop("user", None)
+    await JSONResponse(request.session.get("user"))(scope, receive, send)
+
+
+async def test_server_side_session_keeps_only_id_in_cookie_and_writes_lazily() -> None:
+    store = RecordingSessionStore()
+    app = ServerSideSessionMiddleware(session_app, store=store)
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        login = await client.get("/login")
+        session_id = login.cookies["session_id"]
+        assert len(session_id) < 64
+        assert await store.load(session_id) is not None
+
+        # reading the session neither writes it to the store nor sends the cookie again
+        response = await client.get("/")
+        assert response.json()["name"] == "user"
+        assert "set-cookie" not in response.headers
+        assert store.saves == 1
+
+        logout = await client.get("/logout")
+        assert "expires=Thu, 01 Jan 1970" in logout.headers["set-cookie"]
+        assert await store.load(session_id) is None
+
+    # an unknown id from the client isn't adopted for a new session
+    async with AsyncClient(app=app, base_url="http://test", cookies={"session_id": "chosen"}) as client:
+        assert (await client.get("/login")).cookies["session_id"] != "chosen"
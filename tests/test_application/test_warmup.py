@@ -0,0 +1,22 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+
+from server.application.warmup import warm_up
+
+pytestmark = [pytest.mark.asyncio]
+
+
+async def test_failed_warm_up_is_logged(monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture) -> None:
+    app = FastAPI()
+
+    def broken_openapi() -> None:
+        raise ValueError("broken schema")
+
+    monkeypatch.setattr(app, "openapi", broken_openapi)
+
+    await warm_up(app, SimpleNamespace(engine=None), connections=1)
+
+    assert "Warm-up of database connections failed" in caplog.text
+    assert "Warm-up of response schemas failed" in caplog.text
@@ -0,0 +1,26 @@
+import time
+from typing import AsyncContextManager, Callable
+
+import pytest
+from fastapi import FastAPI
+
+from server.apps.audit.jobs import write_audit_events
+from server.apps.audit.models import AuditEvent
+from server.shared.utils.database import select_all
+
+pytestmark = [pytest.mark.asyncio]
+
+
+async def test_audit_events_of_batch_are_written(db_session: Callable[..., AsyncContextManager], app: FastAPI) -> None:
+    now = time.time()
+    async with db_session():
+        await write_audit_events.handler([
+            {"event": "login.failed", "username": "first", "client_ip": "127.0.0.1", "created_at": now},
+            {"event": "login.succeeded", "username": "second", "client_ip": None, "created_at": now},
+        ])
+        events = await select_all(AuditEvent)
+
+        assert sorted((event.event, event.username) for event in events) == [
+            ("login.failed", "first"), ("login.succeeded", "second"),
+        ]
+        assert abs(events[0].created_at.timestamp() - now) < 1e-3
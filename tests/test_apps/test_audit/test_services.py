@@ -0,0 +1,23 @@
+import typing
+
+import pytest
+
+from server.apps.audit import services
+from server.apps.audit.services import record_audit_event
+
+pytestmark = [pytest.mark.asyncio]
+
+
+class UnavailableQueue:
+    async def defer(self, payload: typing.Dict[str, typing.Any], delay: float = 0.0) -> None:
+        raise ConnectionError("broker is unavailable")
+
+
+async def test_audit_event_is_skipped_when_queue_is_unavailable(
+        monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+) -> None:
+    monkeypatch.setattr(services, "write_audit_events", UnavailableQueue())
+
+    await record_audit_event("login.failed", username="someone", client_ip="127.0.0.1")
+
+    assert "Audit event login.failed of someone wasn't recorded" in caplog.text
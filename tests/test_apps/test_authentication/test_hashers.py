@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+import pytest
+from argon2 import PasswordHasher as ArgonPasswordHasher
+from argon2.exceptions import VerificationError
+
+from server.apps.authentication.sequrity.hashers import ExecutorPasswordHasher, PasswordHasherOverloaded
+from server.config.settings import PasswordHasherSettings
+
+pytestmark = [pytest.mark.asyncio]
+
+
+class SlowHasher:
+    def hash(self, password):
+        time.sleep(0.2)
+        return f"hash-{password}"
+
+    def verify(self, hash, password):
+        return True
+
+    def check_needs_rehash(self, hash):
+        return False
+
+
+async def test_hash_and_verify_in_executor():
+    hasher = ExecutorPasswordHasher(ArgonPasswordHasher(), PasswordHasherSettings())
+    password_hash = await hasher.hash("password")
+
+    assert await hasher.verify(password_hash, "password") is True
+    with pytest.raises(VerificationError):
+        await hasher.verify(password_hash, "wrong password")
+    assert hasher.stats.completed == 3
+    assert hasher.stats.compute_seconds > 0
+    hasher.shutdown()
+
+
+async def test_overloaded_hasher_rejects_requests():
+    settings = PasswordHasherSettings(max_workers=1, max_queue_size=0, queue_timeout=0.05)
+    hasher = ExecutorPasswordHasher(SlowHasher(), settings)
+
+    results = await asyncio.gather(hasher.hash("first"), hasher.hash("second"), return_exceptions=True)
+
+    assert results[0] == "hash-first"
+    assert isinstance(results[1], PasswordHasherOverloaded)
+    assert hasher.stats.rejected == 1
+    hasher.shutdown()
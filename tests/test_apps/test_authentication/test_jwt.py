@@ -0,0 +1,88 @@
+import time
+from typing import AsyncContextManager, Awaitable, Callable
+
+import jwt
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+
+from server.apps.authentication.sequrity.jwt.authentication import (
+    JWTAuthenticationService,
+    JWTLoginService,
+    UserIsUnauthorized,
+)
+from server.apps.staff.models import User
+from server.shared.di import injector
+from server.shared.dependencies.auth import AsyncPasswordHasher
+from server.shared.dependencies.jobs import JobQueue
+from server.shared.dependencies.settings import Settings as SettingsProtocol
+
+pytestmark = [pytest.mark.asyncio]
+
+
+async def test_decoded_token_is_cached(
+        db_session: Callable[..., AsyncContextManager],
+        test_user: Callable[..., Awaitable[User]],
+        token: Callable[..., Awaitable[str]],
+        app: FastAPI
+) -> None:
+    async with db_session():
+        jwt_token = await token(await test_user())
+
+    service: JWTAuthenticationService = injector.get(JWTAuthenticationService)
+    token_payload = service._decode_token(jwt_token)
+
+    assert token_payload.username == "username"
+    assert service._decode_token(jwt_token) is token_payload
+
+
+async def test_invalid_token_is_rejected(app: FastAPI) -> None:
+    service: JWTAuthenticationService = injector.get(JWTAuthenticationService)
+    not_yet_valid = jwt.encode(
+        {"username": "username", "nbf": time.time() + 3600}, service.secret_key, algorithm=service.algorithm
+    )
+    invalid_issued_at = jwt.encode({"username": "username", "iat": "now"}, service.secret_key, algorithm=service.algorithm)
+
+    for token in ["invalid token", not_yet_valid, invalid_issued_at]:
+        with pytest.raises(HTTPException) as error:
+            service._decode_token(token)
+        assert error.value.status_code == 401
+
+
+class RehashingHasher:
+    """Real hasher, that reports every hash as outdated"""
+
+    def __init__(self, hasher: AsyncPasswordHasher) -> None:
+        self.hasher = hasher
+
+    async def hash(self, password):
+        return await self.hasher.hash(password)
+
+    async def verify(self, hash, password):
+        return await self.hasher.verify(hash, password)
+
+    def check_needs_rehash(self, hash: str) -> bool:
+        return True
+
+
+async def test_only_verified_password_is_rehashed_after_login(
+        db_session: Callable[..., AsyncContextManager],
+        test_user: Callable[..., Awaitable[User]],
+        app: FastAPI
+) -> None:
+    service = JWTLoginService(
+        settings=injector.get(SettingsProtocol),
+        password_hasher=RehashingHasher(injector.get(AsyncPasswordHasher)),
+    )
+    local_jobs = injector.get(JobQueue).local_broker
+    async with db_session():
+        user = await test_user()
+
+        with pytest.raises(UserIsUnauthorized):
+            await service.authenticate_user(OAuth2PasswordRequestForm(username=user.username, password="wrong", scope=""))
+        assert local_jobs.pending == 0
+
+        await service.authenticate_user(OAuth2PasswordRequestForm(username=user.username, password="password", scope=""))
+        [delivery] = await local_jobs.receive(max_size=10)
+        assert delivery.job.name == "authentication.rehash_password"
+        assert delivery.job.payload["user_id"] == user.id
@@ -0,0 +1,114 @@
+import asyncio
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict
+
+import httpx
+import pytest
+from authlib.jose import JsonWebKey, jwt
+from starlette.config import Config
+
+from server.apps.authentication.sequrity.oauth.authentication import register_integrations
+from server.apps.authentication.sequrity.oauth.dto import OAuthIntegration
+from server.apps.authentication.sequrity.oauth.metadata import ProviderMetadataCache
+from server.shared.utils.http import SharedTransport
+
+pytestmark = [pytest.mark.asyncio]
+
+ISSUER = "https://idp.test"
+CLIENT_ID = "client-id"
+
+
+class StubProvider(httpx.MockTransport):
+    """OIDC provider with discovery, JWKS and token endpoints, that counts requests and closes"""
+
+    def __init__(self) -> None:
+        super().__init__(self.handle)
+        self.key = JsonWebKey.generate_key("RSA", 2048, is_private=True, options={"kid": "key-1"})
+        self.requests: Counter = Counter()
+        self.closed = 0
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests[request.url.path] += 1
+        if request.url.path == "/.well-known/openid-configuration":
+            return httpx.Response(200, headers={"Cache-Control": "public, max-age=600"}, json={
+                "issuer": ISSUER,
+                "authorization_endpoint": f"{ISSUER}/authorize",
+                "token_endpoint": f"{ISSUER}/token",
+                "jwks_uri": f"{ISSUER}/jwks",
+                "id_token_signing_alg_values_supported": ["RS256"],
+            })
+        if request.url.path == "/jwks":
+            return httpx.Response(200, json={"keys": [self.key.as_dict(is_private=False)]})
+        if request.url.path == "/token":
+            return httpx.Response(200, json={
+                "access_token": "access-token", "token_type": "Bearer", "id_token": self.id_token(),
+            })
+        return httpx.Response(404)
+
+    def id_token(self) -> str:
+        now = int(time.time())
+        claims = {"iss": ISSUER, "aud": CLIENT_ID, "sub": "42", "nonce": "nonce", "iat": now, "exp": now + 60}
+        return jwt.encode({"alg": "RS256", "kid": "key-1"}, claims, self.key).decode()
+
+    async def aclose(self) -> None:
+        self.closed += 1
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+async def test_metadata_is_cached_and_revalidated_in_background(tmp_path: Path) -> None:
+    provider, clock = StubProvider(), Clock()
+    url = f"{ISSUER}/.well-known/openid-configuration"
+    cache = ProviderMetadataCache(SharedTransport(provider), stale_ttl=100, path=tmp_path / "oidc.json", clock=clock)
+
+    metadata = await cache.get(url)
+    assert await cache.get(url) is metadata
+    assert provider.requests[url.removeprefix(ISSUER)] == 1
+
+    # provider's max-age wins over the default ttl, an expired entry is served while it's refreshed
+    clock.now += 650
+    assert await cache.get(url) is metadata
+    await asyncio.gather(*cache._background)
+    assert provider.requests["/.well-known/openid-configuration"] == 2
+    assert await cache.get(url) is not metadata
+    assert cache.stats() == {"hits": 2, "stale_hits": 1, "misses": 1, "size": 1}
+
+    # a restarted worker starts with the persisted entries
+    restarted = ProviderMetadataCache(SharedTransport(provider), path=tmp_path / "oidc.json", clock=clock)
+    assert await restarted.get(url) == metadata
+    assert provider.requests["/.well-known/openid-configuration"] == 2
+
+
+async def test_login_reuses_metadata_keys_and_connections() -> None:
+    provider = StubProvider()
+    transport = SharedTransport(provider)
+    oauth = register_integrations(
+        Config(environ={}),
+        OAuthIntegration(name="stub", overwrite=False, kwargs=dict(
+            client_id=CLIENT_ID,
+            client_secret="secret",
+            server_metadata_url=f"{ISSUER}/.well-known/openid-configuration",
+            client_kwargs={"scope": "openid"},
+        )),
+        metadata_cache=ProviderMetadataCache(transport),
+        transport=transport,
+    )
+
+    for _ in range(3):
+        token: Dict[str, Any] = await oauth.stub.fetch_access_token(redirect_uri="http://test/auth", code="code")
+        userinfo = await oauth.stub.parse_id_token(token, nonce="nonce")
+        assert userinfo["sub"] == "42"
+
+    assert provider.requests == {"/.well-known/openid-configuration": 1, "/jwks": 1, "/token": 3}
+    # clients opened by authlib for every call leave the shared pool open
+    assert provider.closed == 0
+    await oauth.shutdown()
+    assert provider.closed == 1
@@ -0,0 +1,24 @@
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from server.config.settings import Settings
+
+pytestmark = [pytest.mark.asyncio]
+
+
+async def test_login_attempts_of_username_are_limited(client: AsyncClient, app: FastAPI, settings: Settings) -> None:
+    form = {"username": f"user-{uuid.uuid4().hex}", "password": "wrong"}
+    limits = settings.login_rate_limit
+    # the client sends JSON by default
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+
+    for _ in range(limits.username_burst):
+        response = await client.post(app.url_path_for("oauth:login"), data=form, headers=headers)
+        assert response.status_code == 401
+
+    response = await client.post(app.url_path_for("oauth:login"), data=form, headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
@@ -1,10 +1,21 @@
+import asyncio
+
 import pytest
 from typing import AsyncContextManager, Awaitable, Callable
 from fastapi import FastAPI
 from httpx import AsyncClient
 
+from server.api.v1.staff.schemas import UserReadSchema
 from server.apps.staff.models import User
-from server.apps.staff.services import get_users, users_count, create_new_random_user, get_user_by_id
+from server.config.settings import Settings
+from server.apps.staff.services import (
+    get_users, users_count, create_new_random_user, get_user_by_id, get_principal_by_username, delete_user, create_user
+)
+from server.shared.api.pagination import encode_cursor
+from server.shared.utils.database import CountMode, update
+from server.shared.utils.dataloader import dataloader_scope
+from server.shared.utils.read_models import ReadModel
+from server.shared.utils.query_stats import QueryStats, query_stats
 
 pytestmark = [pytest.mark.asyncio]
 
@@ -18,6 +29,39 @@ async def test_simple(db_session: Callable[..., AsyncContextManager], test_user:
         assert (await get_users())[1].id == user.id
 
 
+async def test_users_count_modes(db_session: Callable[..., AsyncContextManager]):
+    async with db_session():
+        for _ in range(3):
+            await create_new_random_user()
+        assert await users_count(mode=CountMode.CACHED) == 3
+        await create_new_random_user()
+        # cached value is reused until it expires
+        assert await users_count(mode=CountMode.CACHED) == 3
+        assert await users_count(mode=CountMode.EXACT) == 4
+        assert await users_count(User.id < 0, mode=CountMode.EXACT) == 0
+        assert await users_count(mode=CountMode.ESTIMATED) >= 0
+        assert await users_count(User.balance > 0, mode=CountMode.ESTIMATED) >= 0
+
+
+async def test_get_user_by_id_batches_concurrent_lookups(db_session: Callable[..., AsyncContextManager]):
+    async with db_session():
+        users = [await create_new_random_user() for _ in range(3)]
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        try:
+            with dataloader_scope():
+                loaded = await asyncio.gather(*(get_user_by_id(user.id) for user in users), get_user_by_id(-1))
+                assert [user.id for user in loaded[:3]] == [user.id for user in users]
+                assert loaded[3] is None
+                assert (await get_user_by_id(users[0].id)).id == users[0].id
+                assert stats.count == 1
+
+                await delete_user(users[0].id)
+                assert await get_user_by_id(users[0].id) is None
+        finally:
+            query_stats.reset(token)
+
+
 async def test_users_list_endpoint(
         db_session: Callable[..., AsyncContextManager],
         authorized_client: Callable[..., Awaitable[AsyncClient]],
@@ -33,6 +77,152 @@ async def test_users_list_endpoint(
         assert response.status_code == 200
 
 
+async def test_users_retrieve_endpoint_conditional_get(
+        db_session: Callable[..., AsyncContextManager],
+        client: AsyncClient,
+        test_user: Callable[..., Awaitable[User]],
+        app: FastAPI
+) -> None:
+    async with db_session():
+        user = await test_user()
+        url = app.url_path_for("users:get", user_id=str(user.id))
+
+        response = await client.get(url)
+        assert response.status_code == 200
+        assert response.json() == UserReadSchema.from_orm(user).dict()
+        assert response.headers["Cache-Control"] == "private, no-cache"
+        etag = response.headers["ETag"]
+
+        response = await client.get(url, headers={"If-None-Match": f'"other", {etag}'})
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+        assert response.content == b""
+
+        response = await client.get(url, headers={"If-None-Match": 'W/"other"'})
+        assert response.status_code == 200
+
+
+async def test_user_without_phone_number_is_validated(
+        db_session: Callable[..., AsyncContextManager],
+        client: AsyncClient,
+        settings: Settings,
+        app: FastAPI,
+        monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setattr(settings.application, "trusted_responses", False)
+    async with db_session():
+        user = await create_user(
+            first_name="Name", last_name="Lastname", phone_number=None, email="phone@test.com",
+            password="password", username="no-phone", balance=0,
+        )
+
+        response = await client.get(app.url_path_for("users:get", user_id=str(user.id)))
+        assert response.status_code == 200
+        assert response.json()["phone_number"] is None
+
+
+async def test_users_projection(db_session: Callable[..., AsyncContextManager]):
+    async with db_session():
+        user = await create_new_random_user()
+        (row,) = await get_users(only=["id", User.username])
+
+        assert isinstance(row, ReadModel)
+        assert row.as_dict() == {"id": user.id, "username": user.username}
+        assert not hasattr(row, "password_hash")
+
+
+async def test_users_endpoints_sparse_fieldsets(
+        db_session: Callable[..., AsyncContextManager],
+        client: AsyncClient,
+        test_user: Callable[..., Awaitable[User]],
+        app: FastAPI
+) -> None:
+    async with db_session():
+        user = await test_user()
+
+        response = await client.get(app.url_path_for("users:list"), params={"fields": "id,username"})
+        assert response.json()["items"] == [{"id": user.id, "username": user.username}]
+
+        url = app.url_path_for("users:get", user_id=str(user.id))
+        response = await client.get(url, params={"fields": "email"})
+        assert response.json() == {"email": user.email}
+        assert response.headers["ETag"] != (await client.get(url)).headers["ETag"]
+
+        response = await client.get(url, params={"fields": "email,password_hash"})
+        assert response.status_code == 400
+
+
+async def test_users_list_endpoint_pagination(
+        db_session: Callable[..., AsyncContextManager],
+        client: AsyncClient,
+        test_user: Callable[..., Awaitable[User]],
+        app: FastAPI
+) -> None:
+    async with db_session():
+        first = await test_user()
+        second = await create_new_random_user()
+
+        response = await client.get(app.url_path_for("users:list"), params={"limit": 1})
+        assert response.status_code == 200
+        page = response.json()
+        assert [user["id"] for user in page["items"]] == [first.id]
+        assert page["next_cursor"] is not None
+
+        response = await client.get(app.url_path_for("users:list"), params={"limit": 1, "after": page["next_cursor"]})
+        page = response.json()
+        assert [user["id"] for user in page["items"]] == [second.id]
+        assert page["next_cursor"] is None
+
+
+async def test_users_list_endpoint_invalid_cursor(client: AsyncClient, app: FastAPI) -> None:
+    for cursor in ["not-a-cursor", encode_cursor("abc"), encode_cursor(1.5), encode_cursor(True)]:
+        response = await client.get(app.url_path_for("users:list"), params={"after": cursor})
+        assert response.status_code == 400
+
+
+async def test_users_list_endpoint_stream(
+        db_session: Callable[..., AsyncContextManager],
+        client: AsyncClient,
+        test_user: Callable[..., Awaitable[User]],
+        app: FastAPI
+) -> None:
+    async with db_session():
+        await test_user()
+        await create_new_random_user()
+
+        response = await client.get(app.url_path_for("users:list"), params={"stream": True})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert len(response.text.splitlines()) == 2
+
+
+async def test_users_delete_endpoint_evicts_principal(
+        db_session: Callable[..., AsyncContextManager],
+        client: AsyncClient,
+        test_user: Callable[..., Awaitable[User]],
+        app: FastAPI
+) -> None:
+    async with db_session():
+        user = await test_user()
+        assert (await get_principal_by_username(user.username)).id == user.id
+
+        response = await client.delete(app.url_path_for("users:delete", user_id=str(user.id)))
+        assert response.status_code == 200
+        assert await get_principal_by_username(user.username) is None
+
+
+async def test_renamed_user_is_evicted_from_principals(
+        db_session: Callable[..., AsyncContextManager],
+        test_user: Callable[..., Awaitable[User]],
+) -> None:
+    async with db_session():
+        user = await test_user()
+        assert (await get_principal_by_username(user.username)).id == user.id
+
+        await update(User, User.id == user.id, username="renamed")
+        assert await get_principal_by_username(user.username) is None
+        assert (await get_principal_by_username("renamed")).id == user.id
+
 # async def test_users_create_endpoint(authorized_client: AsyncClient, app: FastAPI) -> None:
 #     response = await authorized_client.put(
 #         app.url_path_for("users:create"),
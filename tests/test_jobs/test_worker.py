@@ -0,0 +1,117 @@
+import asyncio
+import typing
+
+import pytest
+
+from server.jobs import BrokerJobQueue, Job, MemoryBroker, Worker, batch_job, job
+
+pytestmark = [pytest.mark.asyncio]
+
+handled: typing.List[typing.List[typing.Dict[str, typing.Any]]] = []
+failures: typing.Dict[str, int] = {}
+
+
+@batch_job("tests.collect", batch_size=3)
+async def collect(payloads: typing.List[typing.Dict[str, typing.Any]]) -> None:
+    handled.append(payloads)
+
+
+@job("tests.flaky", max_attempts=3, retry_delay=0.01)
+async def flaky(payload: typing.Dict[str, typing.Any]) -> None:
+    failures[payload["key"]] = failures.get(payload["key"], 0) + 1
+    if failures[payload["key"]] <= payload["fail_times"]:
+        raise RuntimeError("flaky")
+
+
+@job("tests.secret", local=True, max_attempts=1)
+async def secret(payload: typing.Dict[str, typing.Any]) -> None:
+    raise RuntimeError("database is unavailable")
+
+
+@job("tests.local", local=True)
+async def local(payload: typing.Dict[str, typing.Any]) -> None:
+    handled.append([payload])
+
+
+async def test_jobs_of_one_name_are_handled_in_batches() -> None:
+    handled.clear()
+    broker = MemoryBroker()
+    for number in range(5):
+        await broker.publish(Job("tests.collect", {"number": number}))
+
+    await Worker(broker).process(await broker.receive(max_size=10))
+
+    assert handled == [[{"number": 0}, {"number": 1}, {"number": 2}], [{"number": 3}, {"number": 4}]]
+
+
+async def test_failed_job_is_retried_then_dead_lettered() -> None:
+    broker = MemoryBroker()
+    worker = Worker(broker, batch_linger=0)
+    await broker.publish(Job("tests.flaky", {"key": "recovers", "fail_times": 1}))
+    await broker.publish(Job("tests.flaky", {"key": "fails", "fail_times": 10}))
+
+    worker.start()
+    # backoff of the two retries is 0.01 and 0.02 seconds
+    await asyncio.sleep(0.2)
+    await worker.stop(timeout=1)
+
+    assert failures == {"recovers": 2, "fails": 3}
+    assert [(dead.name, dead.attempt) for dead in broker.dead] == [("tests.flaky", 3)]
+
+
+async def test_unknown_job_is_dead_lettered() -> None:
+    broker = MemoryBroker()
+    await broker.publish(Job("tests.unknown", {}))
+
+    await Worker(broker).process(await broker.receive(max_size=10))
+
+    assert [dead.name for dead in broker.dead] == ["tests.unknown"]
+
+
+async def test_payload_of_dead_job_is_not_kept() -> None:
+    broker = MemoryBroker()
+    await broker.publish(Job("tests.secret", {"password": "secret"}))
+
+    await Worker(broker).process(await broker.receive(max_size=10))
+
+    assert [(dead.name, dead.payload) for dead in broker.dead] == [("tests.secret", {})]
+
+
+async def test_local_jobs_stay_in_process() -> None:
+    handled.clear()
+    remote, local_broker = MemoryBroker(), MemoryBroker()
+    queue = BrokerJobQueue(remote, local_broker, batch_linger=0)
+
+    await queue.enqueue("tests.collect", {"number": 1})
+    await queue.enqueue("tests.local", {"password": "secret"})
+    await queue.shutdown(timeout=1)
+
+    assert remote.pending == 1
+    assert handled == [[{"password": "secret"}]]
+
+
+async def test_shutdown_waits_for_a_lingering_batch() -> None:
+    handled.clear()
+    queue = BrokerJobQueue(MemoryBroker())
+
+    for number in range(3):
+        await queue.enqueue("tests.collect", {"number": number})
+    # the worker has taken the jobs and lingers for more
+    await asyncio.sleep(0.01)
+    await queue.shutdown(timeout=5)
+
+    assert handled == [[{"number": 0}, {"number": 1}, {"number": 2}]]
+
+
+async def test_cancelled_receive_puts_deliveries_back() -> None:
+    broker = MemoryBroker()
+    for number in range(3):
+        await broker.publish(Job("tests.collect", {"number": number}))
+
+    receive = asyncio.create_task(broker.receive(max_size=10, linger=1))
+    await asyncio.sleep(0.01)
+    assert broker.pending == 3
+    receive.cancel()
+    await asyncio.gather(receive, return_exceptions=True)
+
+    assert [delivery.job.payload["number"] for delivery in await broker.receive(max_size=10)] == [0, 1, 2]
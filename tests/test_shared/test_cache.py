@@ -0,0 +1,41 @@
+from server.shared.utils.cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_ttl():
+    timer = FakeTimer()
+    cache = TTLCache(maxsize=10, ttl=5, timer=timer)
+    cache.set("key", "value")
+
+    assert cache.get("key") == "value"
+    timer.now = 5
+    assert cache.get("key") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_entries_are_popped_by_value():
+    cache = TTLCache(maxsize=10, ttl=60)
+    for number in range(4):
+        cache.set(number, number)
+
+    assert cache.pop_where(lambda value: value % 2 == 0) == 2
+    assert [cache.get(number) for number in range(4)] == [None, 1, None, 3]
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("first", 1)
+    cache.set("second", 2)
+    cache.get("first")
+    cache.set("third", 3)
+
+    assert cache.get("second") is None
+    assert cache.get("first") == 1
+    assert cache.get("third") == 3
@@ -0,0 +1,64 @@
+import asyncio
+from typing import Dict, List
+
+import pytest
+
+from server.shared.utils.dataloader import DataLoader, dataloader_scope, get_loader
+
+pytestmark = [pytest.mark.asyncio]
+
+
+class RecordingBatchLoad:
+    def __init__(self) -> None:
+        self.batches: List[List[int]] = []
+
+    async def __call__(self, keys: List[int]) -> Dict[int, str]:
+        self.batches.append(keys)
+        return {key: f"value-{key}" for key in keys if key > 0}
+
+
+async def test_concurrent_loads_are_batched() -> None:
+    batch_load = RecordingBatchLoad()
+    loader = DataLoader(batch_load)
+
+    values = await asyncio.gather(loader.load(1), loader.load(2), loader.load(1), loader.load(-1))
+
+    assert values == ["value-1", "value-2", "value-1", None]
+    assert batch_load.batches == [[1, 2, -1]]
+
+
+async def test_loaded_values_are_memoized_until_cleared() -> None:
+    batch_load = RecordingBatchLoad()
+    loader = DataLoader(batch_load)
+
+    assert await loader.load_many([1, 2]) == ["value-1", "value-2"]
+    assert await loader.load(1) == "value-1"
+    loader.clear(1)
+    assert await loader.load(1) == "value-1"
+
+    assert batch_load.batches == [[1, 2], [1]]
+
+
+async def test_failed_batch_is_not_memoized() -> None:
+    calls = 0
+
+    async def failing_batch_load(keys: List[int]) -> Dict[int, int]:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ConnectionError
+        return {key: key for key in keys}
+
+    loader = DataLoader(failing_batch_load)
+    with pytest.raises(ConnectionError):
+        await loader.load(1)
+    assert await loader.load(1) == 1
+
+
+async def test_loaders_are_shared_inside_scope() -> None:
+    assert get_loader("users", lambda: DataLoader(RecordingBatchLoad())) is not get_loader(
+        "users", lambda: DataLoader(RecordingBatchLoad())
+    )
+    with dataloader_scope():
+        loader = get_loader("users", lambda: DataLoader(RecordingBatchLoad()))
+        assert get_loader("users", lambda: DataLoader(RecordingBatchLoad())) is loader
@@ -0,0 +1,101 @@
+from typing import Optional, Protocol
+
+import pytest
+
+from server.shared.di import Lifetime, dependency_scope
+from server.shared.di.dependency_provider import DependencyProvider
+from server.shared.di.exceptions import DependencyInjectionError, DependencyNotFound
+
+
+class Clock(Protocol):
+    def now(self) -> int: ...
+
+
+class Repository(Protocol):
+    ...
+
+
+class FixedClock:
+    def now(self) -> int:
+        return 42
+
+
+class OtherClock:
+    def now(self) -> int:
+        return 0
+
+
+class UserRepository:
+    def __init__(self, clock: Clock, fallback: Optional[Clock] = None, name: str = "users") -> None:
+        self.clock = clock
+        self.fallback = fallback
+        self.name = name
+
+
+class SelfReferencing:
+    def __init__(self, repository: Repository) -> None:
+        self.repository = repository
+
+
+def test_constructor_injection() -> None:
+    provider = DependencyProvider()
+    provider.register(Clock, FixedClock)
+    provider.register(Repository, UserRepository, as_singleton=False)
+
+    repository = provider.get(Repository)
+
+    assert repository.clock is provider.get(Clock)
+    assert repository.fallback is provider.get(Clock)
+    assert repository.name == "users"
+    assert provider.get(Repository) is not repository
+
+
+def test_scoped_instances_live_until_the_end_of_scope() -> None:
+    provider = DependencyProvider()
+    provider.register(Clock, FixedClock)
+    provider.register(Repository, UserRepository, lifetime=Lifetime.SCOPED)
+
+    with dependency_scope():
+        first = provider.get(Repository)
+        assert provider.get(Repository) is first
+    with dependency_scope():
+        assert provider.get(Repository) is not first
+    # outside of a scope it's a factory
+    assert provider.get(Repository) is not provider.get(Repository)
+
+
+def test_registration_replaces_compiled_resolvers() -> None:
+    provider = DependencyProvider()
+    provider.register(Clock, FixedClock)
+    provider.register(Repository, UserRepository, as_singleton=False)
+    assert provider.get(Repository).clock.now() == 42
+
+    provider.register(Clock, OtherClock)
+
+    assert provider.get(Repository).clock.now() == 0
+
+
+def test_invalid_graphs_are_rejected() -> None:
+    provider = DependencyProvider()
+    with pytest.raises(DependencyNotFound):
+        provider.get(Clock)
+
+    provider.register(Repository, SelfReferencing, as_singleton=False)
+    with pytest.raises(DependencyInjectionError, match="Circular dependency"):
+        provider.get(Repository)
+
+    provider.register(Clock, FixedClock, lifetime=Lifetime.SCOPED)
+    with pytest.raises(DependencyInjectionError, match="can't depend on scoped"):
+        provider.register(Repository, UserRepository)
+    with pytest.raises(DependencyNotFound):
+        provider.get(Repository)
+
+
+def test_lazy_singleton_is_created_on_first_use() -> None:
+    provider = DependencyProvider()
+    created = []
+    provider.register(Clock, lambda: created.append(FixedClock()) or created[-1], lazy=True)
+
+    assert provider.peek(Clock) is None
+    assert created == []
+    assert provider.get(Clock) is provider.get(Clock) is provider.peek(Clock) is created[0]
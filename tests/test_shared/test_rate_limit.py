@@ -0,0 +1,67 @@
+import pathlib
+
+from server.shared.utils.rate_limit import MemoryRateLimitStore, SharedRateLimitStore
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_bucket_allows_burst_and_refills() -> None:
+    clock = FakeClock()
+    store = MemoryRateLimitStore(shards=4, clock=clock)
+
+    assert [store.take("key", rate=1.0, burst=3) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert store.take("key", rate=1.0, burst=3) == 1.0
+    assert store.take("other", rate=1.0, burst=3) == 0.0
+
+    clock.now += 1.5
+    assert store.take("key", rate=1.0, burst=3) == 0.0
+    assert store.take("key", rate=1.0, burst=3) == 0.5
+
+
+def test_least_recently_used_keys_are_evicted() -> None:
+    store = MemoryRateLimitStore(shards=1, max_keys=2, clock=FakeClock())
+
+    store.take("first", rate=1.0, burst=1)
+    store.take("second", rate=1.0, burst=1)
+    store.take("third", rate=1.0, burst=1)
+
+    # the bucket of `first` was dropped, so it's full again
+    assert store.take("first", rate=1.0, burst=1) == 0.0
+    assert store.take("third", rate=1.0, burst=1) > 0
+
+
+def test_shared_store_is_shared_by_processes(tmp_path: pathlib.Path) -> None:
+    clock = FakeClock()
+    # two stores on one file behave like two workers
+    first = SharedRateLimitStore(tmp_path / "buckets", shards=2, slots_per_shard=16, clock=clock)
+    second = SharedRateLimitStore(tmp_path / "buckets", shards=2, slots_per_shard=16, clock=clock)
+    try:
+        assert first.take("key", rate=0.5, burst=2) == 0.0
+        assert second.take("key", rate=0.5, burst=2) == 0.0
+        assert first.take("key", rate=0.5, burst=2) == 2.0
+
+        clock.now += 2
+        assert second.take("key", rate=0.5, burst=2) == 0.0
+    finally:
+        first.close()
+        second.close()
+
+
+def test_shared_store_reuses_stalest_slot_when_full(tmp_path: pathlib.Path) -> None:
+    clock = FakeClock()
+    store = SharedRateLimitStore(tmp_path / "buckets", shards=1, slots_per_shard=2, probes=2, clock=clock)
+    try:
+        for key in ("first", "second", "third"):
+            clock.now += 1
+            assert store.take(key, rate=0.001, burst=1) == 0.0
+        # `third` took the slot of `first`
+        assert store.take("third", rate=0.001, burst=1) > 0
+        assert store.take("second", rate=0.001, burst=1) > 0
+    finally:
+        store.close()
@@ -0,0 +1,33 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from server.shared.utils.sessions import FileSessionStore, Session
+
+
+def test_session_tracks_changes() -> None:
+    session = Session({"user": "name"})
+    session.get("user")
+    session.pop("missing", None)
+    session.setdefault("user", "other")
+    assert not session.modified
+
+    session["state"] = 1
+    assert session.modified
+
+
+@pytest.mark.asyncio
+async def test_file_store_is_shared_and_expires(tmp_path: Path) -> None:
+    store = FileSessionStore(tmp_path, ttl=60)
+    await store.save("session", '{"user": "name"}')
+
+    # another worker sees the same session
+    assert await FileSessionStore(tmp_path, ttl=60).load("session") == '{"user": "name"}'
+
+    [path] = tmp_path.iterdir()
+    expired_at = time.time() - 120
+    os.utime(path, (expired_at, expired_at))
+    assert await store.load("session") is None
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from server.shared.utils.singleflight import SingleFlight
+
+pytestmark = [pytest.mark.asyncio]
+
+
+async def test_concurrent_calls_share_one_execution() -> None:
+    single_flight = SingleFlight()
+    executions = 0
+
+    async def query() -> int:
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.01)
+        return 42
+
+    results = await asyncio.gather(*(single_flight.do("key", query) for _ in range(5)))
+
+    assert results == [42] * 5
+    assert executions == 1
+    assert single_flight.stats() == {"executed": 1, "coalesced": 4, "in_flight": 0}
+    # finished calls aren't shared anymore
+    assert await single_flight.do("key", query) == 42
+    assert executions == 2
+
+
+async def test_cancelled_caller_does_not_cancel_shared_call() -> None:
+    single_flight = SingleFlight()
+
+    async def query() -> str:
+        await asyncio.sleep(0.01)
+        return "result"
+
+    first = asyncio.ensure_future(single_flight.do("key", query))
+    second = asyncio.ensure_future(single_flight.do("key", query))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "result"
+
+
+async def test_error_is_raised_to_every_caller() -> None:
+    single_flight = SingleFlight()
+
+    async def query() -> None:
+        await asyncio.sleep(0.01)
+        raise ConnectionError
+
+    results = await asyncio.gather(*(single_flight.do("key", query) for _ in range(2)), return_exceptions=True)
+
+    assert all(isinstance(result, ConnectionError) for result in results)